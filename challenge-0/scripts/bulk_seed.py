@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""Bulk-load the factory dataset into Cosmos DB.
+
+seed-data.sh reads each file into memory and creates documents one at a time,
+which is fine for the sample data but takes hours at synthetic scale
+(generate_synthetic_data.py). This loader:
+
+- streams its input: JSONL line by line, JSON arrays decoded incrementally,
+  Parquet in row batches, so memory stays bounded whatever the file size
+- upserts with a bounded number of requests in flight, shared by all
+  containers, which are loaded in parallel
+- retries 429 (and transient 408/449/503) responses with exponential backoff,
+  honouring ``x-ms-retry-after-ms``
+- reports documents/s and RU/s while it runs, and per container at the end
+
+Files are looked up in --data-dir by container (``machines.jsonl``,
+``machines.parquet`` or ``machines.json`` for Machines, ...), so the loader
+works on challenge-0/data as well as on generate_synthetic_data.py output.
+Upserts make it safe to re-run.
+
+With ``--incremental``, a manifest (SQLite, ``.seed-manifest.sqlite`` in the
+data directory) keeps a content hash of every document written to each
+target account. Unchanged documents are not sent again, and a file whose size
+and modification time match the last complete load is not even read, so
+re-seeding an unchanged environment is close to a no-op. The manifest only
+knows what this loader wrote: after deleting data in the account, run once
+without ``--incremental``.
+
+``--wiki`` also uploads the kb-wiki pages to Blob Storage, concurrently and
+only those whose MD5 differs from the Content-MD5 of the existing blob.
+
+``--local`` runs against the in-process Cosmos stand-in of challenge-3
+(services/local_cosmos.py) instead of an account, with optional latency and
+throttling injection, e.g. ``--local median=8,p95=30,throttle=0.05``.
+
+Usage:
+    python scripts/bulk_seed.py [--data-dir DIR] [--concurrency 64] [--only CONTAINER ...]
+        [--incremental] [--wiki] [--local [LATENCY_SPEC]]
+
+Example:
+    python scripts/bulk_seed.py --data-dir data/synthetic --concurrency 128
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "data")
+LOCAL_COSMOS_DIR = os.path.join(os.path.dirname(os.path.dirname(SCRIPT_DIR)), "challenge-3", "agents")
+
+DATABASE_NAME = "FactoryOpsDB"
+MANIFEST_NAME = ".seed-manifest.sqlite"
+WIKI_CONTAINER = "machine-wiki"
+
+# Container -> (partition key, default TTL, file names without extension in order of preference)
+CONTAINERS = {
+    "Machines": ("/type", None, ["machines"]),
+    "Thresholds": ("/machineType", None, ["thresholds"]),
+    "Telemetry": ("/machineId", 2592000, ["telemetry", "telemetry-samples"]),  # 30 days TTL
+    "KnowledgeBase": ("/machineType", None, ["knowledge-base"]),
+    "PartsInventory": ("/category", None, ["parts-inventory"]),
+    "Technicians": ("/department", None, ["technicians"]),
+    "WorkOrders": ("/status", None, ["work-orders"]),
+    "MaintenanceHistory": ("/machineId", None, ["maintenance-history"]),
+    "MaintenanceWindows": ("/isAvailable", None, ["maintenance-windows"]),
+    "Suppliers": ("/id", None, ["suppliers"]),
+}
+EXTENSIONS = (".jsonl", ".parquet", ".json")
+
+TRANSIENT_STATUS = (408, 429, 449, 503)
+
+
+# =============================================================================
+# Readers
+# =============================================================================
+
+
+def iter_json_array(f, buffer_size=1 << 16):
+    """Documents of a JSON array (or a single document), decoded incrementally"""
+
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(buffer_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip(" \t\r\n")
+    in_array = buffer[pos:pos + 1] == "["
+    if in_array:
+        pos += 1
+    while True:
+        skip(" \t\r\n," if in_array else " \t\r\n")
+        if pos >= len(buffer) or buffer[pos] == "]":
+            return
+        try:
+            doc, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        yield doc
+        pos = end
+        if not in_array:
+            return
+
+
+def _drop_nulls(doc):
+    """Fields a document did not have come back from Parquet as None (also inside structs like metrics)"""
+
+    return {k: _drop_nulls(v) if isinstance(v, dict) else v for k, v in doc.items() if v is not None}
+
+
+def iter_documents(path) -> Iterator[dict]:
+    """Documents of a JSONL, JSON or Parquet file, streamed"""
+
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("❌ Parquet input requires pyarrow: pip install pyarrow")
+            sys.exit(1)
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=10000):
+            for row in batch.to_pylist():
+                yield _drop_nulls(row)
+        return
+
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(f)
+
+
+def find_input(data_dir, names) -> Optional[str]:
+    for name in names:
+        for extension in EXTENSIONS:
+            path = os.path.join(data_dir, name + extension)
+            if os.path.exists(path):
+                return path
+    return None
+
+
+# =============================================================================
+# Manifest
+# =============================================================================
+
+
+def document_hash(doc) -> str:
+    """Hash of a document's content, independent of key order"""
+
+    canonical = json.dumps(doc, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def file_fingerprint(path) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class SeedManifest:
+    """Content hashes of the documents and files loaded into one target, in SQLite
+
+    Readers (one thread per container) look hashes up a batch at a time, and
+    writers record them after each successful upsert, so one lock guards the
+    connection.
+    """
+
+    def __init__(self, path, target):
+        self.path = path
+        self.target = target
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, str, str, str]] = []
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS documents (target TEXT, container TEXT, id TEXT, "
+                             "hash TEXT, PRIMARY KEY (target, container, id))")
+            self._db.execute("CREATE TABLE IF NOT EXISTS files (target TEXT, container TEXT, path TEXT, "
+                             "fingerprint TEXT, PRIMARY KEY (target, container))")
+
+    def file_unchanged(self, container, path) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT path, fingerprint FROM files WHERE target = ? AND container = ?",
+                                   (self.target, container)).fetchone()
+        return row == (os.path.abspath(path), file_fingerprint(path))
+
+    def record_file(self, container, path) -> None:
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                             (self.target, container, os.path.abspath(path), file_fingerprint(path)))
+
+    def changed(self, container, docs) -> List[Tuple[dict, str]]:
+        """``(doc, hash)`` for the documents that are new or differ from what was loaded"""
+
+        hashes = [document_hash(doc) for doc in docs]
+        with self._lock:
+            known = {}
+            ids = [str(doc["id"]) for doc in docs]
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                known.update(self._db.execute(
+                    f"SELECT id, hash FROM documents WHERE target = ? AND container = ? "
+                    f"AND id IN ({','.join('?' * len(part))})", [self.target, container, *part]).fetchall())
+        return [(doc, digest) for doc, digest in zip(docs, hashes) if known.get(str(doc["id"])) != digest]
+
+    def record(self, container, doc_id, digest) -> None:
+        self._pending.append((self.target, container, str(doc_id), digest))
+        if len(self._pending) >= 5000:
+            self.commit()
+
+    def commit(self) -> None:
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)", self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        self.commit()
+        self._db.close()
+
+
+# =============================================================================
+# Targets
+# =============================================================================
+
+
+class LocalTarget:
+    """Async facade over the synchronous in-process stand-in (challenge-3 services/local_cosmos.py)"""
+
+    def __init__(self, latency_spec, workers):
+        sys.path.insert(0, LOCAL_COSMOS_DIR)
+        from services.local_cosmos import LatencyProfile, LocalCosmosDatabase
+
+        # 429s surface to the loader's own retry loop instead of the stand-in's
+        self.database = LocalCosmosDatabase(LatencyProfile.parse(latency_spec or ""), max_throttle_retries=0)
+        # The stand-in lives in memory, so a manifest for it only shows what would be skipped
+        self.key = "local"
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def prepare(self, name, partition_key, ttl):
+        self.database.create_container_if_not_exists(id=name, partition_key={"paths": [partition_key]})
+        return _LocalContainer(self, name)
+
+    async def close(self):
+        self._executor.shutdown()
+
+
+class _LocalContainer:
+    def __init__(self, target, name):
+        self._target = target
+        self._name = name
+
+    async def upsert_item(self, body, response_hook=None):
+        def call():
+            # A client per call, so the response headers are this request's
+            container = self._target.database.get_container_client(self._name)
+            result = container.upsert_item(body)
+            if response_hook:
+                response_hook(container.client_connection.last_response_headers, result)
+            return result
+
+        return await asyncio.get_running_loop().run_in_executor(self._target._executor, call)
+
+
+class CosmosTarget:
+    """Azure Cosmos DB through the async SDK (azure.cosmos.aio)"""
+
+    def __init__(self, endpoint, key):
+        try:
+            from azure.cosmos.aio import CosmosClient
+        except ImportError:
+            print("❌ Bulk seeding requires the async Cosmos SDK: pip install azure-cosmos aiohttp")
+            sys.exit(1)
+        # The SDK retries some 429s itself before they reach upsert_with_retry
+        self.client = CosmosClient(endpoint, key)
+        self.key = f"{endpoint.rstrip('/')}/{DATABASE_NAME}"
+        self.database = None
+
+    async def prepare(self, name, partition_key, ttl):
+        from azure.cosmos import PartitionKey
+
+        if self.database is None:
+            self.database = await self.client.create_database_if_not_exists(id=DATABASE_NAME)
+        return await self.database.create_container_if_not_exists(
+            id=name, partition_key=PartitionKey(path=partition_key), default_ttl=ttl)
+
+    async def close(self):
+        await self.client.close()
+
+
+# =============================================================================
+# Loader
+# =============================================================================
+
+
+@dataclass
+class ContainerStats:
+    documents: int = 0
+    request_charge: float = 0.0
+    throttled: int = 0
+    failed: int = 0
+    skipped: int = 0
+    unchanged: int = 0
+
+
+@dataclass
+class LoadStats:
+    containers: Dict[str, ContainerStats] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+    def total(self, name) -> float:
+        return sum(getattr(s, name) for s in self.containers.values())
+
+    def describe(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        documents, charge = self.total("documents"), self.total("request_charge")
+        return (f"{documents:,.0f} documents, {charge:,.0f} RU in {elapsed:.1f}s "
+                f"({documents / elapsed:,.0f} docs/s, {charge / elapsed:,.0f} RU/s), "
+                f"{self.total('unchanged'):,.0f} unchanged, {self.total('throttled'):,.0f} throttled, "
+                f"{self.total('failed'):,.0f} failed")
+
+
+def _retry_after_ms(error) -> Optional[float]:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("x-ms-retry-after-ms"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def upsert_with_retry(container, doc, stats: ContainerStats, max_retries: int) -> bool:
+    from azure.cosmos import exceptions
+
+    for attempt in range(max_retries + 1):
+        headers = {}
+        try:
+            await container.upsert_item(doc, response_hook=lambda h, _: headers.update(h))
+        except exceptions.CosmosHttpResponseError as e:
+            if e.status_code not in TRANSIENT_STATUS or attempt == max_retries:
+                stats.failed += 1
+                if stats.failed <= 5:
+                    print(f"⚠️ Error upserting {doc.get('id')}: {str(e).splitlines()[0] if str(e) else e}")
+                return False
+            if e.status_code == 429:
+                stats.throttled += 1
+            # Exponential backoff with jitter, never shorter than the service asks for
+            backoff = min(100.0 * 2 ** attempt, 10000.0) * random.uniform(0.5, 1.0)
+            await asyncio.sleep(max(backoff, _retry_after_ms(e) or 0.0) / 1000)
+            continue
+        stats.documents += 1
+        stats.request_charge += float(headers.get("x-ms-request-charge", 0) or 0)
+        return True
+    return False
+
+
+async def _produce(name, path, container, queue, stats: ContainerStats, limit, manifest):
+    documents = iter_documents(path)
+    if limit:
+        documents = itertools.islice(documents, limit)
+
+    def next_batch():
+        batch = []
+        for doc in itertools.islice(documents, 1000):
+            if "id" in doc:
+                batch.append(doc)
+            else:
+                stats.skipped += 1
+        if manifest is None or not batch:
+            return batch, len(batch)
+        return manifest.changed(name, batch), len(batch)
+
+    while True:
+        # Reading, decoding and hashing happen off the event loop, a batch at a time
+        batch, read = await asyncio.to_thread(next_batch)
+        if not read:
+            return
+        if manifest is None:
+            batch = [(doc, None) for doc in batch]
+        stats.unchanged += read - len(batch)
+        for doc, digest in batch:
+            await queue.put((name, container, doc, digest, stats))
+
+
+async def _consume(queue, max_retries, manifest):
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        name, container, doc, digest, stats = item
+        if await upsert_with_retry(container, doc, stats, max_retries) and manifest is not None:
+            manifest.record(name, doc["id"], digest)
+
+
+async def _report(stats: LoadStats, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(f"   📦 {stats.describe()}")
+
+
+async def bulk_load(target, inputs: Dict[str, str], concurrency=64, max_retries=10, limit=None,
+                    progress_interval=5.0, manifest: Optional[SeedManifest] = None) -> LoadStats:
+    """Upsert every document of ``inputs`` (container -> file) with ``concurrency`` requests in flight
+
+    With ``manifest``, only new or changed documents are sent, and files
+    unchanged since their last complete load are skipped.
+    """
+
+    stats = LoadStats()
+    containers = {}
+    for name, path in list(inputs.items()):
+        partition_key, ttl, _ = CONTAINERS[name]
+        containers[name] = await target.prepare(name, partition_key, ttl)
+        stats.containers[name] = ContainerStats()
+        if manifest is not None and not limit and manifest.file_unchanged(name, path):
+            print(f"✅ Container '{name}' up to date ({os.path.basename(path)} unchanged)")
+            del inputs[name]
+        else:
+            print(f"✅ Container '{name}' ready ({os.path.basename(path)})")
+
+    # The bounded queue keeps readers at most a few batches ahead of the writers
+    queue = asyncio.Queue(maxsize=concurrency * 4)
+    consumers = [asyncio.create_task(_consume(queue, max_retries, manifest)) for _ in range(concurrency)]
+    reporter = asyncio.create_task(_report(stats, progress_interval))
+    stats.started = time.perf_counter()
+    try:
+        await asyncio.gather(*(_produce(name, path, containers[name], queue, stats.containers[name], limit,
+                                        manifest) for name, path in inputs.items()))
+        for _ in consumers:
+            await queue.put(None)
+        await asyncio.gather(*consumers)
+    finally:
+        reporter.cancel()
+        for task in consumers:
+            task.cancel()
+    if manifest is not None:
+        manifest.commit()
+        # A file counts as loaded only when all of it was (a later run retries the failures)
+        for name, path in inputs.items():
+            if not limit and not stats.containers[name].failed:
+                manifest.record_file(name, path)
+    return stats
+
+
+# =============================================================================
+# Wiki blobs
+# =============================================================================
+
+
+async def sync_wiki(connection_string, folder, container_name=WIKI_CONTAINER, concurrency=8) -> Dict[str, int]:
+    """Upload the kb-wiki pages whose content differs from the blob's Content-MD5, ``concurrency`` at a time"""
+
+    try:
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import ContentSettings
+        from azure.storage.blob.aio import BlobServiceClient
+    except ImportError:
+        print("❌ Wiki upload requires the async Blob SDK: pip install azure-storage-blob aiohttp")
+        sys.exit(1)
+
+    counts = {"uploaded": 0, "unchanged": 0, "failed": 0}
+    paths = sorted(glob.glob(os.path.join(folder, "*.md")))
+    if not paths:
+        print(f"⚠️ No markdown files found in {folder}")
+        return counts
+
+    async with BlobServiceClient.from_connection_string(connection_string) as service:
+        container = service.get_container_client(container_name)
+        try:
+            await container.create_container()
+            print(f"✅ Created container '{container_name}'")
+        except ResourceExistsError:
+            pass
+        # One listing gives the hash of every existing blob
+        remote = {}
+        async for blob in container.list_blobs():
+            md5 = blob.content_settings.content_md5 if blob.content_settings else None
+            remote[blob.name] = bytes(md5) if md5 else None
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def upload(path):
+            name = os.path.basename(path)
+            with open(path, "rb") as f:
+                data = f.read()
+            md5 = hashlib.md5(data).digest()
+            if remote.get(name) == md5:
+                counts["unchanged"] += 1
+                return
+            settings = ContentSettings(content_type="text/markdown; charset=utf-8", content_md5=md5)
+            async with semaphore:
+                try:
+                    await container.upload_blob(name=name, data=data, overwrite=True, content_settings=settings)
+                except Exception as e:
+                    counts["failed"] += 1
+                    print(f"❌ Failed to upload {name}: {e}")
+                    return
+            counts["uploaded"] += 1
+            print(f"✅ Uploaded {name}")
+
+        await asyncio.gather(*(upload(path) for path in paths))
+    return counts
+
+
+async def run(args) -> LoadStats:
+    names = args.only or list(CONTAINERS)
+    inputs = {}
+    for name in names:
+        path = find_input(args.data_dir, CONTAINERS[name][2])
+        if path:
+            inputs[name] = path
+        elif args.only:
+            print(f"⚠️ No input for {name} in {args.data_dir}")
+    if not inputs:
+        print(f"❌ No input files found in {args.data_dir}")
+        sys.exit(1)
+
+    if args.local is not None:
+        target = LocalTarget(args.local, args.concurrency)
+        print(f"🧪 Loading into the local Cosmos stand-in ({args.local or 'no latency'})")
+    else:
+        missing = [v for v in ("COSMOS_ENDPOINT", "COSMOS_KEY") if not os.environ.get(v)]
+        if missing:
+            print(f"❌ Missing environment variables: {', '.join(missing)}")
+            sys.exit(1)
+        target = CosmosTarget(os.environ["COSMOS_ENDPOINT"], os.environ["COSMOS_KEY"])
+
+    manifest = None
+    if args.incremental:
+        manifest = SeedManifest(args.manifest or os.path.join(args.data_dir, MANIFEST_NAME), target.key)
+    try:
+        stats = await bulk_load(target, inputs, args.concurrency, args.max_retries, args.limit,
+                                args.progress_interval, manifest)
+    finally:
+        await target.close()
+        if manifest is not None:
+            manifest.close()
+
+    elapsed = max(time.perf_counter() - stats.started, 1e-9)
+    for name, s in stats.containers.items():
+        print(f"   {name:<20} {s.documents:>12,} docs {s.request_charge:>14,.0f} RU "
+              f"{s.unchanged:>12,} unchanged {s.throttled:>8,} throttled {s.failed:>6,} failed"
+              + (f" {s.skipped:,} without id" if s.skipped else ""))
+    print(f"✅ Seeded {stats.describe()}")
+    if args.local is not None:
+        db = target.database.stats
+        print(f"   Stand-in: {db.requests:,} requests, {db.request_charge:,.0f} RU, "
+              f"{db.request_charge / elapsed:,.0f} RU/s")
+
+    if args.wiki:
+        connection_string = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+        if not connection_string:
+            print("❌ Missing storage credentials. Set AZURE_STORAGE_CONNECTION_STRING in environment.")
+            sys.exit(1)
+        counts = await sync_wiki(connection_string, args.wiki_dir, concurrency=args.wiki_concurrency)
+        print(f"✅ Wiki: {counts['uploaded']} uploaded, {counts['unchanged']} unchanged, "
+              f"{counts['failed']} failed ('{WIKI_CONTAINER}')")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load the factory dataset into Cosmos DB")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory with the JSON/JSONL/Parquet files")
+    parser.add_argument("--only", nargs="+", choices=list(CONTAINERS), help="Only load these containers")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight across all containers")
+    parser.add_argument("--max-retries", type=int, default=10, help="Retries per document on 429/transient errors")
+    parser.add_argument("--limit", type=int, help="At most this many documents per container")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--incremental", action="store_true", help="Only send documents changed since the last load")
+    parser.add_argument("--manifest", help=f"Manifest file (default: {MANIFEST_NAME} in the data directory)")
+    parser.add_argument("--wiki", action="store_true", help="Also upload changed kb-wiki pages to Blob Storage")
+    parser.add_argument("--wiki-dir", default=os.path.join(DATA_DIR, "kb-wiki"))
+    parser.add_argument("--wiki-concurrency", type=int, default=8, help="Blob uploads in flight")
+    parser.add_argument("--local", nargs="?", const="", metavar="LATENCY_SPEC",
+                        help="Load into the in-process stand-in, e.g. median=8,p95=30,throttle=0.05")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
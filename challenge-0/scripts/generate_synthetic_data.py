@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""Generate a synthetic factory dataset at production scale.
+
+The documents follow the shapes in challenge-0/data and are referentially
+consistent: telemetry, history and work orders point at generated machines,
+work orders at generated technicians and parts, suppliers at generated parts.
+Output is streamed one document at a time (JSONL) or in row batches (Parquet),
+so telemetry volume is bounded by disk, not memory. The same --seed always
+produces the same dataset, and each collection has its own random stream so
+changing one collection's size does not reshuffle the others.
+
+Usage:
+    python scripts/generate_synthetic_data.py [--machines N] [--telemetry-rows N]
+        [--format jsonl|parquet] [--output-dir DIR] [--seed N] [--only COLLECTION ...]
+
+Example:
+    python scripts/generate_synthetic_data.py --machines 10000 --telemetry-rows 100000000 --format parquet
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "data")
+
+COLLECTIONS = [
+    "machines",
+    "thresholds",
+    "technicians",
+    "parts-inventory",
+    "suppliers",
+    "maintenance-history",
+    "maintenance-windows",
+    "work-orders",
+    "telemetry",
+]
+
+PRIORITIES = [("critical", 0.05), ("high", 0.2), ("medium", 0.5), ("low", 0.25)]
+STATUSES = [("completed", 0.6), ("in_progress", 0.1), ("scheduled", 0.15), ("Created", 0.15)]
+RELIABILITIES = ["High", "Medium", "Low"]
+SHIFTS = [("Night", 22, 8), ("Day", 6, 4), ("Evening", 14, 4)]
+
+# Share of telemetry readings pushed past the warning / critical threshold
+WARNING_RATE = 0.02
+CRITICAL_RATE = 0.004
+
+
+def load_fixture(name):
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def isoformat(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+# =============================================================================
+# Writers
+# =============================================================================
+
+
+class JsonlWriter:
+    """One JSON document per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, "w", encoding="utf-8", buffering=1 << 20)
+
+    def write(self, doc):
+        self._file.write(json.dumps(doc, separators=(",", ":")))
+        self._file.write("\n")
+        self.count += 1
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Row batches appended to one Parquet file (schema from the first batch)"""
+
+    def __init__(self, path, batch_size=65536):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("❌ Parquet output requires pyarrow: pip install pyarrow")
+            sys.exit(1)
+
+        self._pa = pa
+        self._pq = pq
+        self.path = path
+        self.count = 0
+        self.batch_size = batch_size
+        self._rows = []
+        self._writer = None
+
+    def write(self, doc):
+        self._rows.append(doc)
+        self.count += 1
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        schema = self._writer.schema if self._writer else None
+        table = self._pa.Table.from_pylist(self._rows, schema=schema)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, table.schema, compression="zstd")
+        self._writer.write_table(table)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        if self._writer:
+            self._writer.close()
+
+
+WRITERS = {"jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+# =============================================================================
+# Generator
+# =============================================================================
+
+
+class SyntheticDataGenerator:
+    """Deterministic generator scaled from the challenge-0 fixtures"""
+
+    def __init__(self, args):
+        self.args = args
+        self.start = datetime.fromisoformat(args.start.replace("Z", "+00:00"))
+        if self.start.tzinfo is None:
+            self.start = self.start.replace(tzinfo=timezone.utc)
+
+        self.machine_templates = load_fixture("machines.json")
+        self.threshold_docs = load_fixture("thresholds.json")
+        self.part_templates = load_fixture("parts-inventory.json")
+        self.technician_templates = load_fixture("technicians.json")
+        self.work_order_templates = load_fixture("work-orders.json")
+        self.history_templates = load_fixture("maintenance-history.json")
+        self.fault_types = {}
+        for kb in load_fixture("knowledge-base.json"):
+            self.fault_types.setdefault(kb["machineType"], []).append(kb["faultType"])
+
+        self.thresholds_by_type = {}
+        for t in self.threshold_docs:
+            self.thresholds_by_type.setdefault(t["machineType"], []).append(t)
+
+        # Small reference tables, kept in memory so later collections can point at them
+        self.machines = self._plan_machines()
+        self.parts = self._plan_parts()
+        self.technician_ids = [f"tech-{i:05d}" for i in range(1, args.technicians + 1)]
+
+    def rng(self, collection):
+        return random.Random(f"{self.args.seed}:{collection}")
+
+    # -------------------------------------------------------------------------
+    # Reference tables
+    # -------------------------------------------------------------------------
+
+    def _plan_machines(self):
+        rng = self.rng("machines")
+        return [
+            (f"machine-{i:06d}", rng.randrange(len(self.machine_templates)))
+            for i in range(1, self.args.machines + 1)
+        ]
+
+    def _plan_parts(self):
+        parts = []
+        for i in range(self.args.parts):
+            template = self.part_templates[i % len(self.part_templates)]
+            variant = i // len(self.part_templates)
+            suffix = f"-{variant:05d}" if variant else ""
+            parts.append({
+                "id": f"{template['id']}{suffix}",
+                "partNumber": f"{template['partNumber']}{suffix}",
+                "name": template["name"],
+                "template": template,
+            })
+        return parts
+
+    # -------------------------------------------------------------------------
+    # Collections
+    # -------------------------------------------------------------------------
+
+    def gen_machines(self):
+        rng = self.rng("machines:details")
+        for n, (machine_id, t) in enumerate(self.machines, start=1):
+            template = self.machine_templates[t]
+            install = self.start - timedelta(days=rng.randint(180, 3650))
+            doc = {k: v for k, v in template.items() if k != "maintenanceHistory"}
+            doc.update({
+                "id": machine_id,
+                "name": f"{template['name'].rsplit(' ', 1)[0]} {n}",
+                "location": f"{template['location'].split(',')[0]}, Line {1 + n % 40}",
+                "serialNumber": f"{template['model']}-{install.year}-{n:06d}",
+                "installDate": install.strftime("%Y-%m-%d"),
+                "status": "operational" if rng.random() > 0.03 else "maintenance",
+                "operatingHours": rng.randint(500, 60000),
+                "cyclesCompleted": rng.randint(1000, 500000),
+            })
+            yield doc
+
+    def gen_thresholds(self):
+        # Thresholds are per machine type, so they do not scale with machine count
+        yield from self.threshold_docs
+
+    def gen_technicians(self):
+        rng = self.rng("technicians")
+        machine_types = sorted({m["type"] for m in self.machine_templates})
+        for n, tech_id in enumerate(self.technician_ids, start=1):
+            template = self.technician_templates[(n - 1) % len(self.technician_templates)]
+            first, _, last = template["name"].partition(" ")
+            skills = rng.sample(machine_types, rng.randint(1, 3))
+            skills += [s for s in template["skills"] if s not in machine_types][:2]
+            yield {
+                **template,
+                "id": tech_id,
+                "employeeId": f"EMP-{10000 + n}",
+                "name": f"{first} {last} {n}",
+                "email": f"{first.lower()}.{last.lower()}{n}@tirefactory.com",
+                "phone": f"+1-555-{n % 10000:04d}",
+                "skills": skills,
+                "available": rng.random() > 0.2,
+                "currentAssignments": [],
+                "shiftSchedule": rng.choice(["day", "evening", "night"]),
+            }
+
+    def gen_parts_inventory(self):
+        rng = self.rng("parts-inventory")
+        for part in self.parts:
+            template = part["template"]
+            reorder = max(1, int(template["reorderLevel"] * rng.uniform(0.5, 2.0)))
+            yield {
+                **template,
+                "id": part["id"],
+                "partNumber": part["partNumber"],
+                "quantityInStock": rng.randint(0, reorder * 4),
+                "reorderLevel": reorder,
+                "unitCost": round(template["unitCost"] * rng.uniform(0.8, 1.25), 2),
+                "leadTimeDays": max(1, template["leadTimeDays"] + rng.randint(-3, 7)),
+            }
+
+    def gen_suppliers(self):
+        rng = self.rng("suppliers")
+        part_numbers = [p["partNumber"] for p in self.parts]
+        for n in range(1, self.args.suppliers + 1):
+            yield {
+                "id": f"supplier-{n:05d}",
+                "name": f"Industrial Supplier {n}",
+                "parts": rng.sample(part_numbers, min(len(part_numbers), rng.randint(5, 40))),
+                "leadTimeDays": rng.randint(1, 21),
+                "reliability": rng.choice(RELIABILITIES),
+                "contactEmail": f"orders@supplier{n}.example.com",
+            }
+
+    def gen_maintenance_history(self):
+        rng = self.rng("maintenance-history")
+        n = 0
+        for machine_id, t in self.machines:
+            machine_type = self.machine_templates[t]["type"]
+            for _ in range(self.args.history_per_machine):
+                n += 1
+                template = rng.choice(self.history_templates)
+                occurred = self.start - timedelta(minutes=rng.randint(60, 730 * 1440))
+                downtime = rng.randint(30, 720)
+                yield {
+                    **template,
+                    "id": f"mh-{n:08d}",
+                    "machineId": machine_id,
+                    "faultType": rng.choice(self.fault_types.get(machine_type, [template["faultType"]])),
+                    "occurrenceDate": isoformat(occurred),
+                    "resolutionDate": isoformat(occurred + timedelta(minutes=downtime)),
+                    "downtime": downtime,
+                    "cost": round(rng.uniform(150, 15000), 2),
+                    "technician": rng.choice(self.technician_ids),
+                    "partsUsed": [p["partNumber"] for p in rng.sample(self.parts, rng.randint(0, 2))],
+                }
+
+    def gen_maintenance_windows(self):
+        rng = self.rng("maintenance-windows")
+        day0 = self.start.replace(hour=0, minute=0, second=0)
+        for d in range(self.args.window_days):
+            day = day0 + timedelta(days=d)
+            weekend = day.weekday() >= 5
+            for shift, hour, hours in SHIFTS:
+                if shift == "Day" and not weekend:
+                    continue
+                start = day + timedelta(hours=hour)
+                impact = "Low" if weekend else ("Medium" if shift == "Night" else "High")
+                yield {
+                    "id": f"mw-{day:%Y-%m-%d}-{shift.lower()}",
+                    "startTime": isoformat(start),
+                    "endTime": isoformat(start + timedelta(hours=hours)),
+                    "productionImpact": impact,
+                    "isAvailable": rng.random() > 0.25,
+                    "shift": shift,
+                    "description": f"{'Weekend' if weekend else 'Weekday'} {shift.lower()} shift",
+                }
+
+    def gen_work_orders(self):
+        rng = self.rng("work-orders")
+        for n in range(1, self.args.work_orders + 1):
+            template = rng.choice(self.work_order_templates)
+            machine_id, t = rng.choice(self.machines)
+            machine_type = self.machine_templates[t]["type"]
+            compatible = [p for p in rng.sample(self.parts, min(len(self.parts), 12))
+                          if machine_type in p["template"]["compatibleMachines"]] or self.parts[:1]
+            used = rng.sample(compatible, min(len(compatible), rng.randint(1, 3)))
+            quantities = [rng.randint(1, 4) for _ in used]
+            created = self.start - timedelta(minutes=rng.randint(0, 365 * 1440))
+            scheduled = created + timedelta(hours=rng.randint(1, 72))
+            estimated = rng.choice([60, 90, 120, 180, 240, 360])
+            status = weighted(rng, STATUSES)
+            doc = {
+                **template,
+                "id": f"wo-{created.year}-{n:07d}",
+                "workOrderNumber": f"WO-{created.year}-{n:07d}",
+                "machineId": machine_id,
+                "faultType": rng.choice(self.fault_types.get(machine_type, ["general_inspection"])),
+                "priority": weighted(rng, PRIORITIES),
+                "status": status,
+                "assignedTo": rng.choice(self.technician_ids),
+                "createdDate": isoformat(created),
+                "scheduledDate": isoformat(scheduled),
+                "estimatedDuration": estimated,
+                "partsUsed": [{"partId": p["id"], "quantity": q} for p, q in zip(used, quantities)],
+                # Shape read by the Challenge 3 agents
+                "requiredParts": [
+                    {"partNumber": p["partNumber"], "partName": p["name"], "quantity": q,
+                     "isAvailable": rng.random() > 0.3}
+                    for p, q in zip(used, quantities)
+                ],
+                "cost": round(rng.uniform(100, 5000), 2),
+            }
+            if status == "completed":
+                actual = int(estimated * rng.uniform(0.7, 1.5))
+                doc["completedDate"] = isoformat(scheduled + timedelta(minutes=actual))
+                doc["actualDuration"] = actual
+            else:
+                for key in ("completedDate", "actualDuration"):
+                    doc.pop(key, None)
+            yield doc
+
+    def gen_telemetry(self):
+        """Readings in time order, one per machine per interval"""
+
+        rng = self.rng("telemetry")
+        interval = timedelta(seconds=self.args.interval_seconds)
+        machines = len(self.machines)
+        steps = math.ceil(self.args.telemetry_rows / machines) if machines else 0
+
+        # Per-machine metric plan: (metric, centre, spread, warning, critical, high_is_bad)
+        plans = []
+        for _, t in self.machines:
+            plan = []
+            for th in self.thresholds_by_type.get(self.machine_templates[t]["type"], []):
+                low, high = th["normalRange"]["min"], th["normalRange"]["max"]
+                high_is_bad = th["criticalThreshold"] >= th["warningThreshold"]
+                plan.append((th["metric"], (low + high) / 2, (high - low) / 6,
+                             th["warningThreshold"], th["criticalThreshold"], high_is_bad))
+            plans.append(plan)
+
+        remaining = self.args.telemetry_rows
+        for step in range(steps):
+            ts = self.start + interval * step
+            stamp = isoformat(ts)
+            compact = ts.strftime("%Y%m%d-%H%M%S")
+            for (machine_id, _), plan in zip(self.machines, plans):
+                if remaining <= 0:
+                    return
+                remaining -= 1
+                metrics = {}
+                status = "normal"
+                for metric, centre, spread, warning, critical, high_is_bad in plan:
+                    roll = rng.random()
+                    if roll < CRITICAL_RATE:
+                        value = critical + abs(rng.gauss(0, spread)) * (1 if high_is_bad else -1)
+                        status = "critical"
+                    elif roll < CRITICAL_RATE + WARNING_RATE:
+                        lo, hi = sorted((warning, critical))
+                        value = rng.uniform(lo, hi)
+                        if status != "critical":
+                            status = "warning"
+                    else:
+                        value = rng.gauss(centre, spread)
+                    metrics[metric] = round(value, 2)
+                yield {
+                    "id": f"telemetry-{machine_id[8:]}-{compact}",
+                    "machineId": machine_id,
+                    "timestamp": stamp,
+                    "metrics": metrics,
+                    "status": status,
+                }
+
+    # -------------------------------------------------------------------------
+    # Output
+    # -------------------------------------------------------------------------
+
+    def write(self, collection, output_dir, fmt):
+        path = os.path.join(output_dir, f"{collection}.{fmt}")
+        writer = WRITERS[fmt](path)
+        generate = getattr(self, "gen_" + collection.replace("-", "_"))
+        started = time.perf_counter()
+        try:
+            for doc in generate():
+                writer.write(doc)
+                if writer.count % 1_000_000 == 0:
+                    rate = writer.count / (time.perf_counter() - started)
+                    print(f"   {collection}: {writer.count:,} documents ({rate:,.0f}/s)")
+        finally:
+            writer.close()
+        elapsed = time.perf_counter() - started
+        print(f"✅ {collection}: {writer.count:,} documents -> {path} ({elapsed:.1f}s)")
+        return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic factory dataset")
+    parser.add_argument("--machines", type=int, default=100)
+    parser.add_argument("--telemetry-rows", type=int, help="Default: 1,000 per machine")
+    parser.add_argument("--interval-seconds", type=int, default=60, help="Telemetry sampling interval")
+    parser.add_argument("--parts", type=int, help="Default: one per 5 machines (at least 16)")
+    parser.add_argument("--suppliers", type=int, help="Default: one per 20 parts (at least 5)")
+    parser.add_argument("--technicians", type=int, help="Default: one per 20 machines (at least 6)")
+    parser.add_argument("--work-orders", type=int, help="Default: two per machine")
+    parser.add_argument("--history-per-machine", type=int, default=5)
+    parser.add_argument("--window-days", type=int, default=30)
+    parser.add_argument("--start", default="2026-01-01T00:00:00Z", help="Telemetry start / reference date")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=sorted(WRITERS), default="jsonl")
+    parser.add_argument("--output-dir", default=os.path.join(DATA_DIR, "synthetic"))
+    parser.add_argument("--only", nargs="+", choices=COLLECTIONS, help="Generate only these collections")
+    args = parser.parse_args()
+
+    template_parts = len(load_fixture("parts-inventory.json"))
+    if args.telemetry_rows is None:
+        args.telemetry_rows = args.machines * 1000
+    if args.parts is None:
+        args.parts = max(template_parts, args.machines // 5)
+    if args.suppliers is None:
+        args.suppliers = max(5, args.parts // 20)
+    if args.technicians is None:
+        args.technicians = max(6, args.machines // 20)
+    if args.work_orders is None:
+        args.work_orders = args.machines * 2
+
+    print("🚀 Generating synthetic dataset...")
+    print(f"   seed={args.seed} machines={args.machines:,} telemetry={args.telemetry_rows:,} "
+          f"format={args.format} -> {args.output_dir}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    generator = SyntheticDataGenerator(args)
+
+    counts = {}
+    for collection in args.only or COLLECTIONS:
+        counts[collection] = generator.write(collection, args.output_dir, args.format)
+
+    manifest = {"seed": args.seed, "format": args.format, "start": args.start,
+                "parameters": {k: v for k, v in vars(args).items() if k not in ("output_dir", "only")},
+                "counts": counts}
+    with open(os.path.join(args.output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"\n🎉 Done: {sum(counts.values()):,} documents")
+
+
+if __name__ == "__main__":
+    main()
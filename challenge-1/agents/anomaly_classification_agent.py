@@ -1,9 +1,10 @@
 import asyncio
+import json
 import os
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
-from agent_framework.azure import AzureAIClient
-from azure.cosmos import CosmosClient
-from azure.identity.aio import AzureCliCredential
 from dotenv import load_dotenv
 
 # TODO: add HostedMCPTool import
@@ -13,52 +14,147 @@ load_dotenv(override=True)
 # Configuration
 project_endpoint = os.environ.get("AZURE_AI_PROJECT_ENDPOINT")
 
-# Initialize Cosmos DB clients globally for function tools
+# Cosmos DB configuration for function tools
 cosmos_endpoint = os.environ.get("COSMOS_ENDPOINT")
 cosmos_key = os.environ.get("COSMOS_KEY")
-cosmos_client = CosmosClient(cosmos_endpoint, cosmos_key)
-database = cosmos_client.get_database_client("FactoryOpsDB")
-thresholds_container = database.get_container_client("Thresholds")
-machines_container = database.get_container_client("Machines")
+
+
+@lru_cache(maxsize=1)
+def get_database():
+    """Create the Cosmos client on first tool call and reuse it afterwards"""
+    from azure.cosmos import CosmosClient
+
+    cosmos_client = CosmosClient(cosmos_endpoint, cosmos_key)
+    return cosmos_client.get_database_client("FactoryOpsDB")
+
+
+@lru_cache(maxsize=None)
+def get_container(name: str):
+    return get_database().get_container_client(name)
+
 
 # MCP configuration
 # TODO: add subscription key and MCP endpoint
 
 
+# Tool results are cached per machine type / machine id so the repeated tool
+# calls within one classification cost no extra round trips
+cache_ttl_seconds = float(os.environ.get("TOOL_CACHE_TTL_SECONDS", "300"))
+_thresholds_cache = {}  # machine type -> (loaded at, rules)
+_machines_cache = {}  # machine id -> (loaded at, machine)
+_machine_partitions = {}  # machine id -> type (the Machines partition key)
+_engine_cache = {}  # "all" -> (loaded at, ThresholdEngine)
+
+
+def _cached(cache: dict, key: str):
+    entry = cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < cache_ttl_seconds:
+        return entry[1]
+    return None
+
+
+def _cache(cache: dict, key: str, value):
+    cache[key] = (time.monotonic(), value)
+    return value
+
+
 def get_thresholds(machine_type: str) -> list:
     """Get all thresholds for a machine type from Cosmos DB"""
+    cached = _cached(_thresholds_cache, machine_type)
+    if cached is not None:
+        return cached
     try:
-        query = f"SELECT * FROM c WHERE c.machineType = '{machine_type}'"
-        items = list(thresholds_container.query_items(
-            query=query,
-            enable_cross_partition_query=True
+        # Thresholds is partitioned on /machineType: single-partition query
+        items = list(get_container("Thresholds").query_items(
+            query="SELECT * FROM c WHERE c.machineType = @machineType",
+            parameters=[{"name": "@machineType", "value": machine_type}],
+            partition_key=machine_type
         ))
-        return items
+        return _cache(_thresholds_cache, machine_type, items)
     except Exception as e:
         return [{"error": str(e)}]
 
 
 def get_machine_data(machine_id: str) -> dict:
     """Get machine data from Cosmos DB"""
+    cached = _cached(_machines_cache, machine_id)
+    if cached is not None:
+        return cached
     try:
-        query = f"SELECT * FROM c WHERE c.id = '{machine_id}'"
-        items = list(machines_container.query_items(
-            query=query,
-            enable_cross_partition_query=True
-        ))
-        return items[0] if items else {"error": f"Machine {machine_id} not found"}
+        container = get_container("Machines")
+        machine_type = _machine_partitions.get(machine_id)
+        if machine_type is not None:
+            # Machines is partitioned on /type: point read once the type is known
+            machine = container.read_item(item=machine_id, partition_key=machine_type)
+        else:
+            items = list(container.query_items(
+                query="SELECT * FROM c WHERE c.id = @id",
+                parameters=[{"name": "@id", "value": machine_id}],
+                enable_cross_partition_query=True
+            ))
+            if not items:
+                return {"error": f"Machine {machine_id} not found"}
+            machine = items[0]
+        _machine_partitions[machine_id] = machine["type"]
+        return _cache(_machines_cache, machine_id, machine)
     except Exception as e:
         return {"error": str(e)}
 
 
-async def main():
+def get_threshold_engine():
+    """Load every threshold rule into the vectorized engine, reloaded after the cache TTL"""
+    cached = _cached(_engine_cache, "all")
+    if cached is not None:
+        return cached
+    from threshold_engine import ThresholdEngine
+
+    rules = list(get_container("Thresholds").query_items(
+        query="SELECT * FROM c",
+        enable_cross_partition_query=True
+    ))
+    # The same load answers later get_thresholds calls
+    by_type = {}
+    for rule in rules:
+        by_type.setdefault(rule["machineType"], []).append(rule)
+    for machine_type, items in by_type.items():
+        _cache(_thresholds_cache, machine_type, items)
+    return _cache(_engine_cache, "all", ThresholdEngine(rules))
+
+
+def classify_anomalies(machine_id: str, anomalies: list) -> dict:
+    """Classify anomaly readings against the machine's thresholds locally (no LLM)"""
+    machine = get_machine_data(machine_id)
+    if "error" in machine:
+        return machine
+    return get_threshold_engine().classify_readings(machine_id, machine["type"], anomalies)
+
+
+# Recent telemetry reaches the agent as per-metric features, never as raw readings
+telemetry_summary_hours = float(os.environ.get("TELEMETRY_SUMMARY_HOURS", "24"))
+telemetry_shape_points = int(os.environ.get("TELEMETRY_SHAPE_POINTS", "0"))
+
+
+def get_telemetry_summary(machine_id: str, hours: float = telemetry_summary_hours) -> dict:
+    """Summarize a machine's recent telemetry per metric: min/max/mean/p95/last, slope per hour and seconds above warning/critical thresholds"""
+    machine = get_machine_data(machine_id)
+    if "error" in machine:
+        return machine
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M:%SZ")
     try:
-        async with AzureCliCredential() as credential:
-            async with (
-                AzureAIClient(credential=credential).create_agent(
-                    name="AnomalyClassificationAgent",
-                    description="Anomaly classification agent",
-                    instructions="""You are a Anomaly Classification Agent evaluating machine anomalies for warning and critical threshold violations.
+        # Telemetry is partitioned on /machineId: single-partition query
+        records = list(get_container("Telemetry").query_items(
+            query="SELECT c.timestamp, c.metrics FROM c WHERE c.machineId = @id AND c.timestamp >= @since",
+            parameters=[{"name": "@id", "value": machine_id}, {"name": "@since", "value": since}],
+            partition_key=machine_id
+        ))
+    except Exception as e:
+        return {"error": str(e)}
+    from telemetry_summary import summarize
+
+    return summarize(machine_id, machine["type"], records, get_threshold_engine(), telemetry_shape_points)
+
+
+AGENT_INSTRUCTIONS = """You are a Anomaly Classification Agent evaluating machine anomalies for warning and critical threshold violations.
                             You will receive anomaly data for a given machine. Your task is to:
                             - Validate each metric against the threshold values 
                             - Raise an alert for maintenance if any critical or warning violations were found
@@ -66,9 +162,15 @@ async def main():
                             You have access to the following tools:
                             - get_machine_data: fetch machine information such as type for a particular machine id
                             - get_thresholds: fetch threshold rules for different metrics per machine type
+                            - classify_anomalies: validate a list of {metric, value} readings for a machine id against its thresholds in one call
+                            - get_telemetry_summary: per-metric summary of a machine's recent telemetry (min, max, mean, p95, trend and time spent above the warning and critical thresholds)
 
                             Use these functions to extract and validate the anomaly data.
 
+                            If the message already contains a classification result (status, alerts and summary)
+                            computed by the threshold engine, do not validate it again or call the tools:
+                            keep that result as-is and only write the human-readable summary.
+
                             Output should be:
                             - alerts with format:
                                 {
@@ -81,10 +183,23 @@ async def main():
                                 }
                             - summary: human readable summary of the anomalies 
 
-                            """,
-                    tools=[
-                        get_machine_data,
-                        get_thresholds]
+                            """
+
+AGENT_TOOLS = [get_machine_data, get_thresholds, classify_anomalies, get_telemetry_summary]
+
+
+async def main():
+    from agent_framework.azure import AzureAIClient
+    from azure.identity.aio import AzureCliCredential
+
+    try:
+        async with AzureCliCredential() as credential:
+            async with (
+                AzureAIClient(credential=credential).create_agent(
+                    name="AnomalyClassificationAgent",
+                    description="Anomaly classification agent",
+                    instructions=AGENT_INSTRUCTIONS,
+                    tools=AGENT_TOOLS
 
                 ) as agent,
             ):
@@ -94,7 +209,14 @@ async def main():
                 # Test the agent with a simple query
                 print("\n🧪 Testing the agent with a sample query...")
                 try:
-                    result = await agent.run('Hello, can you classify the following anomalies for machine-001: [{"metric": "curing_temperature", "value": 179.2},{"metric": "cycle_time", "value": 14.5}]')
+                    anomalies = [{"metric": "curing_temperature", "value": 179.2},
+                                 {"metric": "cycle_time", "value": 14.5}]
+                    # Threshold comparison runs locally; the model only writes the summary
+                    classification = classify_anomalies("machine-001", anomalies)
+                    print(f"✅ Classification: {json.dumps(classification, indent=2)}")
+                    result = await agent.run(
+                        "Summarize the following anomaly classification for machine-001:\n"
+                        f"{json.dumps(classification)}")
                     print(f"✅ Agent response: {result.text}")
                 except Exception as test_error:
                     print(
@@ -1,10 +1,9 @@
 import asyncio
+import json
 import os
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 
-import requests
-from azure.ai.projects import AIProjectClient
-from azure.ai.projects.models import MCPTool, PromptAgentDefinition
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
 from dotenv import load_dotenv
 
 # Configuration
@@ -24,48 +23,256 @@ mainteance_data_mcp_endpoint = os.environ.get(
     "MAINTENANCE_MCP_SERVER_ENDPOINT")
 
 
-def create_apim_mcp_connection(connection_name, mcp_endpoint):
-    # Provide connection details
-    credential = DefaultAzureCredential()
-    project_connection_name = connection_name
+MANAGEMENT_API_VERSION = "2025-10-01-preview"
 
-    # Get bearer token for authentication
-    bearer_token_provider = get_bearer_token_provider(
-        credential, "https://management.azure.com/.default")
-    headers = {
-        "Authorization": f"Bearer {bearer_token_provider()}",
+
+@lru_cache(maxsize=1)
+def get_management_session():
+    """One pooled HTTP session for every ARM call"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=8))
+    return session
+
+
+@lru_cache(maxsize=1)
+def get_management_token_provider():
+    """Bearer token provider for ARM; it caches the token until shortly before expiry"""
+    from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+
+    return get_bearer_token_provider(DefaultAzureCredential(), "https://management.azure.com/.default")
+
+
+def create_apim_mcp_connection(connection_name, mcp_endpoint, force=False):
+    """Create or update a project connection for an APIM-hosted MCP server
+
+    The existing connection is read first and left alone when its target and
+    metadata already match. ARM does not return the stored key, so pass
+    ``force=True`` (or set MCP_CONNECTION_FORCE_UPDATE=1) after rotating it.
+    """
+    session = get_management_session()
+    headers = {"Authorization": f"Bearer {get_management_token_provider()()}"}
+    url = (f"https://management.azure.com{project_resource_id}/connections/{connection_name}"
+           f"?api-version={MANAGEMENT_API_VERSION}")
+    properties = {
+        "authType": "CustomKeys",
+        "category": "RemoteTool",
+        "target": mcp_endpoint,
+        "isSharedToAll": True,
+        "credentials":  {"keys": {"Ocp-Apim-Subscription-Key": os.environ.get("APIM_SUBSCRIPTION_KEY")}},
+        "metadata": {"type": "custom_MCP"}
     }
 
-    # Create project connection
-    response = requests.put(
-        f"https://management.azure.com{project_resource_id}/connections/{project_connection_name}?api-version=2025-10-01-preview",
+    force = force or os.environ.get("MCP_CONNECTION_FORCE_UPDATE", "").lower() in ("1", "true", "yes")
+    if not force:
+        response = session.get(url, headers=headers, timeout=30)
+        if response.status_code != 404:
+            response.raise_for_status()
+            existing = response.json().get("properties", {})
+            if all(existing.get(key) == properties[key] for key in ("authType", "category", "target", "metadata")):
+                print(f"✅ Connection '{connection_name}' is up to date.")
+                return
+
+    response = session.put(
+        url,
         headers=headers,
         json={
-            "name": project_connection_name,
+            "name": connection_name,
             "type": "Microsoft.MachineLearningServices/workspaces/connections",
-            "properties": {
-                "authType": "CustomKeys",
-                "category": "RemoteTool",
-                "target": mcp_endpoint,
-                "isSharedToAll": True,
-                "credentials":  {"keys": {"Ocp-Apim-Subscription-Key": os.environ.get("APIM_SUBSCRIPTION_KEY")}},
-                "metadata": {"type": "custom_MCP"}
-            }
-        }
+            "properties": properties
+        },
+        timeout=30
     )
-
     response.raise_for_status()
     print(
-        f"✅ Connection '{project_connection_name}' created successfully.")
+        f"✅ Connection '{connection_name}' created successfully.")
+
+
+async def provision_mcp_connections(connections):
+    """Create or update ``{connection name: MCP endpoint}`` concurrently"""
+    # Fetch the token once up front so the parallel calls share it
+    await asyncio.to_thread(get_management_token_provider())
+    await asyncio.gather(*(
+        asyncio.to_thread(create_apim_mcp_connection, name, endpoint)
+        for name, endpoint in connections.items()
+    ))
+
+
+# =============================================================================
+# Batch classification
+# =============================================================================
+
+# (machine type, metric, severity band)
+Signature = Tuple[str, str, int]
+
+BATCH_INSTRUCTIONS = """Classify the following anomaly signatures for machine type {machine_type}.
+Each signature is a metric whose readings fell in the given severity band of its threshold rules, with the
+threshold and the worst value observed across the affected machines. Use your tools if you need the rules.
+Respond with JSON only, one alert per signature, in the same order:
+{{"alerts": [{{"name": "<metric>", "severity": "warning" | "critical", "description": "<one sentence>"}}]}}
+
+Signatures:
+{signatures}"""
+
+
+def _bands(engine, machine_type: str, readings: Sequence[dict]) -> List[Optional[int]]:
+    """Severity band of each reading, or None for metrics without a rule
+
+    Values that are missing or not numeric are treated as not reported (band 0).
+    """
+    import numpy as np
+
+    from threshold_engine import _number
+
+    if not readings:
+        return []
+    rules = engine.rules[machine_type]
+    index = rules.index()
+    columns = [index.get(r.get("metric")) for r in readings]
+    values = [[float("nan")] * len(rules.metrics) for _ in readings]
+    for row, (reading, j) in zip(values, zip(readings, columns)):
+        if j is not None:
+            row[j] = _number(reading.get("value"))
+    severity = engine.evaluate(machine_type, np.array(values, ndmin=2))
+    return [None if j is None else int(severity[i, j]) for i, j in enumerate(columns)]
+
+
+async def classify_batch(openai_client, agent_name: str, anomalies: Mapping[str, Sequence[dict]],
+                         machine_types: Mapping[str, str], engine=None,
+                         max_concurrency: int = 4, max_signatures_per_request: int = 25) -> Dict[str, dict]:
+    """Classify ``{machine id: [{metric, value}]}`` with a handful of agent calls
+
+    Readings are banded locally against the threshold rules; each distinct
+    (machine type, metric, severity band) signature is sent to the agent once,
+    grouped per machine type, with at most ``max_concurrency`` requests in
+    flight. The descriptions are then fanned back out into one
+    ``{status, alerts, summary}`` result per machine.
+    """
+    # Deferred with NumPy so creating the agent does not pay for it
+    from threshold_engine import CRITICAL, DATA_DIR, SEVERITY_NAMES, ThresholdEngine
+
+    engine = engine or ThresholdEngine.from_file(os.path.join(DATA_DIR, "thresholds.json"))
+    results: Dict[str, dict] = {}
+    # signature -> worst (signed) value and threshold across machines
+    signatures: Dict[Signature, Dict[str, float]] = {}
+    # machine id -> {signature: worst value on that machine}
+    machine_signatures: Dict[str, Dict[Signature, float]] = {}
+
+    for machine_id, readings in anomalies.items():
+        machine_type = machine_types.get(machine_id)
+        if machine_type not in engine.rules:
+            results[machine_id] = {"error": f"No threshold rules for machine {machine_id} (type {machine_type})"}
+            continue
+        rules = engine.rules[machine_type]
+        index = rules.index()
+        found = machine_signatures[machine_id] = {}
+        for reading, band in zip(readings, _bands(engine, machine_type, readings)):
+            if not band:
+                continue
+            j = index[reading["metric"]]
+            sign = float(rules.sign[j])
+            signature = (machine_type, reading["metric"], band)
+            value = float(reading["value"])
+            if signature not in found or value * sign > found[signature] * sign:
+                found[signature] = value
+            entry = signatures.setdefault(signature, {
+                "value": value,
+                "threshold": float(rules.critical[j] if band == CRITICAL else rules.warning[j]),
+                "sign": sign,
+            })
+            if value * sign > entry["value"] * sign:
+                entry["value"] = value
+
+    by_type: Dict[str, List[Signature]] = {}
+    for signature in signatures:
+        by_type.setdefault(signature[0], []).append(signature)
+    requests = [(machine_type, group[i:i + max_signatures_per_request])
+                for machine_type, group in by_type.items()
+                for i in range(0, len(group), max_signatures_per_request)]
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def classify(machine_type: str, group: List[Signature]) -> Dict[Signature, Optional[str]]:
+        listing = "\n".join(
+            f"- {s[1]}: {SEVERITY_NAMES[s[2]]} (threshold {signatures[s]['threshold']:g}, "
+            f"worst value {signatures[s]['value']:g})"
+            for s in group)
+        async with semaphore:
+            try:
+                # The OpenAI client is synchronous; run each request on a worker thread
+                response = await asyncio.to_thread(
+                    openai_client.responses.create,
+                    input=BATCH_INSTRUCTIONS.format(machine_type=machine_type, signatures=listing),
+                    extra_body={"agent": {"name": agent_name, "type": "agent_reference"}},
+                )
+                alerts = _parse_alerts(response.output_text)
+            except Exception as e:
+                print(f"⚠️  Batch classification for {machine_type} failed, using threshold descriptions: {e}")
+                alerts = []
+        by_metric = {(a.get("name"), a.get("severity")): a.get("description") for a in alerts}
+        return {signature: by_metric.get((signature[1], SEVERITY_NAMES[signature[2]])) for signature in group}
+
+    descriptions: Dict[Signature, Optional[str]] = {}
+    for answered in await asyncio.gather(*(classify(t, g) for t, g in requests)):
+        descriptions.update(answered)
+
+    for machine_id, found in machine_signatures.items():
+        alerts = []
+        for signature, value in found.items():
+            _, metric, band = signature
+            threshold = signatures[signature]["threshold"]
+            verb = "fell below" if signatures[signature]["sign"] < 0 else "exceeded"
+            description = descriptions.get(signature) or \
+                f"{metric} {verb} {SEVERITY_NAMES[band]} threshold {threshold:g}"
+            alerts.append({
+                "name": metric,
+                "severity": SEVERITY_NAMES[band],
+                "description": f"{description} (value {value:g})",
+                "value": value,
+                "threshold": threshold,
+            })
+        critical = sum(1 for a in alerts if a["severity"] == "critical")
+        warning = len(alerts) - critical
+        results[machine_id] = {
+            "status": "high" if critical else "medium" if warning else "normal",
+            "alerts": sorted(alerts, key=lambda a: (a["severity"] != "critical", a["name"])),
+            "summary": {
+                "totalRecordsProcessed": len(anomalies[machine_id]),
+                "violations": {"critical": critical, "warning": warning},
+            },
+        }
+
+    print(f"✅ Classified {len(anomalies)} machines: {len(signatures)} distinct signatures "
+          f"in {len(requests)} agent requests")
+    return results
+
+
+def _parse_alerts(text: str) -> List[dict]:
+    """The ``alerts`` list from a JSON answer, tolerating prose or code fences around it"""
+
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return []
+    try:
+        alerts = json.loads(text[start:end + 1]).get("alerts", [])
+    except (json.JSONDecodeError, AttributeError):
+        return []
+    return [a for a in alerts if isinstance(a, dict)]
 
 
 async def main():
+    from azure.ai.projects import AIProjectClient
+    from azure.ai.projects.models import MCPTool, PromptAgentDefinition
+    from azure.identity import DefaultAzureCredential
+
     try:
-        # Register APIM MCP servers as project connection
-        create_apim_mcp_connection(
-            connection_name="machine-data-connection", mcp_endpoint=machine_data_mcp_endpoint)
-        create_apim_mcp_connection(
-            connection_name="maintenance-data-connection", mcp_endpoint=mainteance_data_mcp_endpoint)
+        # Register APIM MCP servers as project connections
+        await provision_mcp_connections({
+            machine_data_connection_name: machine_data_mcp_endpoint,
+            maintenance_data_connection_name: mainteance_data_mcp_endpoint,
+        })
 
         # Create Agent
         project_client = AIProjectClient(
@@ -141,6 +348,20 @@ async def main():
             )
 
             print(f"✅ Agent response: {response.output_text}")
+
+            # A burst: the latest telemetry of every sample machine, classified in one batch
+            print("\n🧪 Testing batch classification...")
+            from threshold_engine import DATA_DIR, load_machine_types
+
+            with open(os.path.join(DATA_DIR, "machines.json"), encoding="utf-8") as f:
+                machine_types = load_machine_types(json.load(f))
+            with open(os.path.join(DATA_DIR, "telemetry-samples.json"), encoding="utf-8") as f:
+                latest = {r["machineId"]: r for r in json.load(f)}
+            burst = {machine_id: [{"metric": m, "value": v} for m, v in r["metrics"].items()]
+                     for machine_id, r in latest.items()}
+            results = await classify_batch(openai_client, agent.name, burst, machine_types)
+            for machine_id, result in results.items():
+                print(f"   {machine_id}: {json.dumps(result)}")
         except Exception as test_error:
             print(
                 f"⚠️  Agent test failed (but agent was still created): {test_error}")
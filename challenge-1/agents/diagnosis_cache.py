@@ -0,0 +1,154 @@
+"""Cache of Fault Diagnosis Agent answers keyed by fault signature.
+
+The same kind of alert (machine-001 curing temperature 179.2°C above the
+178°C warning) recurs again and again, and its likely root causes only depend
+on what the knowledge base says about that fault. Answers are therefore cached
+under a normalized signature:
+
+    (machine type, metric, severity band, knowledge base version)
+
+where the band is ``warning`` or ``critical`` from the threshold rules and the
+version is ``kb_index.kb_version()``, a hash of knowledge-base.json and the
+kb-wiki pages. Editing the KB or a wiki page changes the version, so old
+answers stop matching, and they are deleted when the cache is next opened (or
+with ``invalidate``). Entries
+expire after ``DIAGNOSIS_CACHE_TTL_SECONDS`` (default one day).
+
+The cache is a SQLite file so it survives across agent runs and can be shared
+by several processes. Hits and misses are counted in the same file, together
+with the agent time the hits saved.
+
+Usage:
+    python agents/diagnosis_cache.py stats
+    python agents/diagnosis_cache.py invalidate [--all]
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from kb_index import DATA_DIR, kb_version
+
+CACHE_PATH = os.environ.get("DIAGNOSIS_CACHE_PATH", os.path.join(DATA_DIR, "diagnosis-cache.sqlite"))
+DEFAULT_TTL_SECONDS = float(os.environ.get("DIAGNOSIS_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+
+@dataclass(frozen=True)
+class FaultSignature:
+    machine_type: str
+    metric: str
+    severity: str  # "warning" | "critical"
+
+    def key(self, version: str) -> str:
+        return "|".join((self.machine_type.strip().lower(), self.metric.strip().lower(),
+                         self.severity.strip().lower(), version))
+
+
+def signature_for(machine_type: str, metric: str, value: float, engine=None) -> Optional[FaultSignature]:
+    """Signature of a reading, banded against the threshold rules; None if it is normal or has no rule"""
+    from threshold_engine import ThresholdEngine
+
+    engine = engine or ThresholdEngine.from_file(os.path.join(DATA_DIR, "thresholds.json"))
+    result = engine.classify_readings("-", machine_type, [{"metric": metric, "value": value}])
+    if not result["alerts"]:
+        return None
+    return FaultSignature(machine_type, metric, result["alerts"][0]["severity"])
+
+
+class DiagnosisCache:
+    """TTL cache of diagnoses in a SQLite file"""
+
+    def __init__(self, path: str = CACHE_PATH, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 version: Optional[str] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.version = version or kb_version()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS diagnoses (key TEXT PRIMARY KEY, kb_version TEXT, answer TEXT, "
+                "created REAL, seconds REAL, hits INTEGER DEFAULT 0)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL)")
+        # Answers from an older KB can never match again
+        self.invalidate()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _count(self, name: str, amount: float = 1.0) -> None:
+        self._db.execute("INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                         (name, amount, amount))
+
+    def get(self, signature: FaultSignature) -> Optional[str]:
+        """Cached answer for ``signature`` under the current KB version, or None"""
+
+        key = signature.key(self.version)
+        with self._db:
+            row = self._db.execute("SELECT answer, created, seconds FROM diagnoses WHERE key = ?", (key,)).fetchone()
+            if row is not None and time.time() - row[1] > self.ttl_seconds:
+                self._db.execute("DELETE FROM diagnoses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count("misses")
+                return None
+            self._db.execute("UPDATE diagnoses SET hits = hits + 1 WHERE key = ?", (key,))
+            self._count("hits")
+            self._count("seconds_saved", row[2] or 0.0)
+            return row[0]
+
+    def put(self, signature: FaultSignature, answer: str, seconds: float = 0.0) -> None:
+        """Store an answer; ``seconds`` is how long the agent took, reported as time saved on hits"""
+
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO diagnoses VALUES (?, ?, ?, ?, ?, 0)",
+                             (signature.key(self.version), self.version, answer, time.time(), seconds))
+
+    def invalidate(self, everything: bool = False) -> int:
+        """Delete answers from other KB versions (or all of them); returns how many"""
+
+        with self._db:
+            if everything:
+                cursor = self._db.execute("DELETE FROM diagnoses")
+            else:
+                cursor = self._db.execute("DELETE FROM diagnoses WHERE kb_version != ?", (self.version,))
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        counters = dict(self._db.execute("SELECT name, value FROM stats").fetchall())
+        hits, misses = int(counters.get("hits", 0)), int(counters.get("misses", 0))
+        entries = self._db.execute("SELECT COUNT(*) FROM diagnoses WHERE kb_version = ?",
+                                   (self.version,)).fetchone()[0]
+        return {
+            "kbVersion": self.version,
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hitRate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "secondsSaved": round(counters.get("seconds_saved", 0.0), 1),
+        }
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the diagnosis cache")
+    parser.add_argument("--path", default=CACHE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Hit rate and entries for the current KB version")
+    invalidate = commands.add_parser("invalidate", help="Drop answers from older KB versions")
+    invalidate.add_argument("--all", action="store_true", help="Drop every cached answer")
+    args = parser.parse_args(argv)
+
+    cache = DiagnosisCache(args.path)
+    if args.command == "invalidate":
+        print(f"✅ Removed {cache.invalidate(everything=args.all)} cached diagnoses")
+    else:
+        for name, value in cache.stats().items():
+            print(f"   {name}: {value}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 import asyncio
+import json
 import os
+import time
+from functools import lru_cache
 
-from azure.ai.projects import AIProjectClient
-from azure.ai.projects.models import MCPTool, PromptAgentDefinition
-from azure.identity import DefaultAzureCredential
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
@@ -16,9 +16,51 @@ search_endpoint = os.environ.get("SEARCH_SERVICE_ENDPOINT")
 machine_wiki_mcp_endpoint = f"{search_endpoint}knowledgebases/{knowledge_base_name}/mcp?api-version=2025-11-01-preview"
 machine_data_mcp_endpoint = os.environ.get("MACHINE_MCP_SERVER_ENDPOINT")
 apim_subscription_key = os.environ.get("APIM_SUBSCRIPTION_KEY")
+local_kb_top_k = int(os.environ.get("LOCAL_KB_TOP_K", "3"))
+
+
+@lru_cache(maxsize=1)
+def get_local_index():
+    """Open (building if needed) the local BM25 index on first use and reuse it afterwards"""
+    # Deferred: NumPy and the index are only needed once a question is asked
+    from kb_index import load_index
+
+    return load_index()
+
+
+def retrieve_local_passages(question, machine_type=None, k=local_kb_top_k):
+    """Top knowledge base passages from the local BM25 index (see kb_index.py)"""
+    return get_local_index().search(question, k, machine_type=machine_type)
+
+
+def summarize_sample_telemetry(machine_id, machine_type):
+    """Per-metric summary of the machine's readings in telemetry-samples.json (see telemetry_summary.py)"""
+    from kb_index import DATA_DIR
+    from telemetry_summary import summarize
+    from threshold_engine import ThresholdEngine
+
+    with open(os.path.join(DATA_DIR, "telemetry-samples.json"), encoding="utf-8") as f:
+        records = [r for r in json.load(f) if r.get("machineId") == machine_id]
+    engine = ThresholdEngine.from_file(os.path.join(DATA_DIR, "thresholds.json"))
+    return summarize(machine_id, machine_type, records, engine)
+
+
+def with_local_context(question, passages, telemetry_summary=None):
+    """Question plus the locally retrieved passages (and a telemetry summary), for the agent to use before its MCP tools"""
+    from kb_index import format_passages
+
+    if passages:
+        question = f"{question}\n\nKnowledge base passages (local index):\n{format_passages(passages)}"
+    if telemetry_summary:
+        question = f"{question}\n\nRecent telemetry, summarized per metric:\n{json.dumps(telemetry_summary)}"
+    return question
 
 
 async def main():
+    from azure.ai.projects import AIProjectClient
+    from azure.ai.projects.models import MCPTool, PromptAgentDefinition
+    from azure.identity import DefaultAzureCredential
+
     try:
 
         project_client = AIProjectClient(
@@ -38,6 +80,9 @@ async def main():
 
                                 Use these functions to determnine the root cause for each alert
 
+                                Requests may include knowledge base passages retrieved from a local index of the same knowledge base.
+                                Treat them as knowledge base content, and only query the MCP Knowledge Base when they do not cover the deviation.
+
                                 Additional rules
                                 - You must never answer from your own knowledge under any circumstances
                                 - If you cannot find the answer in the provided knowledge base you must respond with "I don't know".
@@ -60,28 +105,60 @@ async def main():
         print(f"✅ Created Fault Diagnosis Agent: {agent.id}")
         # Test the agent with a simple query
         print("\n🧪 Testing the agent with a sample query...")
+        machine_id, machine_type = "machine-001", "tire_curing_press"
+        question = ("Hello, what can the issue be when machine-001 has curing temperature reading of 179.2°C "
+                    "that exceeds warning threshold of 178°C?")
+
+        # Recurring faults are answered from the diagnosis cache
+        from diagnosis_cache import DiagnosisCache, signature_for
+
+        cache = DiagnosisCache()
+        signature = signature_for(machine_type, "curing_temperature", 179.2)
+        cached = cache.get(signature) if signature else None
+
+        # Retrieved before any remote call, so the fallback below has them whatever fails
+        passages = []
+        if not cached:
+            try:
+                passages = retrieve_local_passages(question, machine_type=machine_type)
+                print(f"📚 Local knowledge base: {', '.join(p['id'] for p in passages) or 'no matches'}")
+            except Exception as index_error:
+                print(f"⚠️  Local knowledge base unavailable: {index_error}")
         try:
-
-            # Get the OpenAI client for responses and conversations
-            openai_client = project_client.get_openai_client()
-
-            # Create conversation
-            conversation = openai_client.conversations.create()
-
-            # Send request to trigger the MCP tools
-            response = openai_client.responses.create(
-                conversation=conversation.id,
-                input="""
-                    Hello, what can the issue be when machine-001 has curing temperature reading of 179.2°C that exceeds warning threshold of 178°C?
-                """,
-                extra_body={"agent": {"name": agent.name,
-                                      "type": "agent_reference"}},
-            )
-
-            print(f"✅ Agent response: {response.output_text}")
+            if cached:
+                print(f"⚡ Cached diagnosis for {signature}: {cached}")
+            else:
+                # Get the OpenAI client for responses and conversations
+                openai_client = project_client.get_openai_client()
+
+                # Create conversation
+                conversation = openai_client.conversations.create()
+
+                # Features of the machine's readings instead of the raw samples keep the request small
+                telemetry_summary = summarize_sample_telemetry(machine_id, machine_type)
+
+                # Send request to trigger the MCP tools
+                started = time.perf_counter()
+                response = openai_client.responses.create(
+                    conversation=conversation.id,
+                    input=with_local_context(question, passages, telemetry_summary),
+                    extra_body={"agent": {"name": agent.name,
+                                          "type": "agent_reference"}},
+                )
+
+                print(f"✅ Agent response: {response.output_text}")
+                if signature and "I don't know" not in response.output_text:
+                    cache.put(signature, response.output_text, time.perf_counter() - started)
+            print(f"📊 Diagnosis cache: {cache.stats()}")
         except Exception as test_error:
             print(
                 f"⚠️  Agent test failed (but agent was still created): {test_error}")
+            # Fallback: the locally retrieved passages are still useful to the caller
+            if passages:
+                from kb_index import format_passages
+
+                print("📄 Knowledge base passages for this alert (local index):")
+                print(format_passages(passages))
 
         return agent
 
@@ -0,0 +1,270 @@
+"""Local BM25 index over the factory knowledge base.
+
+The corpus is small and static: the entries of knowledge-base.json and the
+sections of the kb-wiki pages. Each becomes a passage tagged with its
+``machineType`` and, where it has one, ``faultType``. The index is written as
+flat NumPy arrays that are memory-mapped on load:
+
+- ``terms.npy``: sorted vocabulary, looked up with binary search
+- ``offsets.npy`` / ``docs.npy`` / ``weights.npy``: postings per term in CSR
+  form, each posting carrying its precomputed BM25 weight
+
+so a query is a handful of array slices and one ``np.add.at``, well under a
+millisecond. ``passages.json`` holds the passage text and tags, and
+``meta.json`` a fingerprint of the sources so a stale index is rebuilt.
+
+The fault diagnosis agent uses ``search`` as a pre-retrieval step (the top
+passages go into the request) and as a fallback when the agent call fails.
+
+Usage:
+    python agents/kb_index.py build
+    python agents/kb_index.py search "curing temperature above 178" [--machine-type tire_curing_press]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DATA_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "challenge-0", "data"))
+KB_PATH = os.path.join(DATA_DIR, "knowledge-base.json")
+WIKI_DIR = os.path.join(DATA_DIR, "kb-wiki")
+INDEX_DIR = os.path.join(DATA_DIR, "kb-index")
+
+K1 = 1.2
+B = 0.75
+# Added to passages whose faultType is the requested one, so they rank first
+FAULT_TYPE_BOOST = 100.0
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can for from has have if in into is it its of on or that the this to "
+    "was what when where which with".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens; snake_case fault types split into words"""
+
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+@dataclass
+class Passage:
+    id: str
+    source: str
+    machineType: str
+    faultType: str
+    title: str
+    text: str
+
+
+# =============================================================================
+# Corpus
+# =============================================================================
+
+
+def kb_passages(path: str = KB_PATH) -> List[Passage]:
+    """One passage per knowledge-base.json entry"""
+
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    passages = []
+    for entry in entries:
+        lines = [entry.get("issue", "")]
+        for label, key in (("Symptoms", "symptoms"), ("Possible causes", "possibleCauses"),
+                           ("Diagnostic steps", "diagnosticSteps"), ("Solutions", "solutions")):
+            if entry.get(key):
+                lines.append(f"{label}: " + "; ".join(entry[key]))
+        for label, key in (("Priority", "priority"), ("Estimated repair time", "estimatedRepairTime"),
+                           ("Impact", "impact")):
+            if entry.get(key):
+                lines.append(f"{label}: {entry[key]}")
+        passages.append(Passage(entry["id"], os.path.basename(path), entry.get("machineType", ""),
+                                entry.get("faultType", ""), entry.get("issue", ""), "\n".join(lines)))
+    return passages
+
+
+def wiki_passages(wiki_dir: str = WIKI_DIR) -> List[Passage]:
+    """One passage per ``##`` section of each kb-wiki page"""
+
+    passages = []
+    for path in sorted(glob.glob(os.path.join(wiki_dir, "*.md"))):
+        with open(path, encoding="utf-8-sig") as f:
+            text = f.read()
+        machine_type = os.path.splitext(os.path.basename(path))[0]
+        front = re.match(r"---\n(.*?)\n---\n", text, re.S)
+        if front:
+            found = re.search(r"^machineType:\s*(\S+)", front.group(1), re.M)
+            machine_type = found.group(1) if found else machine_type
+            text = text[front.end():]
+
+        for n, section in enumerate(re.split(r"^## ", text, flags=re.M)[1:]):
+            title, _, body = section.partition("\n")
+            body = body.strip().rstrip("-").strip()
+            if not body:
+                continue
+            fault = re.search(r"Fault Type:\s*(\w+)", body)
+            passages.append(Passage(f"{machine_type}#{n}", os.path.basename(path), machine_type,
+                                    fault.group(1) if fault else "", title.strip(), f"{title.strip()}\n{body}"))
+    return passages
+
+
+def _fingerprint(kb_path: str, wiki_dir: str) -> List[list]:
+    paths = [kb_path] + sorted(glob.glob(os.path.join(wiki_dir, "*.md")))
+    return [[os.path.basename(p), os.path.getsize(p), int(os.path.getmtime(p))] for p in paths]
+
+
+def kb_version(kb_path: str = KB_PATH, wiki_dir: str = WIKI_DIR) -> str:
+    """Short hash of the knowledge base sources; changes whenever the KB or a wiki page does"""
+
+    digest = hashlib.sha256()
+    for path in [kb_path] + sorted(glob.glob(os.path.join(wiki_dir, "*.md"))):
+        with open(path, "rb") as f:
+            digest.update(os.path.basename(path).encode() + b"\0" + f.read())
+    return digest.hexdigest()[:12]
+
+
+# =============================================================================
+# Index
+# =============================================================================
+
+
+def build_index(index_dir: str = INDEX_DIR, kb_path: str = KB_PATH, wiki_dir: str = WIKI_DIR) -> int:
+    """Build and write the index; returns the number of passages"""
+
+    passages = kb_passages(kb_path) + wiki_passages(wiki_dir)
+    # Tags are indexed with the text so machine and fault type words match too
+    documents = [tokenize(f"{p.machineType} {p.faultType} {p.title} {p.text}") for p in passages]
+    lengths = np.array([len(d) for d in documents], dtype=np.float64)
+    average = float(lengths.mean()) if len(lengths) else 0.0
+
+    postings: Dict[str, Dict[int, int]] = {}
+    for doc, tokens in enumerate(documents):
+        for token in tokens:
+            counts = postings.setdefault(token, {})
+            counts[doc] = counts.get(doc, 0) + 1
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    docs: List[int] = []
+    weights: List[float] = []
+    n = len(documents)
+    for i, term in enumerate(terms):
+        counts = postings[term]
+        idf = math.log(1 + (n - len(counts) + 0.5) / (len(counts) + 0.5))
+        for doc, tf in sorted(counts.items()):
+            norm = K1 * (1 - B + B * lengths[doc] / average)
+            docs.append(doc)
+            weights.append(idf * tf * (K1 + 1) / (tf + norm))
+        offsets[i + 1] = len(docs)
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, "terms.npy"), np.array(terms, dtype=str))
+    np.save(os.path.join(index_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(index_dir, "docs.npy"), np.array(docs, dtype=np.int32))
+    np.save(os.path.join(index_dir, "weights.npy"), np.array(weights, dtype=np.float32))
+    with open(os.path.join(index_dir, "passages.json"), "w", encoding="utf-8") as f:
+        json.dump([asdict(p) for p in passages], f, ensure_ascii=False)
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"sources": _fingerprint(kb_path, wiki_dir), "k1": K1, "b": B}, f)
+    return len(passages)
+
+
+class KnowledgeIndex:
+    """Memory-mapped BM25 index written by ``build_index``"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.terms = np.load(os.path.join(index_dir, "terms.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(index_dir, "docs.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(index_dir, "weights.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "passages.json"), encoding="utf-8") as f:
+            self.passages = [Passage(**p) for p in json.load(f)]
+        self._machine_types = np.array([p.machineType for p in self.passages])
+        self._fault_types = np.array([p.faultType for p in self.passages])
+
+    def search(self, query: str, k: int = 3, machine_type: Optional[str] = None,
+               fault_type: Optional[str] = None) -> List[dict]:
+        """Top ``k`` passages as ``{score, **passage}``, best first
+
+        ``machine_type`` restricts results to that machine (plus untagged
+        passages); a matching ``fault_type`` ranks its passages first.
+        """
+
+        scores = np.zeros(len(self.passages))
+        for token in set(tokenize(query)):
+            i = int(np.searchsorted(self.terms, token))
+            if i < len(self.terms) and self.terms[i] == token:
+                start, end = self.offsets[i], self.offsets[i + 1]
+                np.add.at(scores, self.docs[start:end], self.weights[start:end])
+        if fault_type:
+            scores[self._fault_types == fault_type] += FAULT_TYPE_BOOST
+        if machine_type:
+            scores[(self._machine_types != machine_type) & (self._machine_types != "")] = 0.0
+
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [{"score": round(float(scores[i]), 4), **asdict(self.passages[i])} for i in top if scores[i] > 0]
+
+
+def load_index(index_dir: str = INDEX_DIR, kb_path: str = KB_PATH, wiki_dir: str = WIKI_DIR) -> KnowledgeIndex:
+    """Open the index, (re)building it first when missing or older than its sources"""
+
+    try:
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            current = json.load(f).get("sources") == _fingerprint(kb_path, wiki_dir)
+    except (OSError, ValueError):
+        current = False
+    if not current:
+        build_index(index_dir, kb_path, wiki_dir)
+    return KnowledgeIndex(index_dir)
+
+
+def format_passages(results: Sequence[dict]) -> str:
+    """Passages as prompt context"""
+
+    return "\n\n".join(f"[{r['id']}] ({r['machineType']}) {r['text']}" for r in results)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Local BM25 index over the knowledge base")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="Build the index from knowledge-base.json and kb-wiki")
+    search = commands.add_parser("search", help="Query the index")
+    search.add_argument("query")
+    search.add_argument("-k", type=int, default=3)
+    search.add_argument("--machine-type")
+    search.add_argument("--fault-type")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        count = build_index(args.index_dir)
+        print(f"✅ Indexed {count} passages into {args.index_dir} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+        return
+
+    index = load_index(args.index_dir)
+    started = time.perf_counter()
+    results = index.search(args.query, args.k, args.machine_type, args.fault_type)
+    elapsed = (time.perf_counter() - started) * 1000
+    for r in results:
+        print(f"{r['score']:8.3f}  {r['id']:<32} {r['title']}")
+    print(f"✅ {len(results)} passages in {elapsed:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
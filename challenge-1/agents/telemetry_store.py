@@ -0,0 +1,392 @@
+"""Local columnar store of telemetry history.
+
+Cosmos DB keeps telemetry for 30 days (the ``Telemetry`` container TTL) and
+every document nests its readings in a ``metrics`` object, so scanning months
+of history there is slow and costs RUs. This store keeps a columnar copy on
+disk as Arrow IPC files, partitioned by machine and UTC day:
+
+    <root>/machine=<machineId>/day=<YYYY-MM-DD>/part-<n>.arrow
+
+Each file has a ``timestamp`` column (UTC, milliseconds), ``status`` and one
+float column per metric of that machine, sorted by time. ``append`` buffers
+records and writes one new file per partition when the buffer fills (and on
+``flush``/``close``); ``compact`` later merges the files of a partition into
+one. Files are written under a temporary name and renamed, so readers never
+see a partial file.
+
+``scan`` only opens the partitions of the requested machines and days. Files
+are memory-mapped and read without copying, the time range is cut with a
+binary search on the sorted timestamps, and only the requested metric columns
+are kept, so a range query over months of readings takes seconds or less and
+the result is a ``pyarrow.Table`` ready for ``pyarrow.compute``, NumPy or
+pandas.
+
+The streaming pipeline appends to the store with ``telemetry_stream.py
+--store DIR``; existing exports and synthetic datasets are loaded with
+``ingest``. Requires pyarrow (``pip install pyarrow``).
+
+Usage:
+    python agents/telemetry_store.py ingest ../challenge-0/data/synthetic/telemetry.jsonl
+    python agents/telemetry_store.py query --machine machine-001 --start 2024-12-01 --end 2024-12-08
+    python agents/telemetry_store.py compact
+    python agents/telemetry_store.py stats
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError as e:
+    raise ImportError("The telemetry store requires pyarrow: pip install pyarrow") from e
+
+from threshold_engine import DATA_DIR
+
+STORE_DIR = os.environ.get("TELEMETRY_STORE_DIR", os.path.join(DATA_DIR, "telemetry-store"))
+DEFAULT_BUFFER_ROWS = 250_000
+
+TIMESTAMP = pa.timestamp("ms", tz="UTC")
+DAY_MS = 86_400_000
+
+Instant = Union[datetime, date, str]
+
+
+def _to_datetime(value: Instant) -> datetime:
+    """Aware UTC datetime from a datetime, date or ISO string (naive means UTC)"""
+
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _epoch_ms(value: Instant) -> int:
+    return int(_to_datetime(value).timestamp() * 1000)
+
+
+def _parse_timestamps(values: pa.Array) -> pa.Array:
+    """ISO strings to UTC millisecond timestamps
+
+    Arrow parses ``...Z`` and ``...+00:00`` directly; naive timestamps (taken
+    as UTC) and other odd formats go through ``datetime.fromisoformat``.
+    """
+
+    if pa.types.is_timestamp(values.type):
+        return values.cast(TIMESTAMP, safe=False)
+    try:
+        return values.cast(pa.timestamp("us", tz="UTC")).cast(TIMESTAMP, safe=False)
+    except pa.ArrowInvalid:
+        return pa.array([None if v is None else _epoch_ms(v) for v in values.to_pylist()],
+                        pa.int64()).cast(TIMESTAMP)
+
+
+# =============================================================================
+# Store
+# =============================================================================
+
+
+class TelemetryStore:
+    """Arrow IPC files partitioned by machine and day, with buffered appends"""
+
+    def __init__(self, root: str = STORE_DIR, buffer_rows: int = DEFAULT_BUFFER_ROWS):
+        self.root = root
+        self.buffer_rows = buffer_rows
+        self._buffer: List[pa.Table] = []
+        self._buffered = 0
+        self._sequence = 0
+        self.rows_written = 0
+        self.files_written = 0
+        os.makedirs(root, exist_ok=True)
+
+    def __enter__(self) -> "TelemetryStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _partition_dir(self, machine_id: str, day: str) -> str:
+        return os.path.join(self.root, f"machine={machine_id}", f"day={day}")
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+
+    def append(self, records: Sequence[dict]) -> int:
+        """Buffer telemetry documents (``{machineId, timestamp, metrics, status}``); returns rows accepted
+
+        The buffer is written out once it holds ``buffer_rows`` rows.
+        """
+
+        if not records:
+            return 0
+        return self.append_table(pa.table({
+            "machineId": pa.array([r.get("machineId") for r in records], pa.string()),
+            "timestamp": [r.get("timestamp") for r in records],
+            "status": pa.array([r.get("status") for r in records], pa.string()),
+            "metrics": pa.array([r.get("metrics") for r in records]),
+        }))
+
+    def append_table(self, table: pa.Table) -> int:
+        """Buffer a table of documents as read by ``pyarrow.json`` (``metrics`` a struct column)"""
+
+        # Documents without a machine, time or readings cannot be placed in a partition
+        valid = pc.and_(pc.and_(pc.is_valid(table["machineId"]), pc.is_valid(table["timestamp"])),
+                        pc.is_valid(table["metrics"]))
+        table = table.filter(valid).combine_chunks()
+        if not len(table):
+            return 0
+        metrics = table["metrics"].chunk(0)
+        columns = {
+            "machineId": table["machineId"].chunk(0).cast(pa.string()),
+            "timestamp": _parse_timestamps(table["timestamp"].chunk(0)),
+            "status": (table["status"].chunk(0).cast(pa.string()) if "status" in table.column_names
+                       else pa.nulls(len(table), pa.string())),
+        }
+        for field, values in zip(metrics.type, metrics.flatten()):
+            columns[field.name] = values.cast(pa.float64())
+        self._buffer.append(pa.table(columns))
+        self._buffered += len(table)
+        if self._buffered >= self.buffer_rows:
+            self.flush()
+        return len(table)
+
+    def flush(self) -> int:
+        """Write buffered rows, one new file per partition; returns the number of files"""
+
+        if not self._buffer:
+            return 0
+        table = pa.concat_tables(self._buffer, promote_options="default").combine_chunks()
+        self._buffer.clear()
+
+        machines = table["machineId"].chunk(0).dictionary_encode()
+        codes = machines.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+        millis = table["timestamp"].chunk(0).cast(pa.int64()).to_numpy(zero_copy_only=False)
+        days = millis // DAY_MS
+        # Sort by (machine, day, time) so each partition is one contiguous, time-ordered run
+        order = np.lexsort((millis, days, codes))
+        rows = table.drop_columns(["machineId"]).take(pa.array(order))
+        codes, days = codes[order], days[order]
+        starts = np.concatenate(([0], np.flatnonzero((np.diff(codes) != 0) | (np.diff(days) != 0)) + 1))
+        ends = np.append(starts[1:], len(rows))
+
+        # Metrics of other machine types come out of the struct as nulls; keep only reported ones
+        metric_names = rows.column_names[2:]
+        reported = np.stack([np.add.reduceat(rows[name].is_valid().to_numpy(zero_copy_only=False), starts)
+                             for name in metric_names], axis=1) if metric_names else np.zeros((len(starts), 0))
+        for run, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+            keep = ["timestamp", "status"] + [name for name, n in zip(metric_names, reported[run]) if n]
+            machine_id = machines.dictionary[int(codes[start])].as_py()
+            day = (date(1970, 1, 1) + timedelta(days=int(days[start]))).isoformat()
+            self._write(self._partition_dir(machine_id, day), rows.slice(start, end - start).select(keep))
+
+        self.rows_written += len(rows)
+        self.files_written += len(starts)
+        self._buffered = 0
+        return len(starts)
+
+    def _write(self, directory: str, table: pa.Table) -> str:
+        os.makedirs(directory, exist_ok=True)
+        self._sequence += 1
+        name = f"part-{time.time_ns():x}-{os.getpid()}-{self._sequence}.arrow"
+        path = os.path.join(directory, name)
+        temporary = os.path.join(directory, f".{name}.tmp")
+        with pa.OSFile(temporary, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(temporary, path)
+        return path
+
+    def compact(self, min_files: int = 2) -> int:
+        """Merge the files of every partition with at least ``min_files`` into one; returns partitions merged"""
+
+        merged = 0
+        for directory in sorted(glob.glob(os.path.join(self.root, "machine=*", "day=*"))):
+            paths = sorted(glob.glob(os.path.join(directory, "part-*.arrow")))
+            if len(paths) < min_files:
+                continue
+            table = pa.concat_tables([_read(p) for p in paths], promote_options="default").sort_by("timestamp")
+            self._write(directory, table)
+            for path in paths:
+                os.remove(path)
+            merged += 1
+        return merged
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+
+    def machines(self) -> List[str]:
+        return sorted(os.path.basename(p)[len("machine="):]
+                      for p in glob.glob(os.path.join(self.root, "machine=*")))
+
+    def _partitions(self, machine_ids: Optional[Iterable[str]], first_day: Optional[str],
+                    last_day: Optional[str]) -> Iterator[Tuple[str, str]]:
+        for machine_id in (sorted(machine_ids) if machine_ids else self.machines()):
+            for directory in sorted(glob.glob(os.path.join(self.root, f"machine={machine_id}", "day=*"))):
+                day = os.path.basename(directory)[len("day="):]
+                if (first_day is None or day >= first_day) and (last_day is None or day <= last_day):
+                    yield machine_id, directory
+
+    def scan(self, machine_ids: Optional[Iterable[str]] = None, start: Optional[Instant] = None,
+             end: Optional[Instant] = None, metrics: Optional[Sequence[str]] = None) -> pa.Table:
+        """Readings in ``[start, end)`` as a table with ``machineId``, ``timestamp``, ``status`` and metrics
+
+        ``machine_ids`` and ``metrics`` default to all of them; metrics a
+        machine does not report are null. Rows come ordered by machine, then
+        time.
+        """
+
+        low = _epoch_ms(start) if start is not None else None
+        high = _epoch_ms(end) if end is not None else None
+        first_day = _to_datetime(start).date().isoformat() if start is not None else None
+        last_day = (datetime.fromtimestamp((high - 1) / 1000, timezone.utc).date().isoformat()
+                    if high is not None else None)
+
+        tables = []
+        for machine_id, directory in self._partitions(machine_ids, first_day, last_day):
+            parts = [_cut(_read(p), low, high, metrics) for p in _segments(directory)]
+            parts = [p for p in parts if len(p)]
+            if not parts:
+                continue
+            table = pa.concat_tables(parts, promote_options="default")
+            if len(parts) > 1:
+                table = table.sort_by("timestamp")
+            machine = pa.DictionaryArray.from_arrays(pa.array(np.zeros(len(table), np.int32)),
+                                                     pa.array([machine_id]))
+            tables.append(table.add_column(0, "machineId", machine))
+
+        if not tables:
+            fields = [pa.field("machineId", pa.dictionary(pa.int32(), pa.string())),
+                      pa.field("timestamp", TIMESTAMP), pa.field("status", pa.string())]
+            return pa.schema(fields + [pa.field(m, pa.float64()) for m in metrics or []]).empty_table()
+        return pa.concat_tables(tables, promote_options="default")
+
+    def stats(self) -> dict:
+        partitions = glob.glob(os.path.join(self.root, "machine=*", "day=*"))
+        paths = glob.glob(os.path.join(self.root, "machine=*", "day=*", "part-*.arrow"))
+        days = sorted({os.path.basename(p)[len("day="):] for p in partitions})
+        return {
+            "machines": len(self.machines()),
+            "partitions": len(partitions),
+            "files": len(paths),
+            "rows": sum(_read(p).num_rows for p in paths),
+            "bytes": sum(os.path.getsize(p) for p in paths),
+            "days": f"{days[0]} .. {days[-1]}" if days else "-",
+        }
+
+
+def _segments(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "part-*.arrow")))
+
+
+def _read(path: str) -> pa.Table:
+    """Memory-mapped, zero-copy read of one file"""
+
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def _cut(table: pa.Table, low: Optional[int], high: Optional[int],
+         metrics: Optional[Sequence[str]]) -> pa.Table:
+    """Rows in ``[low, high)`` epoch ms (files are time-sorted) and the requested metric columns"""
+
+    if low is not None or high is not None:
+        millis = table["timestamp"].combine_chunks().cast(pa.int64()).to_numpy(zero_copy_only=False)
+        first = int(np.searchsorted(millis, low, "left")) if low is not None else 0
+        last = int(np.searchsorted(millis, high, "left")) if high is not None else len(millis)
+        table = table.slice(first, max(last - first, 0))
+    if metrics is not None:
+        table = table.select(["timestamp", "status"] + [m for m in metrics if m in table.column_names])
+    return table
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+
+def ingest_file(store: TelemetryStore, path: str, chunk_size: int = 250_000) -> int:
+    """Append a JSONL (parsed by Arrow) or JSON array file of telemetry documents; returns rows"""
+
+    if path.endswith(".jsonl"):
+        import pyarrow.json as pj
+
+        table = pj.read_json(path)
+        for offset in range(0, len(table), chunk_size):
+            store.append_table(table.slice(offset, chunk_size))
+        return len(table)
+
+    with open(path, encoding="utf-8") as f:
+        documents = json.load(f)
+    return sum(store.append(documents[i:i + chunk_size]) for i in range(0, len(documents), chunk_size))
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Local columnar telemetry store")
+    parser.add_argument("--root", default=STORE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="Append telemetry from JSON/JSONL files")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--compact", action="store_true", help="Compact partitions afterwards")
+    query = commands.add_parser("query", help="Range query with per-metric statistics")
+    query.add_argument("--machine", action="append", help="Machine id (repeatable; default all)")
+    query.add_argument("--start", help="ISO date or time, inclusive")
+    query.add_argument("--end", help="ISO date or time, exclusive")
+    query.add_argument("--metric", action="append", help="Metric (repeatable; default all)")
+    commands.add_parser("compact", help="Merge the files of each partition")
+    commands.add_parser("stats", help="Size of the store")
+    args = parser.parse_args(argv)
+
+    store = TelemetryStore(args.root)
+    started = time.perf_counter()
+
+    if args.command == "ingest":
+        for path in args.paths:
+            ingest_file(store, path)
+        store.close()
+        elapsed = time.perf_counter() - started
+        print(f"✅ Stored {store.rows_written:,} readings in {store.files_written:,} files "
+              f"({elapsed:.1f}s, {store.rows_written / max(elapsed, 1e-9):,.0f} readings/s)")
+        if args.compact:
+            print(f"✅ Compacted {store.compact():,} partitions")
+
+    elif args.command == "compact":
+        merged = store.compact()
+        print(f"✅ Compacted {merged:,} partitions ({time.perf_counter() - started:.1f}s)")
+
+    elif args.command == "stats":
+        for name, value in store.stats().items():
+            print(f"   {name}: {value:,}" if isinstance(value, int) else f"   {name}: {value}")
+
+    else:
+        table = store.scan(args.machine, args.start, args.end, args.metric)
+        elapsed = (time.perf_counter() - started) * 1000
+        machines = pc.count_distinct(table["machineId"].cast(pa.string())).as_py()
+        print(f"✅ {table.num_rows:,} readings from {machines:,} machines in {elapsed:.0f} ms")
+        if table.num_rows:
+            span = pc.min_max(table["timestamp"])
+            print(f"   {span['min']} .. {span['max']}")
+        for name in table.column_names[3:]:
+            column = table[name]
+            if column.null_count == len(column):
+                continue
+            stats = pc.min_max(column)
+            mean = pc.mean(column).as_py()
+            print(f"   {name:<28} min {stats['min'].as_py():10.2f}  mean {mean:10.2f}  "
+                  f"max {stats['max'].as_py():10.2f}  n {len(column) - column.null_count:,}")
+
+
+if __name__ == "__main__":
+    main()
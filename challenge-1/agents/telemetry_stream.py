@@ -0,0 +1,546 @@
+"""Streaming telemetry pipeline with windowed threshold detection.
+
+Telemetry is read as an async stream of record chunks, either from a JSONL file
+(``generate_synthetic_data.py`` output, optionally followed like ``tail -f``)
+or from ``QueueSource``, an in-process stand-in for an Event Hubs consumer.
+Readings are grouped per machine and metric into event-time windows:
+
+- tumbling: ``--window 60`` (one window per minute)
+- sliding:  ``--window 300 --step 60`` (a five-minute window every minute)
+
+A sliding window is kept as ``window / step`` panes of running sums, counts and
+peaks, so each reading costs one pane update and closing a window only merges
+a handful of panes. When a window closes, its mean (or peak) is evaluated
+against the machine type's thresholds with ``ThresholdEngine``. Only changes of
+state (normal -> warning -> critical, and back) become alerts; they are batched
+and forwarded to a sink, by default stdout or, with ``--agent``, the Anomaly
+Classification Agent, which then only writes the summary. No model is called
+per reading.
+
+With ``--drift``, every reading also updates a ``DriftStore`` (EWMA, CUSUM
+and trend per machine metric), which reports slow drift before the warning
+threshold is reached; ``--drift-snapshot`` keeps that state across restarts.
+With ``--store DIR``, every chunk is also appended to the local columnar
+history (``telemetry_store.py``) for analyses beyond the Cosmos DB TTL.
+
+Readings older than the machine's current pane (late or out of order) are
+counted and dropped.
+
+Usage:
+    python agents/telemetry_stream.py [TELEMETRY_JSONL] [--window 60] [--step 60] [--agent]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from drift_detector import DriftStore
+from threshold_engine import (CRITICAL, DATA_DIR, NORMAL, WARNING, MachineTypeRules, ThresholdEngine,
+                              load_machine_types)
+
+SEVERITY_LABELS = {NORMAL: "normal", WARNING: "warning", CRITICAL: "critical"}
+
+Chunk = List[dict]
+Sink = Callable[[dict], Awaitable[None]]
+
+
+# =============================================================================
+# Sources
+# =============================================================================
+
+
+async def jsonl_source(path: str, chunk_size: int = 5000, follow: bool = False,
+                       poll_interval: float = 0.5) -> AsyncIterator[Chunk]:
+    """Yield telemetry records from a JSONL file in chunks
+
+    A file starting with ``[`` (telemetry-samples.json) is read as one JSON
+    array. With ``follow`` the file is polled for appended lines and an empty
+    chunk is yielded whenever there is nothing new, so batched alerts still get
+    flushed on time.
+    """
+
+    with open(path, encoding="utf-8") as f:
+        if f.read(1) == "[":
+            f.seek(0)
+            records = json.load(f)
+            for i in range(0, len(records), chunk_size):
+                yield records[i:i + chunk_size]
+            return
+        f.seek(0)
+
+        hint = chunk_size * 256  # readlines() size hint in bytes, ~chunk_size lines
+        partial = ""
+        while True:
+            lines = await asyncio.to_thread(f.readlines, hint)
+            if not lines:
+                if not follow:
+                    break
+                yield []
+                await asyncio.sleep(poll_interval)
+                continue
+            lines[0] = partial + lines[0]
+            partial = "" if lines[-1].endswith("\n") else lines.pop()
+            yield [json.loads(line) for line in lines if line.strip()]
+        if partial.strip():
+            yield [json.loads(partial)]
+
+
+class QueueSource:
+    """Bounded in-process queue standing in for an Event Hubs consumer
+
+    Producers ``await put(record)`` (blocking when the queue is full, which is
+    the backpressure) and ``close()`` when done; the pipeline iterates it for
+    chunks. An empty chunk is yielded after ``idle_timeout`` without records.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, maxsize: int = 100_000, chunk_size: int = 5000, idle_timeout: float = 0.5):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.chunk_size = chunk_size
+        self.idle_timeout = idle_timeout
+
+    async def put(self, record: dict) -> None:
+        await self.queue.put(record)
+
+    def close(self) -> None:
+        self.queue.put_nowait(self._CLOSED)
+
+    async def __aiter__(self) -> AsyncIterator[Chunk]:
+        while True:
+            try:
+                item = await asyncio.wait_for(self.queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                yield []
+                continue
+            chunk: Chunk = []
+            while item is not self._CLOSED:
+                chunk.append(item)
+                if len(chunk) >= self.chunk_size or self.queue.empty():
+                    break
+                item = self.queue.get_nowait()
+            if chunk:
+                yield chunk
+            if item is self._CLOSED:
+                return
+
+
+# =============================================================================
+# Windowing
+# =============================================================================
+
+
+def _epoch_seconds(timestamp) -> float:
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def _utc_iso(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+@dataclass
+class _Pane:
+    """Running aggregates of one step-sized slice of time, one slot per metric"""
+
+    index: int
+    sums: List[float]
+    counts: List[int]
+    peaks: List[float]  # max of value * sign, i.e. the worst reading
+
+
+@dataclass
+class _MachineState:
+    machine_type: str
+    rules: MachineTypeRules
+    columns: List[tuple]  # (metric, column, sign)
+    panes: Deque[_Pane] = field(default_factory=deque)
+    severity: Optional[List[int]] = None  # per metric, from the last closed window
+
+
+@dataclass
+class StreamStats:
+    records: int = 0
+    windows: int = 0
+    alerts: int = 0
+    batches: int = 0
+    late: int = 0
+    skipped: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    def describe(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.records / elapsed if elapsed else 0.0
+        return (f"{self.records:,} records in {elapsed:.1f}s ({rate:,.0f}/s, {rate * 60:,.0f}/min), "
+                f"{self.windows:,} windows, {self.alerts:,} state changes in {self.batches:,} batches, "
+                f"{self.late:,} late, {self.skipped:,} skipped")
+
+
+class WindowedDetector:
+    """Per machine and metric event-time windows with state-change alerts"""
+
+    def __init__(self, engine: ThresholdEngine, machine_types: Dict[str, str], window_seconds: float = 60.0,
+                 step_seconds: Optional[float] = None, aggregate: str = "mean",
+                 drift: Optional[DriftStore] = None):
+        step_seconds = step_seconds or window_seconds
+        panes = window_seconds / step_seconds
+        if panes < 1 or abs(panes - round(panes)) > 1e-9:
+            raise ValueError("window must be a whole multiple of step")
+        if aggregate not in ("mean", "peak"):
+            raise ValueError("aggregate must be 'mean' or 'peak'")
+
+        self.engine = engine
+        self.machine_types = machine_types
+        self.step = float(step_seconds)
+        self.panes_per_window = int(round(panes))
+        self.aggregate = aggregate
+        self.drift = drift
+        self.stats = StreamStats()
+        self._machines: Dict[str, Optional[_MachineState]] = {}
+
+    def _state(self, machine_id: str) -> Optional[_MachineState]:
+        if machine_id not in self._machines:
+            machine_type = self.machine_types.get(machine_id)
+            rules = self.engine.rules.get(machine_type)
+            self._machines[machine_id] = rules and _MachineState(
+                machine_type, rules, [(m, j, float(rules.sign[j])) for j, m in enumerate(rules.metrics)])
+        return self._machines[machine_id]
+
+    def process(self, records: Sequence[dict]) -> List[dict]:
+        """Add a chunk of readings; returns the alerts for windows it closed"""
+
+        closed: List[_ClosedWindow] = []
+        for record in records:
+            state = self._state(record.get("machineId"))
+            if state is None:
+                self.stats.skipped += 1
+                continue
+            try:
+                index = int(_epoch_seconds(record["timestamp"]) // self.step)
+            except (KeyError, TypeError, ValueError):
+                self.stats.skipped += 1
+                continue
+
+            panes = state.panes
+            if not panes or index > panes[-1].index:
+                if panes:
+                    self._advance(record["machineId"], state, index, closed)
+                n = len(state.columns)
+                panes.append(_Pane(index, [0.0] * n, [0] * n, [-np.inf] * n))
+            elif index < panes[-1].index:
+                self.stats.late += 1
+                continue
+
+            pane = panes[-1]
+            metrics = record.get("metrics") or {}
+            for metric, j, sign in state.columns:
+                value = metrics.get(metric)
+                if value is None:
+                    continue
+                pane.sums[j] += value
+                pane.counts[j] += 1
+                signed = value * sign
+                if signed > pane.peaks[j]:
+                    pane.peaks[j] = signed
+
+        self.stats.records += len(records)
+        alerts = self._evaluate(closed)
+        if self.drift is not None:
+            drifting = self.drift.process(records, self.machine_types)
+            self.stats.alerts += len(drifting)
+            alerts.extend(drifting)
+        return alerts
+
+    def flush(self) -> List[dict]:
+        """Close every open window (end of stream)"""
+
+        closed: List[_ClosedWindow] = []
+        for machine_id, state in self._machines.items():
+            if state is not None and state.panes:
+                self._advance(machine_id, state, state.panes[-1].index + self.panes_per_window, closed)
+        return self._evaluate(closed)
+
+    def _advance(self, machine_id: str, state: _MachineState, index: int, closed: List["_ClosedWindow"]) -> None:
+        """Close the windows ending before pane ``index`` and drop panes no window needs"""
+
+        last = state.panes[-1].index
+        # Windows ending more than one window length after the last pane would be empty
+        for end in range(last + 1, min(index, last + self.panes_per_window) + 1):
+            window = [p for p in state.panes if p.index >= end - self.panes_per_window]
+            if window:
+                closed.append(self._aggregate(machine_id, state, window, end))
+        while state.panes and state.panes[0].index <= index - self.panes_per_window:
+            state.panes.popleft()
+
+    def _aggregate(self, machine_id: str, state: _MachineState, window: List[_Pane], end: int) -> "_ClosedWindow":
+        counts = [sum(c) for c in zip(*(p.counts for p in window))]
+        if self.aggregate == "mean":
+            sums = [sum(v) for v in zip(*(p.sums for p in window))]
+            values = [s / c if c else np.nan for s, c in zip(sums, counts)]
+        else:
+            peaks = [max(v) for v in zip(*(p.peaks for p in window))]
+            values = [v * sign if c else np.nan for v, c, (_, _, sign) in zip(peaks, counts, state.columns)]
+        return _ClosedWindow(machine_id, state, values, counts, end)
+
+    def _evaluate(self, closed: List["_ClosedWindow"]) -> List[dict]:
+        """Evaluate closed windows, one array per machine type, and diff against the previous state"""
+
+        by_type: Dict[str, List[_ClosedWindow]] = {}
+        for window in closed:
+            by_type.setdefault(window.state.machine_type, []).append(window)
+        for machine_type, windows in by_type.items():
+            severity = self.engine.evaluate(machine_type, np.array([w.values for w in windows]))
+            for window, row in zip(windows, severity.tolist()):
+                window.severity = row
+
+        alerts: List[dict] = []
+        for window in closed:  # in stream order, so each machine's windows apply in sequence
+            state = window.state
+            previous = state.severity or [NORMAL] * len(window.values)
+            current = list(previous)
+            for j, (severity, count) in enumerate(zip(window.severity, window.counts)):
+                if not count:
+                    continue
+                current[j] = severity
+                if severity != previous[j]:
+                    start = (window.end - self.panes_per_window) * self.step
+                    alerts.append(_state_change(state.rules, j, window.machine_id, previous[j], severity,
+                                                window.values[j], count, start, window.end * self.step))
+            state.severity = current
+
+        self.stats.windows += len(closed)
+        self.stats.alerts += len(alerts)
+        return alerts
+
+
+@dataclass
+class _ClosedWindow:
+    machine_id: str
+    state: _MachineState
+    values: List[float]
+    counts: List[int]
+    end: int  # pane index the window ends before
+    severity: Optional[List[int]] = None
+
+
+def _state_change(rules: MachineTypeRules, j: int, machine_id: str, previous: int, severity: int,
+                  value: float, count: int, start: float, end: float) -> dict:
+    metric = rules.metrics[j]
+    unit = f" {rules.units[j]}" if rules.units[j] else ""
+    if severity == NORMAL:
+        threshold = float(rules.warning[j])
+        description = f"{metric} back to normal (value {value:g}{unit})"
+    else:
+        threshold = float(rules.critical[j] if severity == CRITICAL else rules.warning[j])
+        verb = "fell below" if rules.sign[j] < 0 else "exceeded"
+        description = (f"{metric} {verb} {SEVERITY_LABELS[severity]} threshold {threshold:g}{unit} "
+                       f"(window value {value:g}{unit})")
+    return {
+        "name": metric,
+        "severity": SEVERITY_LABELS[severity],
+        "previousSeverity": SEVERITY_LABELS[previous],
+        "description": description,
+        "machineId": machine_id,
+        "value": value,
+        "threshold": threshold,
+        "count": count,
+        "windowStart": _utc_iso(start),
+        "windowEnd": _utc_iso(end),
+    }
+
+
+# =============================================================================
+# Batching and sinks
+# =============================================================================
+
+
+class AlertBatcher:
+    """Collect state changes and hand them to ``sink`` in batches
+
+    A batch goes out when it reaches ``max_size`` alerts or its oldest alert is
+    ``max_delay`` seconds old. Batches use the classification result shape
+    (status, alerts, summary) the agent already understands.
+    """
+
+    def __init__(self, sink: Sink, max_size: int = 100, max_delay: float = 5.0):
+        self.sink = sink
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.pending: List[dict] = []
+        self.records = 0
+        self._oldest: Optional[float] = None
+
+    async def add(self, alerts: List[dict], records: int) -> int:
+        """Queue alerts for ``records`` readings; returns the number of batches sent"""
+
+        self.records += records
+        if alerts and self._oldest is None:
+            self._oldest = time.monotonic()
+        self.pending.extend(alerts)
+        sent = 0
+        while len(self.pending) >= self.max_size:
+            await self._send(self.pending[:self.max_size])
+            self.pending = self.pending[self.max_size:]
+            sent += 1
+        if self.pending and time.monotonic() - self._oldest >= self.max_delay:
+            sent += await self.flush()
+        elif not self.pending:
+            self._oldest = None
+        return sent
+
+    async def flush(self) -> int:
+        if not self.pending:
+            return 0
+        await self._send(self.pending)
+        self.pending = []
+        self._oldest = None
+        return 1
+
+    async def _send(self, alerts: List[dict]) -> None:
+        critical = sum(1 for a in alerts if a["severity"] == "critical")
+        warning = sum(1 for a in alerts if a["severity"] == "warning")
+        drift = sum(1 for a in alerts if a["severity"] == "drift")
+        batch = {
+            "status": "high" if critical else "medium" if warning else "normal",
+            "alerts": alerts,
+            "summary": {
+                "totalRecordsProcessed": self.records,
+                "violations": {"critical": critical, "warning": warning, "drift": drift},
+            },
+        }
+        self.records = 0
+        await self.sink(batch)
+
+
+async def print_sink(batch: dict) -> None:
+    print(json.dumps(batch))
+
+
+def agent_sink(agent) -> Sink:
+    """Forward each batch to the Anomaly Classification Agent for its summary"""
+
+    async def send(batch: dict) -> None:
+        result = await agent.run(
+            "Summarize the following anomaly classification (threshold state changes "
+            f"from the telemetry stream):\n{json.dumps(batch)}")
+        print(f"🤖 {result.text}")
+
+    return send
+
+
+async def run_pipeline(source: AsyncIterator[Chunk], detector: WindowedDetector, batcher: AlertBatcher,
+                       snapshot: Optional[str] = None, snapshot_interval: float = 60.0,
+                       store=None) -> StreamStats:
+    """Drive ``source`` through the detector until it ends, then close all windows
+
+    With ``snapshot``, the detector's drift state is saved there every
+    ``snapshot_interval`` seconds and at the end. With ``store`` (a
+    ``TelemetryStore``), every chunk is appended to it and flushed at the end.
+    """
+
+    saved = time.monotonic()
+    async for chunk in source:
+        if store is not None:
+            store.append(chunk)
+        alerts = detector.process(chunk)
+        detector.stats.batches += await batcher.add(alerts, len(chunk))
+        if snapshot and detector.drift is not None and time.monotonic() - saved >= snapshot_interval:
+            await asyncio.to_thread(detector.drift.save, snapshot)
+            saved = time.monotonic()
+    await batcher.add(detector.flush(), 0)
+    detector.stats.batches += await batcher.flush()
+    if snapshot and detector.drift is not None:
+        detector.drift.save(snapshot)
+    if store is not None:
+        await asyncio.to_thread(store.flush)
+    return detector.stats
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+
+def load_documents(path: str) -> List[dict]:
+    """Documents from a JSON array file or a JSONL file (synthetic dataset)"""
+
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+async def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Stream telemetry through windowed threshold detection")
+    parser.add_argument("telemetry", nargs="?", default=os.path.join(DATA_DIR, "telemetry-samples.json"))
+    parser.add_argument("--thresholds", default=os.path.join(DATA_DIR, "thresholds.json"))
+    parser.add_argument("--machines", default=os.path.join(DATA_DIR, "machines.json"))
+    parser.add_argument("--window", type=float, default=60.0, help="Window length in seconds")
+    parser.add_argument("--step", type=float, help="Slide in seconds (default: tumbling windows)")
+    parser.add_argument("--aggregate", choices=("mean", "peak"), default="mean")
+    parser.add_argument("--batch-size", type=int, default=100, help="Alerts per batch")
+    parser.add_argument("--batch-delay", type=float, default=5.0, help="Max seconds an alert waits")
+    parser.add_argument("--follow", action="store_true", help="Keep reading lines appended to the file")
+    parser.add_argument("--agent", action="store_true", help="Send batches to the classification agent")
+    parser.add_argument("--drift", action="store_true", help="Also flag slow drift before warning thresholds")
+    parser.add_argument("--drift-snapshot", help="Drift state file (.npz), loaded if present and saved periodically")
+    parser.add_argument("--store", help="Also append the telemetry to a local columnar store in this directory")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final statistics")
+    args = parser.parse_args(argv)
+
+    rules = load_documents(args.thresholds)
+    engine = ThresholdEngine(rules)
+    machine_types = load_machine_types(load_documents(args.machines))
+    drift = None
+    if args.drift or args.drift_snapshot:
+        if args.drift_snapshot and os.path.exists(args.drift_snapshot):
+            drift = DriftStore.load(args.drift_snapshot, rules)
+            print(f"✅ Restored drift state for {drift.size:,} machine metrics from {args.drift_snapshot}")
+        else:
+            drift = DriftStore(rules)
+    detector = WindowedDetector(engine, machine_types, args.window, args.step, args.aggregate, drift)
+    source = jsonl_source(args.telemetry, follow=args.follow)
+    store = None
+    if args.store:
+        from telemetry_store import TelemetryStore
+
+        store = TelemetryStore(args.store)
+
+    async def discard(batch: dict) -> None:
+        pass
+
+    if not args.agent:
+        batcher = AlertBatcher(discard if args.quiet else print_sink, args.batch_size, args.batch_delay)
+        stats = await run_pipeline(source, detector, batcher, args.drift_snapshot, store=store)
+        print(f"✅ {stats.describe()}")
+        if store is not None:
+            print(f"✅ Stored {store.rows_written:,} readings in {args.store}")
+        return
+
+    from agent_framework.azure import AzureAIClient
+    from azure.identity.aio import AzureCliCredential
+
+    from anomaly_classification_agent import AGENT_INSTRUCTIONS, AGENT_TOOLS
+
+    async with AzureCliCredential() as credential:
+        async with AzureAIClient(credential=credential).create_agent(
+                name="AnomalyClassificationAgent",
+                description="Anomaly classification agent",
+                instructions=AGENT_INSTRUCTIONS,
+                tools=AGENT_TOOLS) as agent:
+            batcher = AlertBatcher(agent_sink(agent), args.batch_size, args.batch_delay)
+            stats = await run_pipeline(source, detector, batcher, args.drift_snapshot, store=store)
+            print(f"✅ {stats.describe()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
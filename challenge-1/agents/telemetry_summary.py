@@ -0,0 +1,235 @@
+"""Compact per-metric summaries of a telemetry window for agent prompts.
+
+Handing an agent the raw readings of a machine makes the prompt, and the
+model latency, grow with the window length. ``summarize`` turns a window into
+a fixed set of features per metric instead:
+
+- ``min``, ``max``, ``mean``, ``p95`` and ``last``
+- ``slopePerHour``: least-squares trend over the window
+- ``secondsAboveWarning`` / ``secondsAboveCritical``: time spent past the
+  machine type's thresholds (below them for "low is bad" metrics), each
+  reading counting until the next one
+
+When the shape of a series matters, ``shape_points`` adds an LTTB
+(Largest-Triangle-Three-Buckets) downsample of it as ``[offsetSeconds,
+value]`` pairs. LTTB keeps the peaks and dips that a plain stride would skip,
+and its size does not depend on how many readings the window has.
+
+Usage:
+    python agents/telemetry_summary.py [TELEMETRY_JSON] [--machine machine-001] [--shape 20]
+    python agents/telemetry_summary.py --store DIR --machine machine-001 --start 2024-12-01 --end 2024-12-08
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from threshold_engine import CRITICAL, DATA_DIR, WARNING, ThresholdEngine, load_machine_types
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of ``points`` samples chosen by Largest-Triangle-Three-Buckets
+
+    ``x`` must be increasing. The first and last samples are always kept; in
+    between, each bucket contributes the sample forming the largest triangle
+    with the previously kept sample and the average of the next bucket.
+    """
+
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1][:max(points, 0)], dtype=np.int64)
+
+    every = (n - 2) / (points - 2)
+    kept = np.empty(points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        following = slice(end, min(int((i + 2) * every) + 1, n))
+        avg_x, avg_y = x[following].mean(), y[following].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def _durations(seconds: np.ndarray) -> np.ndarray:
+    """Seconds each reading stands for: until the next one, the last one the median interval"""
+
+    if len(seconds) < 2:
+        return np.zeros(len(seconds))
+    gaps = np.diff(seconds)
+    return np.append(gaps, np.median(gaps))
+
+
+def _round(value: float) -> float:
+    return round(float(value), 3)
+
+
+def _iso(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def epoch_seconds(timestamp: str) -> float:
+    """Seconds since the epoch for an ISO timestamp (naive means UTC)"""
+
+    value = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+# =============================================================================
+# Summaries
+# =============================================================================
+
+
+def summarize_columns(machine_id: str, machine_type: str, seconds: np.ndarray, columns: Mapping[str, np.ndarray],
+                      engine: Optional[ThresholdEngine] = None, shape_points: int = 0) -> dict:
+    """Summary of one machine's window given epoch ``seconds`` and ``{metric: values}`` (NaN = missing)"""
+
+    order = np.argsort(seconds, kind="stable")
+    seconds = np.asarray(seconds, dtype=np.float64)[order]
+    durations = _durations(seconds)
+    rules = engine.rules.get(machine_type) if engine is not None else None
+    index = rules.index() if rules is not None else {}
+
+    metrics: Dict[str, dict] = {}
+    for name, raw in columns.items():
+        values = np.asarray(raw, dtype=np.float64)[order]
+        present = ~np.isnan(values)
+        if not present.any():
+            continue
+        t, v = seconds[present], values[present]
+        features = {
+            "min": _round(v.min()),
+            "max": _round(v.max()),
+            "mean": _round(v.mean()),
+            "p95": _round(np.percentile(v, 95)),
+            "last": _round(v[-1]),
+            "slopePerHour": 0.0,
+        }
+        if len(v) > 1 and np.ptp(t) > 0:
+            centered = t - t.mean()
+            features["slopePerHour"] = _round(3600.0 * (centered @ (v - v.mean())) / (centered @ centered))
+
+        j = index.get(name)
+        if j is not None:
+            column = np.full((len(values), len(rules.metrics)), np.nan)
+            column[:, j] = values
+            severity = engine.evaluate(machine_type, column)[:, j]
+            features["unit"] = rules.units[j]
+            features["warningThreshold"] = float(rules.warning[j])
+            features["criticalThreshold"] = float(rules.critical[j])
+            features["secondsAboveWarning"] = _round(durations[severity >= WARNING].sum())
+            features["secondsAboveCritical"] = _round(durations[severity == CRITICAL].sum())
+
+        if shape_points:
+            kept = lttb(t, v, shape_points)
+            features["shape"] = [[_round(t[k] - seconds[0]), _round(v[k])] for k in kept]
+        metrics[name] = features
+
+    return {
+        "machineId": machine_id,
+        "machineType": machine_type,
+        "start": _iso(seconds[0]) if len(seconds) else None,
+        "end": _iso(seconds[-1]) if len(seconds) else None,
+        "samples": int(len(seconds)),
+        "metrics": metrics,
+    }
+
+
+def summarize(machine_id: str, machine_type: str, records: Sequence[dict],
+              engine: Optional[ThresholdEngine] = None, shape_points: int = 0) -> dict:
+    """Summary of one machine's telemetry documents (``{timestamp, metrics}``)"""
+
+    seconds = np.array([epoch_seconds(r["timestamp"]) for r in records], dtype=np.float64)
+    names: Dict[str, None] = {}
+    for record in records:
+        names.update(dict.fromkeys(record.get("metrics") or {}))
+    columns = {}
+    for name in names:
+        columns[name] = np.array([_number((r.get("metrics") or {}).get(name)) for r in records], dtype=np.float64)
+    return summarize_columns(machine_id, machine_type, seconds, columns, engine, shape_points)
+
+
+def summarize_telemetry(records: Sequence[dict], machine_types: Mapping[str, str],
+                        engine: Optional[ThresholdEngine] = None, shape_points: int = 0) -> List[dict]:
+    """One summary per machine in a batch of telemetry documents"""
+
+    by_machine: Dict[str, List[dict]] = {}
+    for record in records:
+        by_machine.setdefault(record.get("machineId"), []).append(record)
+    return [summarize(machine_id, machine_types.get(machine_id, ""), group, engine, shape_points)
+            for machine_id, group in sorted(by_machine.items()) if machine_id]
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+
+def _store_summaries(args, machine_types: Mapping[str, str], engine: ThresholdEngine) -> List[dict]:
+    import pyarrow.compute as pc
+
+    from telemetry_store import TelemetryStore
+
+    table = TelemetryStore(args.store).scan(args.machine, args.start, args.end)
+    summaries = []
+    for machine_id in sorted(pc.unique(table["machineId"].cast("string")).to_pylist()):
+        rows = table.filter(pc.equal(table["machineId"].cast("string"), machine_id))
+        seconds = rows["timestamp"].cast("int64").to_numpy() / 1000.0
+        columns = {name: pc.fill_null(rows[name], np.nan).to_numpy() for name in rows.column_names[3:]
+                   if rows[name].null_count < len(rows)}
+        summaries.append(summarize_columns(machine_id, machine_types.get(machine_id, ""), seconds, columns,
+                                           engine, args.shape))
+    return summaries
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    from telemetry_stream import load_documents
+
+    parser = argparse.ArgumentParser(description="Summarize telemetry windows per machine and metric")
+    parser.add_argument("telemetry", nargs="?", default=os.path.join(DATA_DIR, "telemetry-samples.json"))
+    parser.add_argument("--thresholds", default=os.path.join(DATA_DIR, "thresholds.json"))
+    parser.add_argument("--machines", default=os.path.join(DATA_DIR, "machines.json"))
+    parser.add_argument("--machine", action="append", help="Machine id (repeatable; default all)")
+    parser.add_argument("--shape", type=int, default=0, help="LTTB points per metric (default: none)")
+    parser.add_argument("--store", help="Read from a telemetry store directory instead of a file")
+    parser.add_argument("--start", help="With --store: ISO date or time, inclusive")
+    parser.add_argument("--end", help="With --store: ISO date or time, exclusive")
+    args = parser.parse_args(argv)
+
+    engine = ThresholdEngine(load_documents(args.thresholds))
+    machine_types = load_machine_types(load_documents(args.machines))
+    if args.store:
+        summaries = _store_summaries(args, machine_types, engine)
+        raw_bytes = None
+    else:
+        records = [r for r in load_documents(args.telemetry) if not args.machine or r.get("machineId") in args.machine]
+        summaries = summarize_telemetry(records, machine_types, engine, args.shape)
+        raw_bytes = len(json.dumps(records))
+
+    print(json.dumps(summaries, indent=2))
+    samples = sum(s["samples"] for s in summaries)
+    size = f"{len(json.dumps(summaries)):,} bytes of JSON"
+    if raw_bytes is not None:
+        size += f" (raw telemetry {raw_bytes:,} bytes)"
+    print(f"✅ {samples:,} readings from {len(summaries)} machines summarized into {size}")
+
+
+if __name__ == "__main__":
+    main()
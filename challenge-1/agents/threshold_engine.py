@@ -0,0 +1,229 @@
+"""Vectorized threshold evaluation for the Anomaly Classification Agent.
+
+Threshold rules (thresholds.json / the Thresholds container) are loaded into
+one set of NumPy arrays per machine type, and telemetry (telemetry-samples.json
+shape) is classified a whole batch at a time. The result has the same
+{status, alerts, summary} structure the agent's instructions define, so the
+model is only needed for the human-readable summary.
+
+Most metrics are "high is bad" (warningThreshold above the normal range); some,
+like extruder throughput, are "low is bad" (criticalThreshold below the warning
+one). Values and thresholds are multiplied by a per-metric sign so both compare
+with >=.
+
+Usage:
+    python agents/threshold_engine.py [TELEMETRY_JSON] [--thresholds PATH] [--machines PATH]
+"""
+
+import argparse
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "challenge-0", "data")
+
+NORMAL, WARNING, CRITICAL = 0, 1, 2
+SEVERITY_NAMES = {WARNING: "warning", CRITICAL: "critical"}
+
+
+@dataclass
+class MachineTypeRules:
+    """Threshold arrays for one machine type, one entry per metric"""
+
+    metrics: List[str]
+    units: List[str]
+    warning: np.ndarray
+    critical: np.ndarray
+    sign: np.ndarray  # +1: high is bad, -1: low is bad
+
+    def index(self) -> Dict[str, int]:
+        return {name: i for i, name in enumerate(self.metrics)}
+
+
+class ThresholdEngine:
+    """Classify telemetry against warning/critical thresholds per machine type"""
+
+    def __init__(self, rules: Iterable[dict]):
+        grouped: Dict[str, List[dict]] = {}
+        for rule in rules:
+            grouped.setdefault(rule["machineType"], []).append(rule)
+
+        self.rules: Dict[str, MachineTypeRules] = {}
+        for machine_type, items in grouped.items():
+            warning = np.array([float(r["warningThreshold"]) for r in items])
+            critical = np.array([float(r["criticalThreshold"]) for r in items])
+            # Critical beyond warning in the downward direction means low is bad
+            sign = np.where(critical < warning, -1.0, 1.0)
+            self.rules[machine_type] = MachineTypeRules(
+                metrics=[r["metric"] for r in items],
+                units=[r.get("unit", "") for r in items],
+                warning=warning,
+                critical=critical,
+                sign=sign,
+            )
+
+    @classmethod
+    def from_file(cls, path: str) -> "ThresholdEngine":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    # -------------------------------------------------------------------------
+    # Evaluation
+    # -------------------------------------------------------------------------
+
+    def evaluate(self, machine_type: str, values: np.ndarray) -> np.ndarray:
+        """Severity (0 normal, 1 warning, 2 critical) for an (n_records, n_metrics) array
+
+        Columns follow ``self.rules[machine_type].metrics``; NaN means not reported.
+        """
+
+        rules = self.rules[machine_type]
+        signed = values * rules.sign
+        severity = (signed >= rules.warning * rules.sign).astype(np.int8)
+        severity += signed >= rules.critical * rules.sign
+        return severity
+
+    def classify_telemetry(self, records: Sequence[dict], machine_types: Mapping[str, str]) -> dict:
+        """Classify telemetry documents; ``machine_types`` maps machineId -> machine type"""
+
+        by_type: Dict[str, List[dict]] = {}
+        skipped = 0
+        for record in records:
+            machine_type = machine_types.get(record.get("machineId"))
+            if machine_type in self.rules:
+                by_type.setdefault(machine_type, []).append(record)
+            else:
+                skipped += 1
+
+        result = _Result()
+        for machine_type, group in by_type.items():
+            rules = self.rules[machine_type]
+            n = len(group)
+            values = np.empty((n, len(rules.metrics)))
+            for j, metric in enumerate(rules.metrics):
+                values[:, j] = np.fromiter(
+                    (_number(r.get("metrics", {}).get(metric)) for r in group), float, count=n)
+            machine_ids = np.array([r["machineId"] for r in group])
+            result.add(rules, machine_ids, values, self.evaluate(machine_type, values))
+
+        return result.to_dict(len(records), skipped)
+
+    def classify_readings(self, machine_id: str, machine_type: str, readings: Sequence[dict]) -> dict:
+        """Classify ``[{"metric": ..., "value": ...}]`` anomaly readings for one machine"""
+
+        rules = self.rules.get(machine_type)
+        if rules is None:
+            return _Result().to_dict(len(readings), len(readings))
+
+        index = rules.index()
+        values = np.full((len(readings), len(rules.metrics)), np.nan)
+        skipped = 0
+        for i, reading in enumerate(readings):
+            j = index.get(reading.get("metric"))
+            if j is None:
+                skipped += 1
+            else:
+                values[i, j] = _number(reading.get("value"))
+
+        result = _Result()
+        machine_ids = np.full(len(readings), machine_id)
+        result.add(rules, machine_ids, values, self.evaluate(machine_type, values))
+        return result.to_dict(len(readings), skipped)
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class _Result:
+    """Accumulates alerts, one per (machine, metric) at its worst severity"""
+
+    def __init__(self):
+        self.alerts: List[dict] = []
+        self.critical = 0
+        self.warning = 0
+
+    def add(self, rules: MachineTypeRules, machine_ids: np.ndarray, values: np.ndarray,
+            severity: np.ndarray) -> None:
+        self.critical += int(np.count_nonzero(severity == CRITICAL))
+        self.warning += int(np.count_nonzero(severity == WARNING))
+
+        for j in np.flatnonzero(severity.any(axis=0)):
+            rows = np.flatnonzero(severity[:, j])
+            machines, inverse = np.unique(machine_ids[rows], return_inverse=True)
+            worst = np.zeros(len(machines), dtype=np.int8)
+            np.maximum.at(worst, inverse, severity[rows, j])
+            # Worst reading in the bad direction, per machine
+            peak = np.full(len(machines), -np.inf)
+            np.maximum.at(peak, inverse, values[rows, j] * rules.sign[j])
+            counts = np.bincount(inverse, minlength=len(machines))
+
+            for k, machine_id in enumerate(machines):
+                self.alerts.append(_alert(rules, j, str(machine_id), int(worst[k]),
+                                          float(peak[k] * rules.sign[j]), int(counts[k])))
+
+    def to_dict(self, total: int, skipped: int) -> dict:
+        if self.critical:
+            status = "high"
+        elif self.warning:
+            status = "medium"
+        else:
+            status = "normal"
+        self.alerts.sort(key=lambda a: (a["severity"] != "critical", a["machineId"], a["name"]))
+        summary = {
+            "totalRecordsProcessed": total,
+            "violations": {"critical": self.critical, "warning": self.warning},
+        }
+        if skipped:
+            summary["skippedRecords"] = skipped
+        return {"status": status, "alerts": self.alerts, "summary": summary}
+
+
+def _alert(rules: MachineTypeRules, j: int, machine_id: str, severity: int, value: float, count: int) -> dict:
+    metric = rules.metrics[j]
+    threshold = float(rules.critical[j] if severity == CRITICAL else rules.warning[j])
+    unit = f" {rules.units[j]}" if rules.units[j] else ""
+    verb = "fell below" if rules.sign[j] < 0 else "exceeded"
+    readings = f" in {count} readings" if count > 1 else ""
+    return {
+        "name": metric,
+        "severity": SEVERITY_NAMES[severity],
+        "description": f"{metric} {verb} {SEVERITY_NAMES[severity]} threshold {threshold:g}{unit} "
+                       f"(value {value:g}{unit}){readings}",
+        "machineId": machine_id,
+        "value": value,
+        "threshold": threshold,
+        "count": count,
+    }
+
+
+def load_machine_types(machines: Iterable[dict]) -> Dict[str, str]:
+    """machineId -> machine type from machines.json-shaped documents"""
+
+    return {m["id"]: m["type"] for m in machines}
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Classify telemetry against machine thresholds")
+    parser.add_argument("telemetry", nargs="?", default=os.path.join(DATA_DIR, "telemetry-samples.json"))
+    parser.add_argument("--thresholds", default=os.path.join(DATA_DIR, "thresholds.json"))
+    parser.add_argument("--machines", default=os.path.join(DATA_DIR, "machines.json"))
+    args = parser.parse_args(argv)
+
+    engine = ThresholdEngine.from_file(args.thresholds)
+    with open(args.machines, encoding="utf-8") as f:
+        machine_types = load_machine_types(json.load(f))
+    with open(args.telemetry, encoding="utf-8") as f:
+        records = json.load(f)
+
+    print(json.dumps(engine.classify_telemetry(records, machine_types), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""Shared setup for the Challenge 1 tests: the agents are flat scripts, so
+their directory goes on the import path."""
+
+import os
+import sys
+
+CHALLENGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(CHALLENGE_DIR, "agents"))
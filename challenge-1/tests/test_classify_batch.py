@@ -0,0 +1,45 @@
+"""classify_batch over a burst of machines, with a stub OpenAI client"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+from anomaly_classification_agent_mcp import classify_batch  # noqa: E402
+
+
+class StubResponses:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, input, extra_body):
+        self.calls += 1
+        alerts = [{"name": "curing_temperature", "severity": "critical", "description": "Too hot"}]
+        return SimpleNamespace(output_text=json.dumps({"alerts": alerts}))
+
+
+def test_burst_with_empty_and_non_numeric_readings():
+    client = SimpleNamespace(responses=StubResponses())
+    burst = {
+        "machine-001": [{"metric": "curing_temperature", "value": 190}],
+        "machine-002": [],
+        "machine-003": [{"metric": "curing_temperature", "value": None},
+                        {"metric": "curing_pressure", "value": "n/a"}],
+    }
+    machine_types = {machine_id: "tire_curing_press" for machine_id in burst}
+
+    results = asyncio.run(classify_batch(client, "agent", burst, machine_types))
+
+    assert client.responses.calls == 1
+    assert results["machine-001"]["status"] == "high"
+    assert results["machine-001"]["alerts"][0]["description"] == "Too hot (value 190)"
+    assert results["machine-002"] == {
+        "status": "normal", "alerts": [],
+        "summary": {"totalRecordsProcessed": 0, "violations": {"critical": 0, "warning": 0}},
+    }
+    assert results["machine-003"]["status"] == "normal"
+    assert results["machine-003"]["summary"]["totalRecordsProcessed"] == 2
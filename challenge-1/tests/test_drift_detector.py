@@ -0,0 +1,47 @@
+"""DriftStore against the challenge-0 threshold rules"""
+
+import json
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from drift_detector import DriftStore  # noqa: E402
+from threshold_engine import DATA_DIR  # noqa: E402
+
+MACHINE_TYPES = {"machine-001": "tire_curing_press"}
+
+
+@pytest.fixture
+def store():
+    with open(os.path.join(DATA_DIR, "thresholds.json"), encoding="utf-8") as f:
+        return DriftStore(json.load(f))
+
+
+def _records(values, start=0):
+    return [{"machineId": "machine-001", "timestamp": 60.0 * (start + i),
+             "metrics": {"curing_temperature": value}} for i, value in enumerate(values)]
+
+
+def test_no_drift_once_past_warning(store):
+    # 190 C is above critical (182): the threshold checks own it, not drift
+    assert store.process(_records([190.0] * 40), MACHINE_TYPES) == []
+
+
+def test_creep_toward_warning_is_reported_at_its_real_level(store):
+    # Normal 165-175, warning 178: creep from 170 to 177 over 70 readings
+    alerts = store.process(_records([170.0 + 0.1 * i for i in range(71)]), MACHINE_TYPES)
+
+    assert [a["name"] for a in alerts] == ["curing_temperature"]
+    assert alerts[0]["value"] < alerts[0]["threshold"] == 178.0
+    assert alerts[0]["hoursToWarning"] > 0
+
+
+def test_drift_stops_once_the_mean_crosses_warning(store):
+    store.process(_records([170.0 + 0.1 * i for i in range(71)]), MACHINE_TYPES)
+    store.process(_records([195.0] * 100, start=71), MACHINE_TYPES)
+
+    slot = dict(store.machine_slots("machine-001", "tire_curing_press"))["curing_temperature"]
+    assert store.mean[slot] > 178.0
+    assert not store.drifting[slot]
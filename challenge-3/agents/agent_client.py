@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Thin client for the agent daemon (agents/agent_daemon.py).
+
+Usage:
+    python agents/agent_client.py scheduler WORK_ORDER_ID [WORK_ORDER_ID ...] [--stream]
+    python agents/agent_client.py parts WORK_ORDER_ID [WORK_ORDER_ID ...] [--consolidate]
+    python agents/agent_client.py ping
+
+Example:
+    python agents/agent_client.py scheduler wo-2024-468
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+DEFAULT_SOCKET_PATH = os.getenv("AGENT_DAEMON_SOCKET", "/tmp/factory-agents.sock")
+
+
+async def send_request(request: dict, socket_path: str = DEFAULT_SOCKET_PATH, port: int = None) -> dict:
+    """Send one request to the daemon and return its response"""
+
+    if port:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    else:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+
+    try:
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        line = await reader.readline()
+        return json.loads(line)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Send work orders to the agent daemon")
+    parser.add_argument("agent", choices=["scheduler", "parts", "ping"])
+    parser.add_argument("work_order_ids", nargs="*")
+    parser.add_argument("--consolidate", action="store_true",
+                        help="Parts agent: one order per supplier across all work orders")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+
+    if args.agent == "ping":
+        request = {"op": "ping"}
+    else:
+        if not args.work_order_ids:
+            parser.error("at least one WORK_ORDER_ID is required")
+        request = {
+            "agent": args.agent,
+            "workOrderIds": args.work_order_ids,
+            "consolidate": args.consolidate,
+            "stream": args.stream,
+        }
+
+    try:
+        response = await send_request(request, args.socket, args.port)
+    except (ConnectionError, FileNotFoundError) as e:
+        print(f"✗ Could not reach agent daemon: {e}")
+        print("  Start it with: python agents/agent_daemon.py")
+        return 1
+
+    print(json.dumps(response, indent=2))
+    return 0 if response.get("ok") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Agent Daemon - keeps both Challenge 3 agents warm behind a local socket.
+
+Every `python agents/<agent>.py` run pays for interpreter start-up, the Azure and
+Agent Framework imports, credential acquisition and portal registration before
+doing any work. The daemon pays those once, then serves work orders over a Unix
+socket (or a localhost TCP port) reusing the same Cosmos client, credential and
+pooled chat agents.
+
+Protocol: one JSON object per line in each direction.
+    {"agent": "scheduler" | "parts", "workOrderIds": ["wo-2024-445"],
+     "consolidate": false, "stream": false}
+    {"op": "ping"}
+
+Usage:
+    python agents/agent_daemon.py [--socket PATH | --port PORT] [--max-concurrency N]
+        [--metrics-port PORT]
+
+With --metrics-port (or METRICS_PORT) the daemon also serves Prometheus metrics
+on http://127.0.0.1:PORT/metrics (see services/metrics.py).
+
+Use agents/agent_client.py to send requests.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+
+from azure.identity.aio import DefaultAzureCredential
+from dotenv import load_dotenv
+
+import maintenance_scheduler_agent as scheduler
+import parts_ordering_agent as parts
+from services.agent_pool import AgentPool
+from services.cosmos_db_service import CosmosDbService
+from services.metrics import QUEUE_DEPTH, start_metrics_server
+from services.observability import enable_tracing
+
+load_dotenv(override=True)
+
+DEFAULT_SOCKET_PATH = os.getenv("AGENT_DAEMON_SOCKET", "/tmp/factory-agents.sock")
+
+
+def _to_json(value) -> str:
+    def default(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        return str(obj)
+
+    if is_dataclass(value):
+        value = asdict(value)
+    elif isinstance(value, list):
+        value = [asdict(v) if is_dataclass(v) else v for v in value]
+    return json.dumps(value, default=default)
+
+
+class AgentDaemon:
+    """Long-running worker holding warm clients for both agents"""
+
+    def __init__(self, max_concurrency: int = 4):
+        self.cosmos_service = CosmosDbService(
+            os.getenv("COSMOS_ENDPOINT"),
+            os.getenv("COSMOS_KEY"),
+            os.getenv("COSMOS_DATABASE_NAME"),
+        )
+        self.foundry_project_endpoint = os.getenv("AI_FOUNDRY_PROJECT_ENDPOINT")
+        self.credential = DefaultAzureCredential()
+        self.agent_pool = AgentPool()
+        self.scheduler_agent = scheduler.MaintenanceSchedulerAgent(
+            self.foundry_project_endpoint,
+            os.getenv("MODEL_DEPLOYMENT_NAME", "gpt-4.1"),
+            self.cosmos_service,
+            credential=self.credential,
+            agent_pool=self.agent_pool,
+        )
+        self.parts_agent = parts.PartsOrderingAgent(
+            self.foundry_project_endpoint,
+            os.getenv("MODEL_DEPLOYMENT_NAME", "gpt-4o"),
+            self.cosmos_service,
+            credential=self.credential,
+            agent_pool=self.agent_pool,
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.started_at = time.monotonic()
+        self.processed = 0
+        self.in_flight = 0
+
+    async def register(self):
+        """Register both agents in the portal once per daemon start"""
+
+        await scheduler.register_agent_in_portal(
+            self.foundry_project_endpoint, self.scheduler_agent.deployment_name)
+        await parts.register_agent_in_portal(
+            self.foundry_project_endpoint, self.parts_agent.deployment_name)
+
+    async def handle(self, request: dict) -> dict:
+        if request.get("op") == "ping":
+            return {
+                "ok": True,
+                "uptimeSeconds": round(time.monotonic() - self.started_at, 1),
+                "processed": self.processed,
+                "inFlight": self.in_flight,
+                "pooledAgents": len(self.agent_pool),
+            }
+
+        agent = request.get("agent")
+        work_order_ids = request.get("workOrderIds") or []
+        stream = bool(request.get("stream", False))
+        if agent not in ("scheduler", "parts") or not work_order_ids:
+            return {"ok": False, "error": "Expected 'agent' (scheduler|parts) and 'workOrderIds'"}
+
+        start = time.perf_counter()
+        self.in_flight += 1
+        QUEUE_DEPTH.inc(queue="daemon")
+        queued = True
+        try:
+            async with self.semaphore:
+                QUEUE_DEPTH.dec(queue="daemon")
+                queued = False
+                if agent == "parts" and request.get("consolidate"):
+                    orders = await parts.run_consolidated(
+                        self.cosmos_service, self.parts_agent, work_order_ids)
+                    results = [{"workOrderIds": work_order_ids,
+                                "result": json.loads(_to_json(orders))}]
+                else:
+                    results = []
+                    for work_order_id in work_order_ids:
+                        if agent == "scheduler":
+                            result = await scheduler.process_work_order(
+                                self.cosmos_service, self.scheduler_agent, work_order_id, stream=stream)
+                        else:
+                            result = await parts.process_work_order(
+                                self.cosmos_service, self.parts_agent, work_order_id, stream=stream)
+                        results.append({"workOrderId": work_order_id,
+                                        "result": json.loads(_to_json(result))})
+        finally:
+            self.in_flight -= 1
+            if queued:
+                QUEUE_DEPTH.dec(queue="daemon")
+
+        self.processed += len(work_order_ids)
+        return {
+            "ok": True,
+            "results": results,
+            "durationMs": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.handle(json.loads(line))
+                except json.JSONDecodeError as e:
+                    response = {"ok": False, "error": f"Invalid request: {e}"}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write((_to_json(response) + "\n").encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def aclose(self):
+        await self.agent_pool.aclose()
+        await self.credential.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH,
+                        help="Unix socket path to listen on")
+    parser.add_argument("--port", type=int,
+                        help="Listen on 127.0.0.1:PORT instead of a Unix socket")
+    parser.add_argument("--max-concurrency", type=int, default=4,
+                        help="Work-order requests processed in parallel")
+    parser.add_argument("--skip-registration", action="store_true",
+                        help="Do not register agent versions in the portal on start")
+    parser.add_argument("--metrics-port", type=int,
+                        default=int(os.getenv("METRICS_PORT", "0")) or None,
+                        help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
+    print("=== Agent Daemon ===\n")
+
+    required = ["COSMOS_ENDPOINT", "COSMOS_KEY", "COSMOS_DATABASE_NAME", "AI_FOUNDRY_PROJECT_ENDPOINT"]
+    if not all(os.getenv(name) for name in required):
+        print("Error: Missing required environment variables.")
+        print(f"Required: {', '.join(required)}")
+        return
+
+    enable_tracing(os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING"))
+
+    daemon = AgentDaemon(max_concurrency=args.max_concurrency)
+    if args.metrics_port:
+        metrics_server = start_metrics_server(args.metrics_port)
+        print(f"✓ Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    if not args.skip_registration:
+        await daemon.register()
+
+    if args.port:
+        server = await asyncio.start_server(daemon.serve_client, "127.0.0.1", args.port)
+        where = f"127.0.0.1:{args.port}"
+    else:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        server = await asyncio.start_unix_server(daemon.serve_client, path=args.socket)
+        where = args.socket
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"✓ Listening on {where} (max concurrency {args.max_concurrency})\n")
+    async with server:
+        await stop.wait()
+
+    print("\nShutting down...")
+    if args.metrics_port:
+        metrics_server.shutdown()
+    await daemon.aclose()
+    if not args.port and os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
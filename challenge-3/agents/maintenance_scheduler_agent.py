@@ -2,10 +2,12 @@
 """Maintenance Scheduler Agent - Predictive maintenance scheduling using Microsoft Agent Framework.
 
 Usage:
-    python agents/maintenance_scheduler_agent.py [WORK_ORDER_ID]
+    python agents/maintenance_scheduler_agent.py --profile-startup
+    python agents/maintenance_scheduler_agent.py [WORK_ORDER_ID] [--stream]
 
 Example:
     python agents/maintenance_scheduler_agent.py wo-2024-468
+    python agents/maintenance_scheduler_agent.py wo-2024-468 --stream
 """
 
 import asyncio
@@ -13,13 +15,9 @@ import json
 import logging
 import os
 import sys
-from datetime import datetime
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
-from agent_framework import ChatAgent
-from agent_framework_azure_ai import AzureAIAgentClient
-from azure.ai.projects.aio import AIProjectClient
-from azure.identity.aio import DefaultAzureCredential
 from dotenv import load_dotenv
 from services.cosmos_db_service import (
     CosmosDbService,
@@ -28,11 +26,61 @@ from services.cosmos_db_service import (
     MaintenanceWindow,
     WorkOrder,
 )
+from services.context_builder import (
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_HISTORY_TOKEN_BUDGET,
+    BuiltContext,
+    ContextBuilder,
+    ContextSection,
+    budget_from_env,
+    trim_history,
+)
+from services.agent_pool import AgentPool, lease_agent
+from services.maintenance_windows import as_utc, impact_rank
 from services.observability import enable_tracing
+from services.stage_timing import pipeline, stage
+from services.startup_profile import profile_startup
+from services.structured_output import (
+    MaintenanceScheduleOutput,
+    run_structured,
+    stream_structured,
+)
 
 logger = logging.getLogger(__name__)
 load_dotenv(override=True)
 
+# Static request text goes first so every run shares the same prompt prefix
+SCHEDULE_REQUEST_TEMPLATE = "\n".join(
+    [
+        "# Predictive Maintenance Analysis Request",
+        "",
+        "## Analysis Required",
+        "Using the data sections below, please provide a JSON response with:",
+        "1. Risk score (0-100): Priority base + MTBF progress + historical impact",
+        "2. Failure probability (0.0-1.0)",
+        "3. Optimal maintenance window selection",
+        "4. Recommended action: IMMEDIATE, URGENT, or SCHEDULED",
+        "5. Detailed reasoning",
+        "",
+        "```json",
+        "{",
+        '  "scheduledDate": "<ISO datetime>",',
+        '  "maintenanceWindow": {',
+        '    "id": "<window ID>",',
+        '    "startTime": "<ISO datetime>",',
+        '    "endTime": "<ISO datetime>",',
+        '    "productionImpact": "<Low|Medium|High>",',
+        '    "isAvailable": true',
+        "  },",
+        '  "riskScore": <0-100>,',
+        '  "predictedFailureProbability": <0.0-1.0>,',
+        '  "recommendedAction": "<IMMEDIATE|URGENT|SCHEDULED>",',
+        '  "reasoning": "<detailed explanation>"',
+        "}",
+        "```",
+    ]
+)
+
 
 # =============================================================================
 # Agent Service
@@ -42,21 +90,51 @@ load_dotenv(override=True)
 class MaintenanceSchedulerAgent:
     """AI Agent for predictive maintenance scheduling"""
 
-    def __init__(self, project_endpoint: str, deployment_name: str, cosmos_service: CosmosDbService):
+    def __init__(
+        self,
+        project_endpoint: str,
+        deployment_name: str,
+        cosmos_service: CosmosDbService,
+        credential=None,
+        agent_pool: Optional[AgentPool] = None,
+        agent_factory: Optional[Callable[[str, str], Any]] = None,
+    ):
         self.project_endpoint = project_endpoint
         self.deployment_name = deployment_name
         self.cosmos_service = cosmos_service
+        # A shared credential and agent pool keep a long-running worker warm
+        self.credential = credential
+        self.agent_pool = agent_pool
+        # (agent_name, instructions) -> chat agent; defaults to Azure AI Foundry
+        self.agent_factory = agent_factory
+        self.context_token_budget = budget_from_env(
+            "CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKEN_BUDGET)
+        self.history_token_budget = budget_from_env(
+            "HISTORY_TOKEN_BUDGET", DEFAULT_HISTORY_TOKEN_BUDGET)
 
     async def predict_schedule(
         self,
         work_order: WorkOrder,
         history: List[MaintenanceHistory],
         windows: List[MaintenanceWindow],
+        stream: bool = False,
+        on_ready: Optional[Callable[[MaintenanceSchedule], Awaitable[None]]] = None,
+        on_reasoning: Optional[Callable[[str], None]] = None,
     ) -> MaintenanceSchedule:
-        """Predict optimal maintenance schedule using AI"""
-
-        context = self._build_context(work_order, history, windows)
-        chat_history_json = await self.cosmos_service.get_machine_chat_history(work_order.machine_id)
+        """Predict optimal maintenance schedule using AI
+
+        With ``stream=True`` the response is parsed as it arrives: ``on_ready`` is
+        awaited with the schedule (empty reasoning) once the structured fields are
+        complete, and ``on_reasoning`` receives the reasoning text as it streams.
+        """
+
+        with stage("build_context") as s:
+            built = self._build_context(work_order, history, windows)
+            s.set(tokens_before=built.tokens_before, tokens_after=built.tokens_after)
+        context = built.text
+        print(f"   {built.summary()}")
+        with stage("load_chat_history"):
+            chat_history_json = await self.cosmos_service.get_machine_chat_history(work_order.machine_id)
         print(
             f"   Using persistent chat history for machine: {work_order.machine_id}")
 
@@ -70,55 +148,90 @@ Analyze historical maintenance data and recommend optimal maintenance schedules
 
 Always respond in valid JSON format as requested."""
 
-        credential = DefaultAzureCredential()
+        # One agent for every run: the instructions are static and each run gets its own thread
+        agent_name = "MaintenanceSchedulerAgent"
 
-        async with ChatAgent(
-            chat_client=AzureAIAgentClient(
-                project_endpoint=self.project_endpoint,
-                model_deployment_name=self.deployment_name,
-                credential=credential,
-                agent_name=f"MaintenanceScheduler-{work_order.machine_id}",
-                should_cleanup_agent=False,  # Keep agent visible in portal
-            ),
-            instructions=instructions,
-        ) as agent:
+        def create_agent():
+            return self._new_chat_agent(agent_name, instructions)
+
+        async with lease_agent(self.agent_pool, agent_name, create_agent) as agent:
             thread = agent.get_new_thread()
 
             if chat_history_json:
                 try:
-                    for msg in json.loads(chat_history_json):
+                    messages = json.loads(chat_history_json)
+                    for msg in trim_history(messages, self.history_token_budget):
                         await thread.add_message(role=msg["role"], content=msg["content"])
                 except Exception as e:
                     print(f"   Warning: Could not restore chat history: {e}")
 
-            result = await agent.run(context, thread=thread)
-            response_text = result.text
+            schedule_id = f"sched-{datetime.now(timezone.utc).timestamp()}"
+
+            with stage("llm", stream=stream):
+                if stream:
+                    async def ready(early: MaintenanceScheduleOutput):
+                        if on_ready:
+                            await on_ready(self._to_schedule(work_order, early, schedule_id))
 
-            await self._save_thread_history(work_order.machine_id, thread)
+                    data, _ = await stream_structured(
+                        agent, context, thread, MaintenanceScheduleOutput,
+                        on_ready=ready, on_stream_text=on_reasoning)
+                else:
+                    data, _ = await run_structured(
+                        agent, context, thread, MaintenanceScheduleOutput)
 
-        json_response = self._extract_json(response_text)
-        data = json.loads(json_response)
+            with stage("save_chat_history"):
+                await self._save_thread_history(work_order.machine_id, thread)
+
+        return self._to_schedule(work_order, data, schedule_id)
+
+    def _to_schedule(
+        self,
+        work_order: WorkOrder,
+        data: MaintenanceScheduleOutput,
+        schedule_id: str,
+    ) -> MaintenanceSchedule:
+        """Convert validated model output into a MaintenanceSchedule"""
 
         return MaintenanceSchedule(
-            id=f"sched-{datetime.utcnow().timestamp()}",
+            id=schedule_id,
             work_order_id=work_order.id,
             machine_id=work_order.machine_id,
-            scheduled_date=datetime.fromisoformat(
-                data["scheduledDate"].replace("Z", "+00:00")),
+            scheduled_date=data.scheduled_date,
             maintenance_window=MaintenanceWindow(
-                id=data["maintenanceWindow"]["id"],
-                start_time=datetime.fromisoformat(
-                    data["maintenanceWindow"]["startTime"].replace("Z", "+00:00")),
-                end_time=datetime.fromisoformat(
-                    data["maintenanceWindow"]["endTime"].replace("Z", "+00:00")),
-                production_impact=data["maintenanceWindow"]["productionImpact"],
-                is_available=data["maintenanceWindow"]["isAvailable"],
+                id=data.maintenance_window.id,
+                start_time=data.maintenance_window.start_time,
+                end_time=data.maintenance_window.end_time,
+                production_impact=data.maintenance_window.production_impact,
+                is_available=data.maintenance_window.is_available,
             ),
-            risk_score=data["riskScore"],
-            predicted_failure_probability=data["predictedFailureProbability"],
-            recommended_action=data["recommendedAction"],
-            reasoning=data["reasoning"],
-            created_at=datetime.utcnow(),
+            risk_score=data.risk_score,
+            predicted_failure_probability=data.predicted_failure_probability,
+            recommended_action=data.recommended_action,
+            reasoning=data.reasoning,
+            created_at=datetime.now(timezone.utc),
+        )
+
+    def _new_chat_agent(self, agent_name: str, instructions: str):
+        """Create the chat agent for a run (or for the agent pool)"""
+
+        if self.agent_factory:
+            return self.agent_factory(agent_name, instructions)
+
+        # Deferred: these imports dominate start-up and are only needed here
+        from agent_framework import ChatAgent
+        from agent_framework_azure_ai import AzureAIAgentClient
+        from azure.identity.aio import DefaultAzureCredential
+
+        return ChatAgent(
+            chat_client=AzureAIAgentClient(
+                project_endpoint=self.project_endpoint,
+                model_deployment_name=self.deployment_name,
+                credential=self.credential or DefaultAzureCredential(),
+                agent_name=agent_name,
+                should_cleanup_agent=False,  # Keep agent visible in portal
+            ),
+            instructions=instructions,
         )
 
     async def _save_thread_history(self, machine_id: str, thread):
@@ -143,38 +256,49 @@ Always respond in valid JSON format as requested."""
         except Exception as e:
             print(f"   Warning: Could not save chat history: {e}")
 
-    def _build_context(self, work_order: WorkOrder, history: List[MaintenanceHistory], windows: List[MaintenanceWindow]) -> str:
-        """Build analysis context for AI"""
-
-        lines = [
-            "# Predictive Maintenance Analysis Request",
-            "",
-            "## Work Order Information",
-            f"- Work Order ID: {work_order.id}",
-            f"- Machine ID: {work_order.machine_id}",
-            f"- Fault Type: {work_order.fault_type}",
-            f"- Priority: {work_order.priority}",
-            f"- Estimated Duration: {work_order.estimated_duration} minutes",
-            "",
-            "## Historical Maintenance Data",
-        ]
+    def _build_context(
+        self,
+        work_order: WorkOrder,
+        history: List[MaintenanceHistory],
+        windows: List[MaintenanceWindow],
+    ) -> BuiltContext:
+        """Build analysis context for AI within the configured token budget"""
+
+        builder = ContextBuilder(self.context_token_budget)
+        builder.add_static(SCHEDULE_REQUEST_TEMPLATE)
+
+        builder.add_section(
+            ContextSection(
+                title="Work Order Information",
+                items=[
+                    f"- Work Order ID: {work_order.id}",
+                    f"- Machine ID: {work_order.machine_id}",
+                    f"- Fault Type: {work_order.fault_type}",
+                    f"- Priority: {work_order.priority}",
+                    f"- Estimated Duration: {work_order.estimated_duration} minutes",
+                ],
+                priority=100,
+                min_items=5,
+            )
+        )
 
+        summary: List[str] = []
         if history:
-            lines.append(f"Total maintenance events: {len(history)}")
-            lines.append("")
+            summary.append(f"Total maintenance events: {len(history)}")
+            summary.append("")
 
             relevant_history = [
                 h for h in history if h.fault_type == work_order.fault_type]
             if relevant_history:
-                lines.append(
+                summary.append(
                     f"**Similar fault type ({work_order.fault_type}):**")
-                lines.append(f"- Occurrences: {len(relevant_history)}")
+                summary.append(f"- Occurrences: {len(relevant_history)}")
                 avg_downtime = sum(
                     h.downtime for h in relevant_history) / len(relevant_history)
                 avg_cost = sum(h.cost for h in relevant_history) / \
                     len(relevant_history)
-                lines.append(f"- Average downtime: {avg_downtime:.0f} minutes")
-                lines.append(f"- Average cost: ${avg_cost:.2f}")
+                summary.append(f"- Average downtime: {avg_downtime:.0f} minutes")
+                summary.append(f"- Average cost: ${avg_cost:.2f}")
 
                 if len(relevant_history) >= 2:
                     dates = sorted(
@@ -183,95 +307,67 @@ Always respond in valid JSON format as requested."""
                         intervals = [
                             (dates[i] - dates[i - 1]).days for i in range(1, len(dates))]
                         avg_interval = sum(intervals) / len(intervals)
-                        lines.append(
+                        summary.append(
                             f"- Mean Time Between Failures (MTBF): {avg_interval:.0f} days")
 
                         last_occurrence = max(
                             h.occurrence_date for h in relevant_history if h.occurrence_date)
                         days_since_last = (
-                            datetime.utcnow() - last_occurrence).days
-                        lines.append(
+                            datetime.now(timezone.utc) - as_utc(last_occurrence)).days
+                        summary.append(
                             f"- Days since last occurrence: {days_since_last:.0f}")
-                        lines.append(
+                        summary.append(
                             f"- Failure cycle progress: {(days_since_last / avg_interval * 100):.1f}%")
             else:
-                lines.append(
+                summary.append(
                     f"**No previous occurrences of {work_order.fault_type} fault type.**")
 
-            lines.append("")
-            lines.append("**Recent maintenance events (all types):**")
-            for record in history[:5]:
-                if record.occurrence_date:
-                    lines.append(
-                        f"- {record.occurrence_date.strftime('%Y-%m-%d')}: {record.fault_type} ({record.downtime}min, ${record.cost})"
-                    )
-        else:
-            lines.append("⚠️  No historical maintenance data available.")
-            lines.append(
-                "Risk assessment will be based on fault type and priority only.")
-
-        lines.extend(["", "## Available Maintenance Windows (Next 14 Days)"])
-
-        if windows:
-            for window in windows[:10]:
-                if window.start_time and window.end_time:
-                    duration = (window.end_time -
-                                window.start_time).total_seconds() / 3600
-                    lines.append(
-                        f"- **{window.start_time.strftime('%Y-%m-%d %H:%M')} to {window.end_time.strftime('%H:%M')}** ({duration:.1f}h)"
-                    )
-                    lines.append(
-                        f"  * Production Impact: {window.production_impact}")
-                    lines.append(f"  * Window ID: {window.id}")
-        else:
-            lines.append("⚠️  No maintenance windows available!")
-
-        lines.extend(
-            [
-                "",
-                "## Analysis Required",
-                "Please provide a JSON response with:",
-                "1. Risk score (0-100): Priority base + MTBF progress + historical impact",
-                "2. Failure probability (0.0-1.0)",
-                "3. Optimal maintenance window selection",
-                "4. Recommended action: IMMEDIATE, URGENT, or SCHEDULED",
-                "5. Detailed reasoning",
-                "",
-                "```json",
-                "{",
-                '  "scheduledDate": "<ISO datetime>",',
-                '  "maintenanceWindow": {',
-                '    "id": "<window ID>",',
-                '    "startTime": "<ISO datetime>",',
-                '    "endTime": "<ISO datetime>",',
-                '    "productionImpact": "<Low|Medium|High>",',
-                '    "isAvailable": true',
-                "  },",
-                '  "riskScore": <0-100>,',
-                '  "predictedFailureProbability": <0.0-1.0>,',
-                '  "recommendedAction": "<IMMEDIATE|URGENT|SCHEDULED>",',
-                '  "reasoning": "<detailed explanation>"',
-                "}",
-                "```",
-            ]
+            summary.append("")
+            summary.append("**Recent maintenance events (all types):**")
+
+        builder.add_section(
+            ContextSection(
+                title="Historical Maintenance Data",
+                preamble=summary,
+                items=[
+                    f"- {record.occurrence_date.strftime('%Y-%m-%d')}: {record.fault_type} ({record.downtime}min, ${record.cost})"
+                    for record in history[:10]
+                    if record.occurrence_date
+                ],
+                priority=10,
+                min_items=1,
+                empty_message=(
+                    "⚠️  No historical maintenance data available.\n"
+                    "Risk assessment will be based on fault type and priority only."
+                ),
+            )
         )
 
-        return "\n".join(lines)
-
-    def _extract_json(self, response: str) -> str:
-        """Extract JSON from response"""
-
-        if "```json" in response:
-            start = response.index("```json") + 7
-            end = response.index("```", start)
-            return response[start:end].strip()
+        ranked_windows = sorted(
+            (w for w in windows if w.start_time and w.end_time),
+            key=lambda w: (impact_rank(w.production_impact), w.start_time),
+        )
+        builder.add_section(
+            ContextSection(
+                title="Available Maintenance Windows (Next 14 Days)",
+                items=[self._format_window(window) for window in ranked_windows],
+                priority=20,
+                min_items=1,
+                empty_message="⚠️  No maintenance windows available!",
+            )
+        )
 
-        start = response.find("{")
-        if start >= 0:
-            end = response.rfind("}")
-            return response[start: end + 1]
+        return builder.build()
 
-        raise Exception("Could not extract JSON from agent response")
+    def _format_window(self, window: MaintenanceWindow) -> str:
+        duration = (window.end_time - window.start_time).total_seconds() / 3600
+        return "\n".join(
+            [
+                f"- **{window.start_time.strftime('%Y-%m-%d %H:%M')} to {window.end_time.strftime('%H:%M')}** ({duration:.1f}h)",
+                f"  * Production Impact: {window.production_impact}",
+                f"  * Window ID: {window.id}",
+            ]
+        )
 
 
 # =============================================================================
@@ -279,32 +375,12 @@ Always respond in valid JSON format as requested."""
 # =============================================================================
 
 
-async def main():
-    """Main program"""
-
-    print("=== Predictive Maintenance Agent ===\n")
-
-    # Load configuration
-    cosmos_endpoint = os.getenv("COSMOS_ENDPOINT")
-    cosmos_key = os.getenv("COSMOS_KEY")
-    database_name = os.getenv("COSMOS_DATABASE_NAME")
-    foundry_project_endpoint = os.getenv("AI_FOUNDRY_PROJECT_ENDPOINT")
-    deployment_name = os.getenv("MODEL_DEPLOYMENT_NAME", "gpt-4.1")
-    app_insights_connection = os.getenv(
-        "APPLICATIONINSIGHTS_CONNECTION_STRING")
-
-    # Validate
-    if not all([cosmos_endpoint, cosmos_key, database_name, foundry_project_endpoint]):
-        print("Error: Missing required environment variables.")
-        print("Required: COSMOS_ENDPOINT, COSMOS_KEY, COSMOS_DATABASE_NAME, AI_FOUNDRY_PROJECT_ENDPOINT")
-        return
-
-    enable_tracing(app_insights_connection)
+async def register_agent_in_portal(foundry_project_endpoint: str, deployment_name: str):
+    """Register a new MaintenanceSchedulerAgent version in Azure AI Foundry portal"""
 
-    cosmos_service = CosmosDbService(
-        cosmos_endpoint, cosmos_key, database_name)
+    from azure.ai.projects.aio import AIProjectClient
+    from azure.identity.aio import DefaultAzureCredential
 
-    # Register agent in Azure AI Foundry portal
     async with (
         DefaultAzureCredential() as credential,
         AIProjectClient(endpoint=foundry_project_endpoint, credential=credential) as project_client,
@@ -351,7 +427,7 @@ Output JSON with: scheduled_date, risk_score (0-100), predicted_failure_probabil
                 metadata={
                     "framework": "agent-framework",
                     "purpose": "maintenance_scheduling",
-                    "timestamp": datetime.utcnow().isoformat(),
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
                 },
             )
             print("   ✅ New version created!")
@@ -368,36 +444,130 @@ Output JSON with: scheduled_date, risk_score (0-100), predicted_failure_probabil
             print(f"   ⚠️  Could not register agent in portal: {e}\n")
             logger.warning(f"Could not register agent in portal: {e}")
 
-    agent_service = MaintenanceSchedulerAgent(
-        foundry_project_endpoint, deployment_name, cosmos_service)
 
+async def book_window(
+    cosmos_service: CosmosDbService,
+    work_order: WorkOrder,
+    schedule: MaintenanceSchedule,
+) -> Optional[MaintenanceWindow]:
+    """Reserve the window the model chose or, if another run got it first, the
+    earliest free window long enough for the work order (no higher impact
+    first, then any). Returns None when nothing can be booked."""
+
+    chosen = schedule.maintenance_window
+    if chosen and chosen.id:
+        window = await cosmos_service.reserve_maintenance_window(chosen.id, work_order.id)
+        if window is not None:
+            return window
+
+    duration = timedelta(minutes=work_order.estimated_duration)
+    if chosen and chosen.production_impact:
+        window = await cosmos_service.reserve_first_window(
+            duration, work_order.id, max_impact=chosen.production_impact)
+        if window is not None:
+            return window
+    return await cosmos_service.reserve_first_window(duration, work_order.id)
+
+
+def apply_window(schedule: MaintenanceSchedule, window: Optional[MaintenanceWindow]) -> None:
+    """Point the schedule at the booked window, moving the date if it changed"""
+
+    if window is not None and (
+            schedule.maintenance_window is None or schedule.maintenance_window.id != window.id):
+        schedule.scheduled_date = window.start_time
+    schedule.maintenance_window = window
+
+
+async def process_work_order(
+    cosmos_service: CosmosDbService,
+    agent_service: MaintenanceSchedulerAgent,
+    work_order_id: str,
+    stream: bool = False,
+) -> Optional[MaintenanceSchedule]:
+    """Schedule maintenance for one work order and persist the result.
+
+    Returns the saved schedule, or None if the run failed (errors are printed).
+    Each numbered step is timed as a stage span (see services.stage_timing).
+    """
+
+    with pipeline("maintenance_scheduler", work_order_id):
+        return await _process_work_order(cosmos_service, agent_service, work_order_id, stream)
+
+
+async def _process_work_order(
+    cosmos_service: CosmosDbService,
+    agent_service: MaintenanceSchedulerAgent,
+    work_order_id: str,
+    stream: bool,
+) -> Optional[MaintenanceSchedule]:
     # Get work order
     print("1. Retrieving work order...")
-    work_order_id = sys.argv[1] if len(sys.argv) > 1 else "wo-2024-468"
 
     try:
-        work_order = await cosmos_service.get_work_order(work_order_id)
+        with stage("retrieve_work_order"):
+            work_order = await cosmos_service.get_work_order(work_order_id)
         print(f"   ✓ Work Order: {work_order.id}")
         print(f"   Machine: {work_order.machine_id}")
         print(f"   Fault: {work_order.fault_type}")
         print(f"   Priority: {work_order.priority}\n")
     except Exception as e:
         print(f"   ✗ Error: {str(e)}")
-        return
+        return None
 
     print("2. Analyzing historical maintenance data...")
-    history = await cosmos_service.get_maintenance_history(work_order.machine_id)
+    with stage("analyze_history") as s:
+        history = await cosmos_service.get_maintenance_history(work_order.machine_id)
+        s.set(items=len(history))
     print(f"   ✓ Found {len(history)} historical maintenance records\n")
 
     print("3. Checking available maintenance windows...")
-    windows = await cosmos_service.get_available_maintenance_windows(14)
+    with stage("check_windows") as s:
+        windows = await cosmos_service.get_available_maintenance_windows(14)
+        s.set(items=len(windows))
     print(f"   ✓ Found {len(windows)} available windows in next 14 days\n")
 
+    booking: Dict[str, Optional[MaintenanceWindow]] = {}
+    # Id of the schedule once it is in Cosmos, so a failed run can remove it again
+    saved: List[str] = []
+
+    async def reserve(candidate: MaintenanceSchedule) -> None:
+        # The streamed early schedule and the final one share a single booking
+        if "window" not in booking:
+            with stage("reserve_window"):
+                booking["window"] = await book_window(cosmos_service, work_order, candidate)
+        apply_window(candidate, booking["window"])
+
     print("4. Running AI predictive analysis...")
     try:
-        schedule = await agent_service.predict_schedule(work_order, history, windows)
+        with stage("ai_analysis", stream=stream):
+            if stream:
+                async def persist_early(early: MaintenanceSchedule):
+                    await reserve(early)
+                    if early.maintenance_window is None:
+                        return
+                    await cosmos_service.save_maintenance_schedule(early)
+                    saved.append(early.id)
+                    print(
+                        f"   ✓ Schedule {early.id} saved ({early.recommended_action}, "
+                        f"risk {early.risk_score}); reasoning still streaming...\n")
+
+                schedule = await agent_service.predict_schedule(
+                    work_order, history, windows, stream=True,
+                    on_ready=persist_early,
+                    on_reasoning=lambda text: print(text, end="", flush=True))
+                print("\n")
+            else:
+                schedule = await agent_service.predict_schedule(work_order, history, windows)
         print("   ✓ Analysis complete!\n")
 
+        print("5. Reserving maintenance window...")
+        await reserve(schedule)
+        if not schedule.maintenance_window:
+            # Leave the work order as it is so a later run can schedule it
+            print("   ✗ No available maintenance window fits this work order; nothing was scheduled\n")
+            return None
+        print(f"   ✓ Reserved {schedule.maintenance_window.id}\n")
+
         print("=== Predictive Maintenance Schedule ===")
         print(f"Schedule ID: {schedule.id}")
         print(f"Machine: {schedule.machine_id}")
@@ -416,20 +586,79 @@ Output JSON with: scheduled_date, risk_score (0-100), predicted_failure_probabil
         print(f"{schedule.reasoning}")
         print()
 
-        print("5. Saving maintenance schedule...")
-        await cosmos_service.save_maintenance_schedule(schedule)
+        print("6. Saving maintenance schedule...")
+        with stage("save_schedule"):
+            await cosmos_service.save_maintenance_schedule(schedule)
+            saved.append(schedule.id)
         print("   ✓ Schedule saved to Cosmos DB\n")
 
-        print("6. Updating work order status...")
-        await cosmos_service.update_work_order_status(work_order.id, "Scheduled")
+        print("7. Updating work order status...")
+        with stage("update_status"):
+            await cosmos_service.update_work_order_status(work_order.id, "Scheduled")
         print("   ✓ Work order status updated to 'Scheduled'\n")
 
         print("✓ Predictive Maintenance Agent completed successfully!")
+        return schedule
     except Exception as e:
         print(f"   ✗ Error during predictive analysis: {str(e)}")
         import traceback
 
         print(f"\nStack trace:\n{traceback.format_exc()}")
+        for schedule_id in dict.fromkeys(saved):
+            try:
+                await cosmos_service.delete_maintenance_schedule(schedule_id)
+                print(f"   ✓ Removed schedule {schedule_id}")
+            except Exception as delete_error:
+                print(f"   ⚠️  Could not remove schedule {schedule_id}: {delete_error}")
+        window = booking.get("window")
+        if window is not None:
+            try:
+                await cosmos_service.release_maintenance_window(window.id, work_order.id)
+                print(f"   ✓ Released maintenance window {window.id}")
+            except Exception as release_error:
+                print(f"   ⚠️  Could not release maintenance window {window.id}: {release_error}")
+        return None
+
+
+async def main():
+    """Main program"""
+
+    if "--profile-startup" in sys.argv[1:]:
+        profile_startup(os.path.abspath(__file__), sys.argv[1:])
+        return
+
+    print("=== Predictive Maintenance Agent ===\n")
+
+    # Load configuration
+    cosmos_endpoint = os.getenv("COSMOS_ENDPOINT")
+    cosmos_key = os.getenv("COSMOS_KEY")
+    database_name = os.getenv("COSMOS_DATABASE_NAME")
+    foundry_project_endpoint = os.getenv("AI_FOUNDRY_PROJECT_ENDPOINT")
+    deployment_name = os.getenv("MODEL_DEPLOYMENT_NAME", "gpt-4.1")
+    app_insights_connection = os.getenv(
+        "APPLICATIONINSIGHTS_CONNECTION_STRING")
+
+    # Validate
+    if not all([cosmos_endpoint, cosmos_key, database_name, foundry_project_endpoint]):
+        print("Error: Missing required environment variables.")
+        print("Required: COSMOS_ENDPOINT, COSMOS_KEY, COSMOS_DATABASE_NAME, AI_FOUNDRY_PROJECT_ENDPOINT")
+        return
+
+    enable_tracing(app_insights_connection)
+
+    cosmos_service = CosmosDbService(
+        cosmos_endpoint, cosmos_key, database_name)
+
+    await register_agent_in_portal(foundry_project_endpoint, deployment_name)
+
+    agent_service = MaintenanceSchedulerAgent(
+        foundry_project_endpoint, deployment_name, cosmos_service)
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    stream = "--stream" in sys.argv[1:]
+    work_order_id = args[0] if args else "wo-2024-468"
+
+    await process_work_order(cosmos_service, agent_service, work_order_id, stream=stream)
 
 
 if __name__ == "__main__":
@@ -2,10 +2,14 @@
 """Parts Ordering Agent - Automated parts ordering using Microsoft Agent Framework.
 
 Usage:
-    python agents/parts_ordering_agent.py [WORK_ORDER_ID]
+    python agents/parts_ordering_agent.py --profile-startup
+    python agents/parts_ordering_agent.py [WORK_ORDER_ID] [--stream]
+    python agents/parts_ordering_agent.py --consolidate WORK_ORDER_ID [WORK_ORDER_ID ...]
 
 Example:
     python agents/parts_ordering_agent.py wo-2024-468
+    python agents/parts_ordering_agent.py wo-2024-468 --stream
+    python agents/parts_ordering_agent.py --consolidate wo-2024-456 wo-2024-468
 """
 
 import asyncio
@@ -14,13 +18,10 @@ import logging
 import os
 import sys
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-from agent_framework import ChatAgent
-from agent_framework_azure_ai import AzureAIAgentClient
-from azure.ai.projects.aio import AIProjectClient
-from azure.identity.aio import DefaultAzureCredential
 from dotenv import load_dotenv
 from services.cosmos_db_service import (
     CosmosDbService,
@@ -30,11 +31,103 @@ from services.cosmos_db_service import (
     Supplier,
     WorkOrder,
 )
+from services.context_builder import (
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_HISTORY_TOKEN_BUDGET,
+    BuiltContext,
+    ContextBuilder,
+    ContextSection,
+    budget_from_env,
+    trim_history,
+)
+from services.agent_pool import AgentPool, lease_agent
 from services.observability import enable_tracing
+from services.stage_timing import pipeline, stage
+from services.startup_profile import profile_startup
+from services.structured_output import (
+    ConsolidatedOrderOutput,
+    PartsOrderOutput,
+    run_structured,
+    stream_structured,
+)
 
 logger = logging.getLogger(__name__)
 load_dotenv(override=True)
 
+PRIORITY_RANK = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+RELIABILITY_RANK = {"high": 0, "medium": 1, "low": 2}
+
+# Every run shares one pooled agent: the instructions are static and each run gets its own thread
+PARTS_AGENT_NAME = "PartsOrderingAgent"
+
+# Static request text goes first so every run shares the same prompt prefix
+ORDER_REQUEST_TEMPLATE = "\n".join(
+    [
+        "# Parts Ordering Analysis Request",
+        "",
+        "## Analysis Required",
+        "Using the data sections below, please provide a JSON response with:",
+        "1. Parts to order",
+        "2. Optimal supplier selection (reliability > lead time > cost)",
+        "3. Expected delivery date",
+        "4. Total order cost",
+        "",
+        "```json",
+        "{",
+        '  "supplierId": "<supplier ID>",',
+        '  "supplierName": "<supplier name>",',
+        '  "orderItems": [',
+        "    {",
+        '      "partNumber": "<part number>",',
+        '      "partName": "<part name>",',
+        '      "quantity": <number>,',
+        '      "unitCost": <decimal>,',
+        '      "totalCost": <decimal>',
+        "    }",
+        "  ],",
+        '  "totalCost": <decimal>,',
+        '  "expectedDeliveryDate": "<ISO datetime>",',
+        '  "reasoning": "<explanation>"',
+        "}",
+        "```",
+    ]
+)
+
+CONSOLIDATED_REQUEST_TEMPLATE = "\n".join(
+    [
+        "# Consolidated Parts Ordering Request",
+        "",
+        "## Analysis Required",
+        "Quantities are fixed. Using the data sections below, please provide a JSON response",
+        "with a unit cost for every part to order and the expected delivery date for the",
+        "most urgent work order:",
+        "",
+        "```json",
+        "{",
+        '  "orderItems": [',
+        "    {",
+        '      "partNumber": "<part number>",',
+        '      "unitCost": <decimal>',
+        "    }",
+        "  ],",
+        '  "expectedDeliveryDate": "<ISO datetime>",',
+        '  "reasoning": "<explanation>"',
+        "}",
+        "```",
+    ]
+)
+
+
+@dataclass
+class PartDemand:
+    """Net demand for one part across several work orders"""
+
+    part_number: str = ""
+    part_name: str = ""
+    quantity: int = 0
+    # Quantity still to be ordered for each work order
+    allocations: Dict[str, int] = field(default_factory=dict)
+
 
 # =============================================================================
 # Agent Service
@@ -44,24 +137,267 @@ load_dotenv(override=True)
 class PartsOrderingAgent:
     """AI Agent for parts ordering"""
 
-    def __init__(self, project_endpoint: str, deployment_name: str, cosmos_service: CosmosDbService):
+    def __init__(
+        self,
+        project_endpoint: str,
+        deployment_name: str,
+        cosmos_service: CosmosDbService,
+        credential=None,
+        agent_pool: Optional[AgentPool] = None,
+        agent_factory: Optional[Callable[[str, str], Any]] = None,
+    ):
         self.project_endpoint = project_endpoint
         self.deployment_name = deployment_name
         self.cosmos_service = cosmos_service
+        # A shared credential and agent pool keep a long-running worker warm
+        self.credential = credential
+        self.agent_pool = agent_pool
+        # (agent_name, instructions) -> chat agent; defaults to Azure AI Foundry
+        self.agent_factory = agent_factory
+        self.context_token_budget = budget_from_env(
+            "CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKEN_BUDGET)
+        self.history_token_budget = budget_from_env(
+            "HISTORY_TOKEN_BUDGET", DEFAULT_HISTORY_TOKEN_BUDGET)
 
     async def generate_order(
         self,
         work_order: WorkOrder,
         inventory: List[InventoryItem],
         suppliers: List[Supplier],
+        stream: bool = False,
+        on_ready: Optional[Callable[[PartsOrder], Awaitable[None]]] = None,
+        on_reasoning: Optional[Callable[[str], None]] = None,
     ) -> PartsOrder:
-        """Generate optimized parts order using AI"""
-
-        context = self._build_context(work_order, inventory, suppliers)
-        chat_history_json = await self.cosmos_service.get_work_order_chat_history(work_order.id)
+        """Generate optimized parts order using AI
+
+        With ``stream=True`` the response is parsed as it arrives: ``on_ready`` is
+        awaited with the order once its structured fields are complete, and
+        ``on_reasoning`` receives the reasoning text as it streams.
+        """
+
+        with stage("build_context") as s:
+            built = self._build_context(work_order, inventory, suppliers)
+            s.set(tokens_before=built.tokens_before, tokens_after=built.tokens_after)
+        context = built.text
+        print(f"   {built.summary()}")
+        with stage("load_chat_history"):
+            chat_history_json = await self.cosmos_service.get_work_order_chat_history(work_order.id)
         print(
             f"   Using persistent chat history for work order: {work_order.id}")
 
+        order_id = f"PO-{str(uuid.uuid4())[:8]}"
+
+        async def ready(early: PartsOrderOutput):
+            if on_ready:
+                await on_ready(self._to_order(work_order, early, order_id))
+
+        data = await self._run_agent(
+            PARTS_AGENT_NAME, context, PartsOrderOutput,
+            work_order.id, chat_history_json,
+            stream=stream, on_ready=ready, on_reasoning=on_reasoning)
+
+        return self._to_order(work_order, data, order_id)
+
+    def _to_order(
+        self,
+        work_order: WorkOrder,
+        data: PartsOrderOutput,
+        order_id: str,
+    ) -> PartsOrder:
+        """Convert validated model output into a PartsOrder"""
+
+        return PartsOrder(
+            id=order_id,
+            work_order_id=work_order.id,
+            order_items=[
+                OrderItem(
+                    part_number=item.part_number,
+                    part_name=item.part_name,
+                    quantity=item.quantity,
+                    unit_cost=item.unit_cost,
+                    total_cost=item.total_cost,
+                )
+                for item in data.order_items
+            ],
+            supplier_id=data.supplier_id,
+            supplier_name=data.supplier_name,
+            total_cost=data.total_cost,
+            expected_delivery_date=data.expected_delivery_date,
+            order_status="Pending",
+            created_at=datetime.utcnow(),
+        )
+
+    async def generate_consolidated_orders(
+        self,
+        work_orders: List[WorkOrder],
+        inventory: List[InventoryItem],
+        suppliers: List[Supplier],
+    ) -> List[PartsOrder]:
+        """Generate one parts order per supplier covering several work orders.
+
+        Demand is aggregated across all work orders and netted against current
+        inventory once, so the model is only asked to price and schedule one
+        order per supplier instead of one per work order.
+        """
+
+        demand = self.consolidate_demand(work_orders, inventory)
+        groups = self.group_demand_by_supplier(demand, suppliers)
+        work_order_ids = [wo.id for wo in work_orders]
+
+        orders: List[PartsOrder] = []
+        for supplier, lines in groups:
+            with stage("build_context") as s:
+                built = self._build_consolidated_context(
+                    work_orders, supplier, lines)
+                s.set(tokens_before=built.tokens_before, tokens_after=built.tokens_after)
+            print(f"   {supplier.name}: {built.summary()}")
+
+            def unpriced(data: ConsolidatedOrderOutput, lines=lines) -> List[str]:
+                # An unpriced line would otherwise be ordered at $0
+                priced = {item.part_number for item in data.order_items}
+                return [f"orderItems: no unitCost for part {line.part_number}"
+                        for line in lines if line.part_number not in priced]
+
+            data = await self._run_agent(
+                PARTS_AGENT_NAME, built.text,
+                ConsolidatedOrderOutput, check=unpriced)
+
+            unit_costs = {
+                item.part_number: item.unit_cost for item in data.order_items}
+            order_items = [
+                OrderItem(
+                    part_number=line.part_number,
+                    part_name=line.part_name,
+                    quantity=line.quantity,
+                    unit_cost=unit_costs[line.part_number],
+                    total_cost=round(
+                        unit_costs[line.part_number] * line.quantity, 2),
+                    work_order_allocations=dict(line.allocations),
+                )
+                for line in lines
+            ]
+            attributed = [
+                wo_id for wo_id in work_order_ids
+                if any(wo_id in line.allocations for line in lines)
+            ]
+
+            orders.append(
+                PartsOrder(
+                    id=f"PO-{str(uuid.uuid4())[:8]}",
+                    work_order_id=attributed[0] if attributed else "",
+                    work_order_ids=attributed,
+                    order_items=order_items,
+                    supplier_id=supplier.id,
+                    supplier_name=supplier.name,
+                    total_cost=round(
+                        sum(oi.total_cost for oi in order_items), 2),
+                    expected_delivery_date=data.expected_delivery_date,
+                    order_status="Pending",
+                    created_at=datetime.utcnow(),
+                )
+            )
+
+        return orders
+
+    def consolidate_demand(
+        self,
+        work_orders: List[WorkOrder],
+        inventory: List[InventoryItem],
+    ) -> List[PartDemand]:
+        """Aggregate required parts across work orders and net against stock.
+
+        Stock is handed out to work orders in priority order, so whatever is
+        still missing is attributed to the lowest-priority orders first.
+        """
+
+        stock: Dict[str, int] = {}
+        for item in inventory:
+            stock[item.part_number] = stock.get(
+                item.part_number, 0) + max(item.current_stock, 0)
+
+        ordered = sorted(
+            enumerate(work_orders),
+            key=lambda pair: (PRIORITY_RANK.get(
+                pair[1].priority.lower(), len(PRIORITY_RANK)), pair[0]),
+        )
+
+        demand: Dict[str, PartDemand] = {}
+        for _, work_order in ordered:
+            for part in work_order.required_parts:
+                if part.quantity <= 0:
+                    continue
+                available = stock.get(part.part_number, 0)
+                taken = min(available, part.quantity)
+                stock[part.part_number] = available - taken
+                missing = part.quantity - taken
+                if missing <= 0:
+                    continue
+
+                line = demand.setdefault(
+                    part.part_number,
+                    PartDemand(part_number=part.part_number,
+                               part_name=part.part_name),
+                )
+                line.quantity += missing
+                line.allocations[work_order.id] = line.allocations.get(
+                    work_order.id, 0) + missing
+
+        return list(demand.values())
+
+    def group_demand_by_supplier(
+        self,
+        demand: List[PartDemand],
+        suppliers: List[Supplier],
+    ) -> List[Tuple[Supplier, List[PartDemand]]]:
+        """Assign each part to its best supplier (reliability > lead time).
+
+        Suppliers without a parts catalogue are treated as generalists and only
+        used for parts no listed supplier carries.
+        """
+
+        def rank(supplier: Supplier):
+            return (
+                RELIABILITY_RANK.get(supplier.reliability.lower(),
+                                     len(RELIABILITY_RANK)),
+                supplier.lead_time_days,
+                supplier.id,
+            )
+
+        ranked = sorted(suppliers, key=rank)
+        generalists = [s for s in ranked if not s.parts]
+
+        # First (best-ranked) supplier listing each part
+        best_by_part: Dict[str, Supplier] = {}
+        for supplier in ranked:
+            for part_number in supplier.parts:
+                best_by_part.setdefault(part_number, supplier)
+
+        groups: Dict[str, Tuple[Supplier, List[PartDemand]]] = {}
+        for line in demand:
+            best: Optional[Supplier] = best_by_part.get(line.part_number)
+            if best is None and generalists:
+                best = generalists[0]
+            if best is None:
+                print(f"   Warning: No supplier found for {line.part_number}")
+                continue
+            groups.setdefault(best.id, (best, []))[1].append(line)
+
+        return list(groups.values())
+
+    async def _run_agent(
+        self,
+        agent_name: str,
+        context: str,
+        output_type,
+        history_id: Optional[str] = None,
+        chat_history_json: Optional[str] = None,
+        stream: bool = False,
+        on_ready=None,
+        on_reasoning: Optional[Callable[[str], None]] = None,
+        check=None,
+    ):
+        """Run the ordering agent once and return the validated response"""
+
         instructions = """You are a parts ordering specialist for industrial tire manufacturing equipment.
 
 Analyze inventory status and optimize parts ordering from suppliers considering:
@@ -72,55 +408,54 @@ Analyze inventory status and optimize parts ordering from suppliers considering:
 
 Always respond in valid JSON format as requested."""
 
-        credential = DefaultAzureCredential()
+        def create_agent():
+            return self._new_chat_agent(agent_name, instructions)
 
-        async with ChatAgent(
-            chat_client=AzureAIAgentClient(
-                project_endpoint=self.project_endpoint,
-                model_deployment_name=self.deployment_name,
-                credential=credential,
-                agent_name=f"PartsOrdering-{work_order.id}",
-                should_cleanup_agent=False,  # Keep agent visible in portal
-            ),
-            instructions=instructions,
-        ) as agent:
+        async with lease_agent(self.agent_pool, agent_name, create_agent) as agent:
             thread = agent.get_new_thread()
 
             if chat_history_json:
                 try:
-                    for msg in json.loads(chat_history_json):
+                    messages = json.loads(chat_history_json)
+                    for msg in trim_history(messages, self.history_token_budget):
                         await thread.add_message(role=msg["role"], content=msg["content"])
                 except Exception as e:
                     print(f"   Warning: Could not restore chat history: {e}")
 
-            result = await agent.run(context, thread=thread)
-            response_text = result.text
+            with stage("llm", stream=stream):
+                if stream:
+                    data, _ = await stream_structured(
+                        agent, context, thread, output_type,
+                        on_ready=on_ready, on_stream_text=on_reasoning, check=check)
+                else:
+                    data, _ = await run_structured(agent, context, thread, output_type, check=check)
 
-            await self._save_thread_history(work_order.id, thread)
+            if history_id:
+                with stage("save_chat_history"):
+                    await self._save_thread_history(history_id, thread)
 
-        json_response = self._extract_json(response_text)
-        data = json.loads(json_response)
+        return data
 
-        return PartsOrder(
-            id=f"PO-{str(uuid.uuid4())[:8]}",
-            work_order_id=work_order.id,
-            order_items=[
-                OrderItem(
-                    part_number=item["partNumber"],
-                    part_name=item["partName"],
-                    quantity=item["quantity"],
-                    unit_cost=item["unitCost"],
-                    total_cost=item["totalCost"],
-                )
-                for item in data["orderItems"]
-            ],
-            supplier_id=data["supplierId"],
-            supplier_name=data["supplierName"],
-            total_cost=data["totalCost"],
-            expected_delivery_date=datetime.fromisoformat(
-                data["expectedDeliveryDate"].replace("Z", "+00:00")),
-            order_status="Pending",
-            created_at=datetime.utcnow(),
+    def _new_chat_agent(self, agent_name: str, instructions: str):
+        """Create the chat agent for a run (or for the agent pool)"""
+
+        if self.agent_factory:
+            return self.agent_factory(agent_name, instructions)
+
+        # Deferred: these imports dominate start-up and are only needed here
+        from agent_framework import ChatAgent
+        from agent_framework_azure_ai import AzureAIAgentClient
+        from azure.identity.aio import DefaultAzureCredential
+
+        return ChatAgent(
+            chat_client=AzureAIAgentClient(
+                project_endpoint=self.project_endpoint,
+                model_deployment_name=self.deployment_name,
+                credential=self.credential or DefaultAzureCredential(),
+                agent_name=agent_name,
+                should_cleanup_agent=False,  # Keep agent visible in portal
+            ),
+            instructions=instructions,
         )
 
     async def _save_thread_history(self, work_order_id: str, thread):
@@ -150,105 +485,169 @@ Always respond in valid JSON format as requested."""
         work_order: WorkOrder,
         inventory: List[InventoryItem],
         suppliers: List[Supplier],
-    ) -> str:
-        """Build analysis context for AI"""
-
-        lines = [
-            "# Parts Ordering Analysis Request",
-            "",
-            "## Work Order Information",
-            f"- Work Order ID: {work_order.id}",
-            f"- Machine ID: {work_order.machine_id}",
-            f"- Fault Type: {work_order.fault_type}",
-            f"- Priority: {work_order.priority}",
-            "",
-            "## Required Parts",
-        ]
-
-        for part in work_order.required_parts:
-            lines.append(f"- **{part.part_name}** (Part#: {part.part_number})")
-            lines.append(f"  * Quantity needed: {part.quantity}")
-            lines.append(
-                f"  * Available in stock: {'YES' if part.is_available else 'NO'}")
-
-        lines.extend(["", "## Current Inventory Status"])
-
-        if inventory:
-            for item in inventory:
-                needs_order = item.current_stock <= item.reorder_point
-                lines.append(
-                    f"- **{item.part_name}** (Part#: {item.part_number})")
-                lines.append(f"  * Current Stock: {item.current_stock}")
-                lines.append(f"  * Minimum Stock: {item.min_stock}")
-                lines.append(f"  * Reorder Point: {item.reorder_point}")
-                lines.append(
-                    f"  * Status: {'⚠️  NEEDS ORDERING' if needs_order else '✓ Adequate'}")
-                lines.append(f"  * Location: {item.location}")
-        else:
-            lines.append("⚠️  No inventory records found for required parts.")
-
-        lines.extend(["", "## Available Suppliers"])
-
-        if suppliers:
-            for supplier in suppliers:
-                lines.append(f"- **{supplier.name}** (ID: {supplier.id})")
-                lines.append(f"  * Lead Time: {supplier.lead_time_days} days")
-                lines.append(f"  * Reliability: {supplier.reliability}")
-                lines.append(f"  * Contact: {supplier.contact_email}")
-                parts_preview = ", ".join(supplier.parts[:5])
-                if len(supplier.parts) > 5:
-                    parts_preview += "..."
-                lines.append(f"  * Parts Available: {parts_preview}")
-        else:
-            lines.append("⚠️  No suppliers found for required parts!")
-
-        lines.extend(
+    ) -> BuiltContext:
+        """Build analysis context for AI within the configured token budget"""
+
+        builder = ContextBuilder(self.context_token_budget)
+        builder.add_static(ORDER_REQUEST_TEMPLATE)
+
+        builder.add_section(
+            ContextSection(
+                title="Work Order Information",
+                items=[
+                    f"- Work Order ID: {work_order.id}",
+                    f"- Machine ID: {work_order.machine_id}",
+                    f"- Fault Type: {work_order.fault_type}",
+                    f"- Priority: {work_order.priority}",
+                ],
+                priority=100,
+                min_items=4,
+            )
+        )
+
+        builder.add_section(
+            ContextSection(
+                title="Required Parts",
+                items=[
+                    "\n".join(
+                        [
+                            f"- **{part.part_name}** (Part#: {part.part_number})",
+                            f"  * Quantity needed: {part.quantity}",
+                            f"  * Available in stock: {'YES' if part.is_available else 'NO'}",
+                        ]
+                    )
+                    for part in work_order.required_parts
+                ],
+                priority=90,
+                min_items=len(work_order.required_parts),
+            )
+        )
+
+        # Items that need ordering first, then lowest stock relative to reorder point
+        ranked_inventory = sorted(
+            inventory,
+            key=lambda item: (item.current_stock > item.reorder_point,
+                              item.current_stock - item.reorder_point),
+        )
+        builder.add_section(
+            ContextSection(
+                title="Current Inventory Status",
+                items=[self._format_inventory_item(item) for item in ranked_inventory],
+                priority=10,
+                empty_message="⚠️  No inventory records found for required parts.",
+            )
+        )
+
+        ranked_suppliers = sorted(
+            suppliers,
+            key=lambda supplier: (
+                RELIABILITY_RANK.get(supplier.reliability.lower(),
+                                     len(RELIABILITY_RANK)),
+                supplier.lead_time_days,
+            ),
+        )
+        builder.add_section(
+            ContextSection(
+                title="Available Suppliers",
+                items=[self._format_supplier(supplier) for supplier in ranked_suppliers],
+                priority=20,
+                min_items=1,
+                empty_message="⚠️  No suppliers found for required parts!",
+            )
+        )
+
+        return builder.build()
+
+    def _format_inventory_item(self, item: InventoryItem) -> str:
+        needs_order = item.current_stock <= item.reorder_point
+        return "\n".join(
             [
-                "",
-                "## Analysis Required",
-                "Please provide a JSON response with:",
-                "1. Parts to order",
-                "2. Optimal supplier selection (reliability > lead time > cost)",
-                "3. Expected delivery date",
-                "4. Total order cost",
-                "",
-                "```json",
-                "{",
-                '  "supplierId": "<supplier ID>",',
-                '  "supplierName": "<supplier name>",',
-                '  "orderItems": [',
-                "    {",
-                '      "partNumber": "<part number>",',
-                '      "partName": "<part name>",',
-                '      "quantity": <number>,',
-                '      "unitCost": <decimal>,',
-                '      "totalCost": <decimal>',
-                "    }",
-                "  ],",
-                '  "totalCost": <decimal>,',
-                '  "expectedDeliveryDate": "<ISO datetime>",',
-                '  "reasoning": "<explanation>"',
-                "}",
-                "```",
+                f"- **{item.part_name}** (Part#: {item.part_number})",
+                f"  * Current Stock: {item.current_stock}",
+                f"  * Minimum Stock: {item.min_stock}",
+                f"  * Reorder Point: {item.reorder_point}",
+                f"  * Status: {'⚠️  NEEDS ORDERING' if needs_order else '✓ Adequate'}",
+                f"  * Location: {item.location}",
             ]
         )
 
-        return "\n".join(lines)
+    def _format_supplier(self, supplier: Supplier) -> str:
+        parts_preview = ", ".join(supplier.parts[:5])
+        if len(supplier.parts) > 5:
+            parts_preview += "..."
+        return "\n".join(
+            [
+                f"- **{supplier.name}** (ID: {supplier.id})",
+                f"  * Lead Time: {supplier.lead_time_days} days",
+                f"  * Reliability: {supplier.reliability}",
+                f"  * Contact: {supplier.contact_email}",
+                f"  * Parts Available: {parts_preview}",
+            ]
+        )
 
-    def _extract_json(self, response: str) -> str:
-        """Extract JSON from response"""
+    def _build_consolidated_context(
+        self,
+        work_orders: List[WorkOrder],
+        supplier: Supplier,
+        lines: List[PartDemand],
+    ) -> BuiltContext:
+        """Build pricing context for a consolidated supplier order within the token budget"""
+
+        builder = ContextBuilder(self.context_token_budget)
+        builder.add_static(CONSOLIDATED_REQUEST_TEMPLATE)
+
+        builder.add_section(
+            ContextSection(
+                title="Supplier",
+                items=[
+                    f"- **{supplier.name}** (ID: {supplier.id})",
+                    f"  * Lead Time: {supplier.lead_time_days} days",
+                    f"  * Reliability: {supplier.reliability}",
+                ],
+                priority=100,
+                min_items=3,
+            )
+        )
 
-        if "```json" in response:
-            start = response.index("```json") + 7
-            end = response.index("```", start)
-            return response[start:end].strip()
+        # Every line must be priced, so none of them are trimmed
+        builder.add_section(
+            ContextSection(
+                title="Parts To Order (net of current inventory)",
+                items=[
+                    "\n".join(
+                        [
+                            f"- **{line.part_name}** (Part#: {line.part_number})",
+                            f"  * Quantity: {line.quantity}",
+                            "  * For work orders: " + ", ".join(
+                                f"{wo_id} x{qty}" for wo_id, qty in line.allocations.items()),
+                        ]
+                    )
+                    for line in lines
+                ],
+                priority=90,
+                min_items=len(lines),
+            )
+        )
 
-        start = response.find("{")
-        if start >= 0:
-            end = response.rfind("}")
-            return response[start: end + 1]
+        # Most urgent first; it sets the delivery date, so it is always kept
+        attributed = {wo_id for line in lines for wo_id in line.allocations}
+        ranked_work_orders = sorted(
+            (wo for wo in work_orders if wo.id in attributed),
+            key=lambda wo: (PRIORITY_RANK.get(wo.priority.lower(), len(PRIORITY_RANK)), wo.id),
+        )
+        builder.add_section(
+            ContextSection(
+                title="Work Orders",
+                items=[
+                    f"- {wo.id}: {wo.priority} priority ({wo.machine_id}, {wo.fault_type})"
+                    for wo in ranked_work_orders
+                ],
+                priority=10,
+                min_items=1,
+            )
+        )
 
-        raise Exception("Could not extract JSON from agent response")
+        return builder.build()
 
 
 # =============================================================================
@@ -256,30 +655,12 @@ Always respond in valid JSON format as requested."""
 # =============================================================================
 
 
-async def main():
-    """Main program"""
-
-    print("=== Parts Ordering Agent ===\n")
-
-    cosmos_endpoint = os.getenv("COSMOS_ENDPOINT")
-    cosmos_key = os.getenv("COSMOS_KEY")
-    database_name = os.getenv("COSMOS_DATABASE_NAME")
-    foundry_project_endpoint = os.getenv("AI_FOUNDRY_PROJECT_ENDPOINT")
-    deployment_name = os.getenv("MODEL_DEPLOYMENT_NAME", "gpt-4o")
-    app_insights_connection = os.getenv(
-        "APPLICATIONINSIGHTS_CONNECTION_STRING")
-
-    if not all([cosmos_endpoint, cosmos_key, database_name, foundry_project_endpoint]):
-        print("Error: Missing required environment variables.")
-        print("Required: COSMOS_ENDPOINT, COSMOS_KEY, COSMOS_DATABASE_NAME, AI_FOUNDRY_PROJECT_ENDPOINT")
-        return
-
-    enable_tracing(app_insights_connection)
+async def register_agent_in_portal(foundry_project_endpoint: str, deployment_name: str):
+    """Register a new PartsOrderingAgent version in Azure AI Foundry portal"""
 
-    cosmos_service = CosmosDbService(
-        cosmos_endpoint, cosmos_key, database_name)
+    from azure.ai.projects.aio import AIProjectClient
+    from azure.identity.aio import DefaultAzureCredential
 
-    # Register agent in Azure AI Foundry portal
     async with (
         DefaultAzureCredential() as credential,
         AIProjectClient(endpoint=foundry_project_endpoint, credential=credential) as project_client,
@@ -346,25 +727,48 @@ Always respond in valid JSON format with: supplierId, supplierName, orderItems (
             print(f"   Error details: {traceback.format_exc()}")
             logger.warning(f"Could not register agent in portal: {e}")
 
-    agent_service = PartsOrderingAgent(
-        foundry_project_endpoint, deployment_name, cosmos_service)
 
+async def process_work_order(
+    cosmos_service: CosmosDbService,
+    agent_service: PartsOrderingAgent,
+    work_order_id: str,
+    stream: bool = False,
+) -> Optional[PartsOrder]:
+    """Order missing parts for one work order and persist the result.
+
+    Returns the saved order, or None if no order was needed or the run failed
+    (errors are printed). Each numbered step is timed as a stage span (see
+    services.stage_timing).
+    """
+
+    with pipeline("parts_ordering", work_order_id):
+        return await _process_work_order(cosmos_service, agent_service, work_order_id, stream)
+
+
+async def _process_work_order(
+    cosmos_service: CosmosDbService,
+    agent_service: PartsOrderingAgent,
+    work_order_id: str,
+    stream: bool,
+) -> Optional[PartsOrder]:
     print("1. Retrieving work order...")
-    work_order_id = sys.argv[1] if len(sys.argv) > 1 else "2024-468"
 
     try:
-        work_order = await cosmos_service.get_work_order(work_order_id)
+        with stage("retrieve_work_order"):
+            work_order = await cosmos_service.get_work_order(work_order_id)
         print(f"   ✓ Work Order: {work_order.id}")
         print(f"   Machine: {work_order.machine_id}")
         print(f"   Required Parts: {len(work_order.required_parts)}")
         print(f"   Priority: {work_order.priority}\n")
     except Exception as e:
         print(f"   ✗ Error: {str(e)}")
-        return
+        return None
 
     print("2. Checking inventory status...")
     part_numbers = [p.part_number for p in work_order.required_parts]
-    inventory = await cosmos_service.get_inventory_items(part_numbers)
+    with stage("check_inventory") as s:
+        inventory = await cosmos_service.get_inventory_items(part_numbers)
+        s.set(items=len(inventory))
     print(f"   ✓ Found {len(inventory)} inventory records\n")
 
     parts_needing_order = [
@@ -375,11 +779,12 @@ Always respond in valid JSON format with: supplierId, supplierName, orderItems (
         print("No parts order needed.\n")
 
         print("3. Updating work order status...")
-        await cosmos_service.update_work_order_status(work_order.id, "Ready")
+        with stage("update_status"):
+            await cosmos_service.update_work_order_status(work_order.id, "Ready")
         print("   ✓ Work order status updated to 'Ready'\n")
 
         print("✓ Parts Ordering Agent completed successfully!")
-        return
+        return None
 
     print(f"⚠️  {len(parts_needing_order)} part(s) need to be ordered:")
     for part in parts_needing_order:
@@ -388,16 +793,38 @@ Always respond in valid JSON format with: supplierId, supplierName, orderItems (
 
     print("3. Finding suppliers...")
     needed_part_numbers = [p.part_number for p in parts_needing_order]
-    suppliers = await cosmos_service.get_suppliers_for_parts(needed_part_numbers)
+    with stage("find_suppliers") as s:
+        suppliers = await cosmos_service.get_suppliers_for_parts(needed_part_numbers)
+        s.set(items=len(suppliers))
     print(f"   ✓ Found {len(suppliers)} potential suppliers\n")
 
     if not suppliers:
         print("✗ No suppliers found for required parts!")
-        return
+        return None
+
+    # Id of the order once it is in Cosmos, so a failed run can remove it again
+    saved: List[str] = []
 
     print("4. Running AI parts ordering analysis...")
     try:
-        order = await agent_service.generate_order(work_order, inventory, suppliers)
+        with stage("ai_analysis", stream=stream, items=len(parts_needing_order)):
+            if stream:
+                async def persist_early(early: PartsOrder):
+                    # Provisional until the full response validates; the final save makes it "Pending"
+                    early.order_status = "Provisional"
+                    await cosmos_service.save_parts_order(early)
+                    saved.append(early.id)
+                    print(
+                        f"   ✓ Order {early.id} saved ({early.supplier_name}, "
+                        f"${early.total_cost:.2f}); reasoning still streaming...\n")
+
+                order = await agent_service.generate_order(
+                    work_order, inventory, suppliers, stream=True,
+                    on_ready=persist_early,
+                    on_reasoning=lambda text: print(text, end="", flush=True))
+                print("\n")
+            else:
+                order = await agent_service.generate_order(work_order, inventory, suppliers)
         print("   ✓ Parts order generated!\n")
 
         print("=== Parts Order ===")
@@ -416,19 +843,195 @@ Always respond in valid JSON format with: supplierId, supplierName, orderItems (
         print()
 
         print("5. Saving parts order...")
-        await cosmos_service.save_parts_order(order)
+        with stage("save_order"):
+            await cosmos_service.save_parts_order(order)
+            saved.append(order.id)
         print("   ✓ Order saved to SCM system\n")
 
         print("6. Updating work order status...")
-        await cosmos_service.update_work_order_status(work_order.id, "PartsOrdered")
+        with stage("update_status"):
+            await cosmos_service.update_work_order_status(work_order.id, "PartsOrdered")
         print("   ✓ Work order status updated to 'PartsOrdered'\n")
 
         print("✓ Parts Ordering Agent completed successfully!")
+        return order
     except Exception as e:
         print(f"   ✗ Error during parts ordering: {str(e)}")
         import traceback
 
         print(f"\nStack trace:\n{traceback.format_exc()}")
+        for order_id in dict.fromkeys(saved):
+            try:
+                await cosmos_service.delete_parts_order(order_id)
+                print(f"   ✓ Removed order {order_id}")
+            except Exception as delete_error:
+                print(f"   ⚠️  Could not remove order {order_id}: {delete_error}")
+        return None
+
+
+async def run_consolidated(
+    cosmos_service: CosmosDbService,
+    agent_service: PartsOrderingAgent,
+    work_order_ids: List[str],
+) -> List[PartsOrder]:
+    """Order parts for several work orders with one order per supplier"""
+
+    with pipeline("parts_ordering_consolidated", ",".join(work_order_ids)):
+        return await _run_consolidated(cosmos_service, agent_service, work_order_ids)
+
+
+async def _run_consolidated(
+    cosmos_service: CosmosDbService,
+    agent_service: PartsOrderingAgent,
+    work_order_ids: List[str],
+) -> List[PartsOrder]:
+    print(f"1. Retrieving {len(work_order_ids)} work orders...")
+    work_orders: List[WorkOrder] = []
+    for work_order_id in work_order_ids:
+        try:
+            work_orders.append(await cosmos_service.get_work_order(work_order_id))
+            print(f"   ✓ Work Order: {work_order_id}")
+        except Exception as e:
+            print(f"   ✗ Error: {str(e)}")
+    print()
+
+    if not work_orders:
+        print("✗ No work orders to process!")
+        return []
+
+    print("2. Checking inventory status...")
+    part_numbers = sorted(
+        {p.part_number for wo in work_orders for p in wo.required_parts})
+    inventory = await cosmos_service.get_inventory_items(part_numbers)
+    print(f"   ✓ Found {len(inventory)} inventory records\n")
+
+    demand = agent_service.consolidate_demand(work_orders, inventory)
+    short_ids = {wo_id for line in demand for wo_id in line.allocations}
+
+    print("3. Finding suppliers...")
+    suppliers = await cosmos_service.get_suppliers_for_parts(
+        [line.part_number for line in demand])
+    print(f"   ✓ Found {len(suppliers)} potential suppliers\n")
+
+    orders: List[PartsOrder] = []
+    if demand:
+        print(f"4. Running AI analysis for {len(demand)} consolidated part line(s)...")
+        try:
+            with stage("ai_analysis", items=len(demand)):
+                orders = await agent_service.generate_consolidated_orders(
+                    work_orders, inventory, suppliers)
+        except Exception as e:
+            print(f"   ✗ Error during parts ordering: {str(e)}")
+            for problem in getattr(e, "errors", [])[:10]:
+                print(f"     - {problem}")
+            logger.warning(f"Consolidated parts ordering failed: {e}")
+            return []
+        print(f"   ✓ Generated {len(orders)} supplier order(s)\n")
+
+    # Only lines that made it into an order count; parts without a supplier were skipped
+    ordered_ids = {
+        wo_id for order in orders for item in order.order_items
+        for wo_id in item.work_order_allocations}
+
+    for order in orders:
+        print(f"=== Parts Order {order.id} ===")
+        print(f"Supplier: {order.supplier_name} (ID: {order.supplier_id})")
+        print(f"Work Orders: {', '.join(order.work_order_ids)}")
+        print(f"Total Cost: ${order.total_cost:.2f}")
+        for item in order.order_items:
+            split = ", ".join(
+                f"{wo_id}: {qty}" for wo_id, qty in item.work_order_allocations.items())
+            print(
+                f"  - {item.part_name} (#{item.part_number}) Qty: {item.quantity} [{split}]")
+        print()
+
+    # Orders in Cosmos and work orders already moved, so a failed run can undo them
+    saved: List[str] = []
+    updated: List[WorkOrder] = []
+    try:
+        print("5. Saving parts orders...")
+        with stage("save_order", items=len(orders)):
+            for order in orders:
+                await cosmos_service.save_parts_order(order)
+                saved.append(order.id)
+        print(f"   ✓ {len(orders)} order(s) saved to SCM system\n")
+
+        print("6. Updating work order status...")
+        with stage("update_status", items=len(work_orders)):
+            for work_order in work_orders:
+                if work_order.id in ordered_ids:
+                    status = "PartsOrdered"
+                elif work_order.id in short_ids:
+                    print(f"   ⚠️  {work_order.id} still needs parts no supplier carries; status unchanged")
+                    continue
+                else:
+                    status = "Ready"
+                await cosmos_service.update_work_order_status(work_order.id, status)
+                updated.append(work_order)
+                print(f"   ✓ {work_order.id} -> '{status}'")
+        print()
+    except Exception as e:
+        print(f"   ✗ Error during parts ordering: {str(e)}")
+        logger.warning(f"Consolidated parts ordering failed after {len(saved)} saved order(s): {e}")
+        for order_id in saved:
+            try:
+                await cosmos_service.delete_parts_order(order_id)
+                print(f"   ✓ Removed order {order_id}")
+            except Exception as delete_error:
+                print(f"   ⚠️  Could not remove order {order_id}: {delete_error}")
+        for work_order in updated:
+            try:
+                await cosmos_service.update_work_order_status(work_order.id, work_order.status)
+                print(f"   ✓ {work_order.id} back to '{work_order.status}'")
+            except Exception as restore_error:
+                print(f"   ⚠️  Could not restore {work_order.id}: {restore_error}")
+        return []
+
+    print("✓ Parts Ordering Agent completed successfully!")
+    return orders
+
+
+async def main():
+    """Main program"""
+
+    if "--profile-startup" in sys.argv[1:]:
+        profile_startup(os.path.abspath(__file__), sys.argv[1:])
+        return
+
+    print("=== Parts Ordering Agent ===\n")
+
+    cosmos_endpoint = os.getenv("COSMOS_ENDPOINT")
+    cosmos_key = os.getenv("COSMOS_KEY")
+    database_name = os.getenv("COSMOS_DATABASE_NAME")
+    foundry_project_endpoint = os.getenv("AI_FOUNDRY_PROJECT_ENDPOINT")
+    deployment_name = os.getenv("MODEL_DEPLOYMENT_NAME", "gpt-4o")
+    app_insights_connection = os.getenv(
+        "APPLICATIONINSIGHTS_CONNECTION_STRING")
+
+    if not all([cosmos_endpoint, cosmos_key, database_name, foundry_project_endpoint]):
+        print("Error: Missing required environment variables.")
+        print("Required: COSMOS_ENDPOINT, COSMOS_KEY, COSMOS_DATABASE_NAME, AI_FOUNDRY_PROJECT_ENDPOINT")
+        return
+
+    enable_tracing(app_insights_connection)
+
+    cosmos_service = CosmosDbService(
+        cosmos_endpoint, cosmos_key, database_name)
+
+    await register_agent_in_portal(foundry_project_endpoint, deployment_name)
+
+    agent_service = PartsOrderingAgent(
+        foundry_project_endpoint, deployment_name, cosmos_service)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--consolidate":
+        await run_consolidated(cosmos_service, agent_service, sys.argv[2:])
+        return
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    stream = "--stream" in sys.argv[1:]
+    work_order_id = args[0] if args else "2024-468"
+
+    await process_work_order(cosmos_service, agent_service, work_order_id, stream=stream)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,54 @@
+"""Reuse of open ChatAgent instances between runs (used by the agent daemon)."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import record_cache
+
+
+class AgentPool:
+    """Keeps ChatAgent instances, and the chat clients they own, open between runs.
+
+    Agents are keyed by name and entered once; every run still gets its own
+    thread, so concurrent runs against the same pooled agent do not share state.
+    """
+
+    def __init__(self):
+        self._stack = AsyncExitStack()
+        self._agents: Dict[str, Any] = {}
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    async def get(self, name: str, factory: Callable[[], Any]):
+        agent = self._agents.get(name)
+        if agent is not None:
+            record_cache("agent_pool", hit=True)
+            return agent
+
+        async with self._lock:
+            agent = self._agents.get(name)
+            record_cache("agent_pool", hit=agent is not None)
+            if agent is None:
+                agent = await self._stack.enter_async_context(factory())
+                self._agents[name] = agent
+            return agent
+
+    async def aclose(self) -> None:
+        self._agents.clear()
+        await self._stack.aclose()
+
+
+@asynccontextmanager
+async def lease_agent(pool: Optional[AgentPool], name: str, factory: Callable[[], Any]):
+    """Yield a pooled agent, or a fresh one that is closed afterwards when no pool is set."""
+
+    if pool is None:
+        async with factory() as agent:
+            yield agent
+    else:
+        yield await pool.get(name, factory)
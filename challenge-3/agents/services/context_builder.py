@@ -0,0 +1,164 @@
+"""Token-budgeted prompt context builder for Challenge 3 agents.
+
+Static text (instructions, response schema) is emitted first so every request
+for an agent shares the same prompt prefix and benefits from provider-side
+prefix caching. Dynamic sections follow; each section is a list of pre-ranked
+items (best first) and, when the budget is exceeded, items are dropped from the
+end of the lowest-priority sections first.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 4000
+DEFAULT_HISTORY_TOKEN_BUDGET = 2000
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Load the tokenizer on first use (it is slow to import and load)."""
+
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:  # tiktoken missing or encoding files unavailable offline
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when available, else ~4 characters per token."""
+
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def budget_from_env(name: str, default: int) -> int:
+    """Read a token budget from the environment (0 or negative disables trimming)."""
+
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+@dataclass
+class ContextSection:
+    """A titled block of ranked items; the header and ``preamble`` are never trimmed."""
+
+    title: str
+    items: List[str] = field(default_factory=list)
+    priority: int = 0  # higher survives longer
+    min_items: int = 0
+    preamble: List[str] = field(default_factory=list)
+    empty_message: str = ""
+
+
+@dataclass
+class BuiltContext:
+    """Rendered context plus the token accounting for this run"""
+
+    text: str
+    tokens_before: int
+    tokens_after: int
+    budget: int
+    dropped: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        dropped = ", ".join(f"{k}: -{v}" for k, v in self.dropped.items())
+        line = f"Context tokens: {self.tokens_before} -> {self.tokens_after} (budget {self.budget})"
+        return f"{line}; trimmed {dropped}" if dropped else line
+
+
+class ContextBuilder:
+    """Assemble a markdown prompt under a token budget."""
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._static: List[str] = []
+        self._sections: List[ContextSection] = []
+
+    def add_static(self, text: str) -> "ContextBuilder":
+        self._static.append(text)
+        return self
+
+    def add_section(self, section: ContextSection) -> "ContextBuilder":
+        self._sections.append(section)
+        return self
+
+    def build(self) -> BuiltContext:
+        static_text = "\n\n".join(self._static)
+        fixed = count_tokens(static_text)
+        item_tokens: List[List[int]] = []
+        for section in self._sections:
+            fixed += count_tokens(self._render_head(section))
+            item_tokens.append([count_tokens(item) + 1 for item in section.items])
+
+        keep = [len(section.items) for section in self._sections]
+        total_before = fixed + sum(sum(tokens) for tokens in item_tokens)
+        total = total_before
+
+        if self.budget > 0:
+            # Lowest priority first; within a priority, later sections go first
+            order = sorted(range(len(self._sections)),
+                           key=lambda i: (self._sections[i].priority, -i))
+            for idx in order:
+                section = self._sections[idx]
+                while total > self.budget and keep[idx] > section.min_items:
+                    keep[idx] -= 1
+                    total -= item_tokens[idx][keep[idx]]
+                if total <= self.budget:
+                    break
+
+        parts = [static_text] if static_text else []
+        dropped: Dict[str, int] = {}
+        for idx, section in enumerate(self._sections):
+            parts.append(self._render(section, keep[idx]))
+            if keep[idx] < len(section.items):
+                dropped[section.title] = len(section.items) - keep[idx]
+
+        text = "\n\n".join(parts)
+        return BuiltContext(
+            text=text,
+            tokens_before=total_before,
+            tokens_after=count_tokens(text),
+            budget=self.budget,
+            dropped=dropped,
+        )
+
+    def _render_head(self, section: ContextSection) -> str:
+        return "\n".join([f"## {section.title}", *section.preamble])
+
+    def _render(self, section: ContextSection, keep: int) -> str:
+        lines = [self._render_head(section)]
+        if not section.items and section.empty_message:
+            lines.append(section.empty_message)
+        lines.extend(section.items[:keep])
+        if keep < len(section.items):
+            lines.append(f"... {len(section.items) - keep} more omitted")
+        return "\n".join(lines)
+
+
+def trim_history(messages: List[dict], budget: int, max_messages: Optional[int] = None) -> List[dict]:
+    """Keep the most recent chat messages that fit in ``budget`` tokens."""
+
+    kept: List[dict] = []
+    used = 0
+    for msg in reversed(messages):
+        if max_messages is not None and len(kept) >= max_messages:
+            break
+        cost = count_tokens(str(msg.get("content", ""))) + 4
+        if budget > 0 and used + cost > budget:
+            break
+        kept.append(msg)
+        used += cost
+    kept.reverse()
+    return kept
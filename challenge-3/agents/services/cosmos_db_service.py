@@ -3,15 +3,20 @@
 This module intentionally keeps things simple: it contains the shared data models
 used by both agents and a single CosmosDbService that reads/writes the containers
 used in the workshop.
+
+The azure.cosmos SDK is imported on first use so that code paths which never
+touch Cosmos (or fail fast on configuration) do not pay for it.
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from datetime import datetime, timedelta
-from typing import List, Optional
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
-from azure.cosmos import CosmosClient, PartitionKey, exceptions
+from .maintenance_windows import DEFAULT_REFRESH_SECONDS, MaintenanceWindowIndex
+from .metrics import cosmos_response_hook
+from .startup_profile import mark_first_request
 
 # =============================================================================
 # Shared Models
@@ -127,6 +132,8 @@ class OrderItem:
     quantity: int = 0
     unit_cost: float = 0.0
     total_cost: float = 0.0
+    # Quantity of this line attributed to each work order (consolidated orders)
+    work_order_allocations: Dict[str, int] = field(default_factory=dict)
 
 
 @dataclass
@@ -135,6 +142,7 @@ class PartsOrder:
 
     id: str = ""
     work_order_id: str = ""
+    work_order_ids: List[str] = field(default_factory=list)
     order_items: List[OrderItem] = field(default_factory=list)
     supplier_id: str = ""
     supplier_name: str = ""
@@ -152,10 +160,26 @@ class PartsOrder:
 class CosmosDbService:
     """Service for interacting with Cosmos DB."""
 
+    # Available maintenance windows, loaded on first use (see services.maintenance_windows)
+    _window_index: Optional[MaintenanceWindowIndex] = None
+    window_refresh_seconds: float = DEFAULT_REFRESH_SECONDS
+
     def __init__(self, endpoint: str, key: str, database_name: str):
-        self.client = CosmosClient(endpoint, key)
+        from azure.cosmos import CosmosClient
+
+        mark_first_request()  # CosmosClient contacts the account on construction
+        # The hook sees every HTTP attempt, so RU and 429 counts include SDK retries
+        self.client = CosmosClient(endpoint, key, raw_response_hook=cosmos_response_hook)
         self.database = self.client.get_database_client(database_name)
 
+    @classmethod
+    def from_database(cls, database) -> "CosmosDbService":
+        """Wrap an existing database client (e.g. services.local_cosmos.LocalCosmosDatabase)."""
+        service = cls.__new__(cls)
+        service.client = None
+        service.database = database
+        return service
+
     def _parse_datetime(self, dt_value):
         """Parse datetime from ISO string."""
         if isinstance(dt_value, datetime):
@@ -173,6 +197,7 @@ class CosmosDbService:
         Note: get_container_client() does not validate existence; the NotFound shows
         up later when you try to read/write items.
         """
+        from azure.cosmos import PartitionKey, exceptions
 
         container = self.database.get_container_client(container_id)
         try:
@@ -185,12 +210,93 @@ class CosmosDbService:
             )
             return self.database.get_container_client(container_id)
 
+    # -------------------------------------------------------------------------
+    # Document conversion
+    # -------------------------------------------------------------------------
+
+    def _to_work_order(self, item: dict) -> WorkOrder:
+        """Build a WorkOrder from a Cosmos document."""
+        return WorkOrder(
+            id=item.get("id", ""),
+            machine_id=item.get("machineId", ""),
+            fault_type=item.get("faultType", ""),
+            priority=item.get("priority", ""),
+            assigned_technician=item.get("assignedTechnician", ""),
+            required_parts=[
+                RequiredPart(
+                    part_number=p.get("partNumber", ""),
+                    part_name=p.get("partName", ""),
+                    quantity=p.get("quantity", 0),
+                    is_available=p.get("isAvailable", False),
+                )
+                for p in item.get("requiredParts", [])
+            ],
+            estimated_duration=item.get("estimatedDuration", 0),
+            created_at=self._parse_datetime(item.get("createdAt")),
+            status=item.get("status", "Created"),
+        )
+
+    def _to_maintenance_history(self, item: dict) -> MaintenanceHistory:
+        """Build a MaintenanceHistory record from a Cosmos document."""
+        return MaintenanceHistory(
+            id=item.get("id", ""),
+            machine_id=item.get("machineId", ""),
+            fault_type=item.get("faultType", ""),
+            occurrence_date=self._parse_datetime(item.get("occurrenceDate")),
+            resolution_date=self._parse_datetime(item.get("resolutionDate")),
+            downtime=item.get("downtime", 0),
+            cost=item.get("cost", 0.0),
+        )
+
+    def _to_maintenance_window(self, item: dict) -> MaintenanceWindow:
+        """Build a MaintenanceWindow from a Cosmos document."""
+        return MaintenanceWindow(
+            id=item.get("id", ""),
+            start_time=self._parse_datetime(item.get("startTime")),
+            end_time=self._parse_datetime(item.get("endTime")),
+            production_impact=item.get("productionImpact", ""),
+            is_available=item.get("isAvailable", True),
+        )
+
+    def _to_inventory_item(self, item: dict) -> InventoryItem:
+        """Build an InventoryItem from a Cosmos document."""
+        return InventoryItem(
+            id=item.get("id", ""),
+            part_number=item.get("partNumber", ""),
+            part_name=item.get("partName", ""),
+            current_stock=item.get("currentStock", 0),
+            min_stock=item.get("minStock", 0),
+            reorder_point=item.get("reorderPoint", 0),
+            location=item.get("location", ""),
+        )
+
+    def _to_supplier(self, item: dict) -> Supplier:
+        """Build a Supplier from a Cosmos document."""
+        return Supplier(
+            id=item.get("id", ""),
+            name=item.get("name", ""),
+            parts=item.get("parts", []),
+            lead_time_days=item.get("leadTimeDays", 0),
+            reliability=item.get("reliability", ""),
+            contact_email=item.get("contactEmail", ""),
+        )
+
+    def _filter_suppliers(self, items: List[dict], part_numbers: List[str]) -> List[Supplier]:
+        """Keep supplier documents that carry at least one of ``part_numbers``."""
+        wanted = set(part_numbers)
+        return [
+            self._to_supplier(item)
+            for item in items
+            if not wanted.isdisjoint(item.get("parts", []))
+        ]
+
     # -------------------------------------------------------------------------
     # Work orders
     # -------------------------------------------------------------------------
 
     async def get_work_order(self, work_order_id: str) -> WorkOrder:
         """Get work order from ERP system."""
+        from azure.cosmos import exceptions
 
         container = self.database.get_container_client("WorkOrders")
         try:
@@ -206,26 +312,7 @@ class CosmosDbService:
             if not items:
                 raise Exception(f"Work order {work_order_id} not found")
 
-            item = items[0]
-            return WorkOrder(
-                id=item.get("id", ""),
-                machine_id=item.get("machineId", ""),
-                fault_type=item.get("faultType", ""),
-                priority=item.get("priority", ""),
-                assigned_technician=item.get("assignedTechnician", ""),
-                required_parts=[
-                    RequiredPart(
-                        part_number=p.get("partNumber", ""),
-                        part_name=p.get("partName", ""),
-                        quantity=p.get("quantity", 0),
-                        is_available=p.get("isAvailable", False),
-                    )
-                    for p in item.get("requiredParts", [])
-                ],
-                estimated_duration=item.get("estimatedDuration", 0),
-                created_at=self._parse_datetime(item.get("createdAt")),
-                status=item.get("status", "Created"),
-            )
+            return self._to_work_order(items[0])
         except exceptions.CosmosHttpResponseError as e:
             raise Exception(f"Work order {work_order_id} not found: {str(e)}")
 
@@ -282,21 +369,7 @@ class CosmosDbService:
                 )
             )
 
-            results: List[MaintenanceHistory] = []
-            for item in items:
-                results.append(
-                    MaintenanceHistory(
-                        id=item.get("id", ""),
-                        machine_id=item.get("machineId", ""),
-                        fault_type=item.get("faultType", ""),
-                        occurrence_date=self._parse_datetime(
-                            item.get("occurrenceDate")),
-                        resolution_date=self._parse_datetime(
-                            item.get("resolutionDate")),
-                        downtime=item.get("downtime", 0),
-                        cost=item.get("cost", 0.0),
-                    )
-                )
+            results = [self._to_maintenance_history(item) for item in items]
 
             return results
         except Exception as e:
@@ -306,54 +379,55 @@ class CosmosDbService:
     async def get_available_maintenance_windows(self, days_ahead: int = 14) -> List[MaintenanceWindow]:
         """Get available maintenance windows from MES."""
 
+        start_date = datetime.now(timezone.utc)
+        return self.maintenance_window_index().available(start_date, start_date + timedelta(days=days_ahead))
+
+    def maintenance_window_index(self, refresh: bool = False) -> MaintenanceWindowIndex:
+        """Index of the available windows, (re)loaded when missing or older than
+        ``window_refresh_seconds``; reservations keep it current in between."""
+
+        index = self._window_index
+        if refresh or index is None or index.age() > self.window_refresh_seconds:
+            index = self._window_index = self._load_window_index()
+        return index
+
+    def _load_window_index(self, days_ahead: int = 14) -> MaintenanceWindowIndex:
+        """Query every upcoming available window once (single partition)."""
+
         try:
             container = self.database.get_container_client(
                 "MaintenanceWindows")
-            start_date = datetime.utcnow()
-            end_date = start_date + timedelta(days=days_ahead)
-
             query = (
                 "SELECT * FROM c "
                 "WHERE c.startTime >= @startDate "
-                "AND c.startTime <= @endDate "
                 "AND c.isAvailable = true "
                 "ORDER BY c.startTime"
             )
 
+            # Stored times end in "Z" or "+00:00"; compare on the shared prefix
             items = list(
                 container.query_items(
                     query=query,
                     parameters=[
-                        {"name": "@startDate", "value": start_date.isoformat()},
-                        {"name": "@endDate", "value": end_date.isoformat()},
+                        {"name": "@startDate",
+                         "value": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")},
                     ],
-                    enable_cross_partition_query=True,
+                    partition_key=True,
                 )
             )
 
-            results: List[MaintenanceWindow] = []
-            for item in items:
-                results.append(
-                    MaintenanceWindow(
-                        id=item.get("id", ""),
-                        start_time=self._parse_datetime(item.get("startTime")),
-                        end_time=self._parse_datetime(item.get("endTime")),
-                        production_impact=item.get("productionImpact", ""),
-                        is_available=item.get("isAvailable", True),
-                    )
-                )
-
-            return results if results else self._generate_mock_windows(days_ahead)
+            if items:
+                return MaintenanceWindowIndex((self._to_maintenance_window(item), item) for item in items)
         except Exception as e:
             print(f"Warning: Could not retrieve maintenance windows: {str(e)}")
-            return self._generate_mock_windows(days_ahead)
+        return MaintenanceWindowIndex((w, None) for w in self._generate_mock_windows(days_ahead))
 
     def _generate_mock_windows(self, days_ahead: int) -> List[MaintenanceWindow]:
         """Generate mock maintenance windows."""
 
         windows: List[MaintenanceWindow] = []
         start_date = (
-            datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
             + timedelta(days=1)
         )
 
@@ -372,6 +446,150 @@ class CosmosDbService:
 
         return windows
 
+    async def reserve_maintenance_window(self, window_id: str, reserved_by: str) -> Optional[MaintenanceWindow]:
+        """Atomically book an available window; None if it is not available.
+
+        MaintenanceWindows is partitioned on /isAvailable, so booking moves the
+        document. The booked copy is created in the ``false`` partition first:
+        the create is the lock, and a 409 means another run holds the window.
+        Only then is the original deleted (If-Match on its ETag), so a crash in
+        between leaves the window booked rather than lost.
+        Generated (mock) windows are only booked in this process.
+        """
+        from azure.core import MatchConditions
+        from azure.cosmos import exceptions
+
+        index = self.maintenance_window_index()
+        window = index.get(window_id)
+        if window is None or not index.is_available(window_id):
+            return None
+
+        document = index.document(window_id)
+        if document is None:
+            return replace(window, is_available=False) if index.take(window_id) else None
+
+        container = self.database.get_container_client("MaintenanceWindows")
+        booked = {k: v for k, v in document.items() if not k.startswith("_")}
+        booked.update(
+            isAvailable=False,
+            reservedBy=reserved_by,
+            reservedAt=datetime.now(timezone.utc).isoformat(),
+        )
+        for attempt in range(2):
+            try:
+                container.create_item(body=booked)
+                break
+            except exceptions.CosmosResourceExistsError:
+                if attempt or not self._clear_released_window(container, window_id):
+                    index.take(window_id)
+                    return None
+
+        try:
+            for attempt in range(2):
+                try:
+                    container.delete_item(
+                        item=window_id,
+                        partition_key=True,
+                        etag=document.get("_etag"),
+                        match_condition=MatchConditions.IfNotModified,
+                    )
+                    break
+                except exceptions.CosmosAccessConditionFailedError:
+                    # Edited since it was loaded; the booked copy already holds the window
+                    if attempt:
+                        raise
+                    document = container.read_item(item=window_id, partition_key=True)
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+        except Exception:
+            # Give the window back rather than holding it without a caller
+            container.delete_item(item=window_id, partition_key=False)
+            raise
+        index.take(window_id)
+        return replace(window, is_available=False)
+
+    def _clear_released_window(self, container, window_id: str) -> bool:
+        """Delete a booked copy left behind by an interrupted release; False if it is a live booking"""
+        from azure.core import MatchConditions
+        from azure.cosmos import exceptions
+
+        try:
+            booked = container.read_item(item=window_id, partition_key=False)
+            if not booked.get("releasedAt"):
+                return False
+            container.delete_item(
+                item=window_id,
+                partition_key=False,
+                etag=booked.get("_etag"),
+                match_condition=MatchConditions.IfNotModified,
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+        except exceptions.CosmosAccessConditionFailedError:
+            return False
+        return True
+
+    async def release_maintenance_window(self, window_id: str, reserved_by: str) -> bool:
+        """Give back a window booked by ``reserved_by``; False if it does not hold it.
+
+        The booked copy is marked released first, then the available document
+        is written back and the booked copy deleted. A release interrupted
+        after the mark is finished by the next booking of the window.
+        """
+        from azure.core import MatchConditions
+        from azure.cosmos import exceptions
+
+        index = self.maintenance_window_index()
+        if index.get(window_id) is not None and index.document(window_id) is None:
+            return index.restore(window_id)
+
+        container = self.database.get_container_client("MaintenanceWindows")
+        try:
+            booked = container.read_item(item=window_id, partition_key=False)
+        except exceptions.CosmosResourceNotFoundError:
+            return False
+        if booked.get("reservedBy") != reserved_by or booked.get("releasedAt"):
+            return False
+
+        item = {k: v for k, v in booked.items() if not k.startswith("_")}
+        booked = container.replace_item(
+            item=window_id,
+            body=dict(item, releasedAt=datetime.now(timezone.utc).isoformat()),
+            etag=booked.get("_etag"),
+            match_condition=MatchConditions.IfNotModified,
+        )
+        for name in ("reservedBy", "reservedAt"):
+            item.pop(name, None)
+        restored = container.upsert_item(body=dict(item, isAvailable=True))
+        container.delete_item(
+            item=window_id,
+            partition_key=False,
+            etag=booked.get("_etag"),
+            match_condition=MatchConditions.IfNotModified,
+        )
+        index.restore(window_id, restored)
+        return True
+
+    async def reserve_first_window(
+        self,
+        duration: timedelta,
+        reserved_by: str,
+        after: Optional[datetime] = None,
+        max_impact: Optional[str] = None,
+    ) -> Optional[MaintenanceWindow]:
+        """Book the earliest window lasting ``duration`` that starts after
+        ``after`` (default now) with impact at most ``max_impact``."""
+
+        after = after or datetime.now(timezone.utc)
+        while True:
+            window = self.maintenance_window_index().first_fit(duration, after, max_impact)
+            if window is None:
+                return None
+            # A failed booking drops the window from the index, so this terminates
+            reserved = await self.reserve_maintenance_window(window.id, reserved_by)
+            if reserved is not None:
+                return reserved
+
     async def save_maintenance_schedule(self, schedule: MaintenanceSchedule) -> MaintenanceSchedule:
         """Save maintenance schedule to database."""
 
@@ -409,8 +627,20 @@ class CosmosDbService:
         container.upsert_item(body=item)
         return schedule
 
+    async def delete_maintenance_schedule(self, schedule_id: str) -> bool:
+        """Delete a schedule (e.g. one saved early by a run that then failed)."""
+        from azure.cosmos import exceptions
+
+        container = self.database.get_container_client("MaintenanceSchedules")
+        try:
+            container.delete_item(item=schedule_id, partition_key=schedule_id)
+            return True
+        except exceptions.CosmosResourceNotFoundError:
+            return False
+
     async def get_machine_chat_history(self, machine_id: str) -> Optional[str]:
         """Get chat history for a machine."""
+        from azure.cosmos import exceptions
 
         try:
             container = self.database.get_container_client("ChatHistories")
@@ -433,7 +663,7 @@ class CosmosDbService:
             "entityType": "machine",
             "historyJson": history_json,
             "purpose": "predictive_maintenance",
-            "updatedAt": datetime.utcnow().isoformat(),
+            "updatedAt": datetime.now(timezone.utc).isoformat(),
         }
 
         container.upsert_item(body=item)
@@ -462,18 +692,7 @@ class CosmosDbService:
                     )
                 )
 
-                for item in items:
-                    results.append(
-                        InventoryItem(
-                            id=item.get("id", ""),
-                            part_number=item.get("partNumber", ""),
-                            part_name=item.get("partName", ""),
-                            current_stock=item.get("currentStock", 0),
-                            min_stock=item.get("minStock", 0),
-                            reorder_point=item.get("reorderPoint", 0),
-                            location=item.get("location", ""),
-                        )
-                    )
+                results.extend(self._to_inventory_item(item) for item in items)
 
             return results
         except Exception as e:
@@ -488,20 +707,7 @@ class CosmosDbService:
             items = list(container.query_items(
                 query="SELECT * FROM c", enable_cross_partition_query=True))
 
-            results: List[Supplier] = []
-            for item in items:
-                supplier_parts = item.get("parts", [])
-                if any(part in supplier_parts for part in part_numbers):
-                    results.append(
-                        Supplier(
-                            id=item.get("id", ""),
-                            name=item.get("name", ""),
-                            parts=supplier_parts,
-                            lead_time_days=item.get("leadTimeDays", 0),
-                            reliability=item.get("reliability", ""),
-                            contact_email=item.get("contactEmail", ""),
-                        )
-                    )
+            results = self._filter_suppliers(items, part_numbers)
 
             return results if results else self._generate_mock_suppliers()
         except Exception as e:
@@ -538,6 +744,7 @@ class CosmosDbService:
         item = {
             "id": order.id,
             "workOrderId": order.work_order_id,
+            "workOrderIds": order.work_order_ids or [order.work_order_id],
             "orderItems": [
                 {
                     "partNumber": oi.part_number,
@@ -545,6 +752,7 @@ class CosmosDbService:
                     "quantity": oi.quantity,
                     "unitCost": oi.unit_cost,
                     "totalCost": oi.total_cost,
+                    "workOrderAllocations": oi.work_order_allocations,
                 }
                 for oi in order.order_items
             ],
@@ -561,8 +769,20 @@ class CosmosDbService:
         container.upsert_item(body=item)
         return order
 
+    async def delete_parts_order(self, order_id: str) -> bool:
+        """Delete a parts order (e.g. one saved early by a run that then failed)."""
+        from azure.cosmos import exceptions
+
+        container = self.database.get_container_client("PartsOrders")
+        try:
+            container.delete_item(item=order_id, partition_key=order_id)
+            return True
+        except exceptions.CosmosResourceNotFoundError:
+            return False
+
     async def get_work_order_chat_history(self, work_order_id: str) -> Optional[str]:
         """Get chat history for a work order."""
+        from azure.cosmos import exceptions
 
         try:
             container = self.database.get_container_client("ChatHistories")
@@ -585,7 +805,7 @@ class CosmosDbService:
             "entityType": "workorder",
             "historyJson": history_json,
             "purpose": "parts_ordering",
-            "updatedAt": datetime.utcnow().isoformat(),
+            "updatedAt": datetime.now(timezone.utc).isoformat(),
         }
 
         container.upsert_item(body=item)
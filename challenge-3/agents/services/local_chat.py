@@ -0,0 +1,195 @@
+"""In-process stand-in for the chat agents, for load tests and offline runs.
+
+``LocalChatAgent`` has the surface of a ChatAgent that the agents rely on
+(``get_new_thread``, ``run``, ``run_stream``, async context manager). It answers
+with schema-valid JSON built from the prompt (window, part and supplier ids are
+taken from the context sections), after a time-to-first-token drawn from a
+``LatencyProfile`` plus a per-token generation delay. Errors and 429 rate
+limits are injected at the configured rates.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List, Optional, Type
+
+from .local_cosmos import LatencyProfile
+
+STREAM_CHUNK_CHARS = 16
+
+
+class RateLimitError(Exception):
+    """Injected 429 from the model endpoint"""
+
+    status_code = 429
+
+
+class ServiceError(Exception):
+    """Injected 5xx from the model endpoint"""
+
+    status_code = 500
+
+
+class LocalThread:
+    """Minimal AgentThread: keeps messages in memory"""
+
+    def __init__(self):
+        self.messages: List[SimpleNamespace] = []
+
+    async def add_message(self, role: str, content: str) -> None:
+        self.messages.append(_message(role, content))
+
+    async def list_messages(self) -> AsyncIterator[SimpleNamespace]:
+        # Newest first, like the service-side thread listing
+        for msg in reversed(self.messages):
+            yield msg
+
+
+def _message(role: str, text: str) -> SimpleNamespace:
+    return SimpleNamespace(role=role, content=[SimpleNamespace(text=text)])
+
+
+class LocalChatAgent:
+    """ChatAgent stand-in with configurable latency and failure injection"""
+
+    def __init__(
+        self,
+        name: str,
+        latency: Optional[LatencyProfile] = None,
+        tokens_per_second: float = 80.0,
+    ):
+        self.name = name
+        self.latency = latency or LatencyProfile()
+        self.tokens_per_second = tokens_per_second
+        self.calls = 0
+        self.throttled = 0
+        self.errors = 0
+        self.output_tokens = 0
+
+    async def __aenter__(self) -> "LocalChatAgent":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    def get_new_thread(self) -> LocalThread:
+        return LocalThread()
+
+    async def run(self, prompt: str, thread: Optional[LocalThread] = None,
+                  response_format: Optional[Type] = None, **kwargs) -> SimpleNamespace:
+        text = await self._respond(prompt, thread, response_format)
+        await asyncio.sleep(self._generation_seconds(text))
+        return SimpleNamespace(text=text, usage_details=self._usage(prompt, text))
+
+    async def run_stream(self, prompt: str, thread: Optional[LocalThread] = None,
+                         response_format: Optional[Type] = None, **kwargs):
+        text = await self._respond(prompt, thread, response_format)
+        for start in range(0, len(text), STREAM_CHUNK_CHARS):
+            chunk = text[start:start + STREAM_CHUNK_CHARS]
+            await asyncio.sleep(self._generation_seconds(chunk))
+            yield SimpleNamespace(text=chunk)
+
+    async def _respond(self, prompt: str, thread: Optional[LocalThread], response_format) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample_ms() / 1000)
+        if self.latency.roll_throttle():
+            self.throttled += 1
+            raise RateLimitError("Rate limit is exceeded (injected 429)")
+        if self.latency.roll_error():
+            self.errors += 1
+            raise ServiceError("Model endpoint error (injected)")
+
+        text = json.dumps(_fake_payload(response_format, prompt), indent=2)
+        if thread is not None:
+            await thread.add_message("user", prompt)
+            await thread.add_message("assistant", text)
+        self.output_tokens += len(text) // 4
+        return text
+
+    def _generation_seconds(self, text: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return (len(text) / 4) / self.tokens_per_second
+
+    def _usage(self, prompt: str, text: str) -> SimpleNamespace:
+        return SimpleNamespace(input_token_count=len(prompt) // 4, output_token_count=len(text) // 4)
+
+
+# =============================================================================
+# Canned responses
+# =============================================================================
+
+_WINDOW = re.compile(r"\*\*(\d{4}-\d{2}-\d{2} \d{2}:\d{2}) to (\d{2}:\d{2})\*\*.*?Production Impact: (\w+).*?Window ID: (\S+)",
+                     re.DOTALL)
+_PART = re.compile(r"\*\*(.+?)\*\* \(Part#: ([^)]+)\)(?:\s*\* Quantity needed: (\d+))?")
+_SUPPLIER = re.compile(r"\*\*(.+?)\*\* \(ID: ([^)]+)\)")
+
+
+def _fake_payload(response_format: Optional[Type], prompt: str) -> dict:
+    name = getattr(response_format, "__name__", "")
+    now = datetime.now(timezone.utc)
+
+    if name == "MaintenanceScheduleOutput":
+        window = _WINDOW.search(prompt)
+        if window:
+            start = datetime.strptime(window.group(1), "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+            end_clock = datetime.strptime(window.group(2), "%H:%M")
+            end = start.replace(hour=end_clock.hour, minute=end_clock.minute)
+            if end <= start:
+                end += timedelta(days=1)
+            window_doc = {"id": window.group(4), "startTime": start.isoformat(),
+                          "endTime": end.isoformat(), "productionImpact": window.group(3),
+                          "isAvailable": True}
+        else:
+            start = now + timedelta(days=1)
+            window_doc = {"id": "mw-local", "startTime": start.isoformat(),
+                          "endTime": (start + timedelta(hours=8)).isoformat(),
+                          "productionImpact": "Low", "isAvailable": True}
+        return {
+            "scheduledDate": window_doc["startTime"],
+            "maintenanceWindow": window_doc,
+            "riskScore": 62,
+            "predictedFailureProbability": 0.35,
+            "recommendedAction": "SCHEDULED",
+            "reasoning": "Local stand-in response: lowest-impact window ahead of the projected failure cycle. " * 4,
+        }
+
+    parts = []
+    seen = set()
+    for m in _PART.finditer(prompt):
+        if m.group(2) not in seen:
+            seen.add(m.group(2))
+            parts.append((m.group(2), m.group(1), int(m.group(3) or 1)))
+    supplier = _SUPPLIER.search(prompt)
+    delivery = (now + timedelta(days=3)).isoformat()
+
+    if name == "ConsolidatedOrderOutput":
+        return {
+            "orderItems": [{"partNumber": p, "unitCost": 125.0} for p, _, _ in parts],
+            "expectedDeliveryDate": delivery,
+            "reasoning": "Local stand-in response: list prices from the supplier catalogue.",
+        }
+
+    items = [{"partNumber": p, "partName": n, "quantity": q, "unitCost": 125.0, "totalCost": 125.0 * q}
+             for p, n, q in parts]
+    return {
+        "supplierId": supplier.group(2) if supplier else "supplier-001",
+        "supplierName": supplier.group(1) if supplier else "Industrial Parts Supply Co.",
+        "orderItems": items,
+        "totalCost": sum(i["totalCost"] for i in items),
+        "expectedDeliveryDate": delivery,
+        "reasoning": "Local stand-in response: most reliable supplier carrying the required parts.",
+    }
+
+
+def local_agent_factory(latency: Optional[LatencyProfile] = None, tokens_per_second: float = 80.0):
+    """``agent_factory`` for the Challenge 3 agents that returns LocalChatAgents"""
+
+    def factory(agent_name: str, instructions: str) -> Any:
+        return LocalChatAgent(agent_name, latency=latency, tokens_per_second=tokens_per_second)
+
+    return factory
@@ -0,0 +1,501 @@
+"""In-process stand-in for the Cosmos DB containers used by the agents.
+
+``LocalCosmosDatabase`` mimics the parts of the synchronous azure.cosmos
+DatabaseProxy / ContainerProxy API that ``CosmosDbService`` and the seeding
+scripts use (point reads, upserts, deletes, and the simple SQL queries the
+service issues, honouring ``etag``/``match_condition`` like the service does),
+so the agent pipeline can run without an account. Every call
+goes through a ``LatencyProfile`` that adds latency and injects errors and
+429 throttling, and an approximate request charge is reported the same way the
+SDK does (``client_connection.last_response_headers``).
+
+Latency is applied with ``time.sleep`` because the real client is synchronous:
+a slow Cosmos call blocks the event loop in exactly the same way.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+from .metrics import record_cosmos_request
+
+# Partition keys as created by challenge-0/scripts/seed-data.sh and CosmosDbService
+DEFAULT_PARTITION_KEYS = {
+    "Machines": "/type",
+    "Thresholds": "/machineType",
+    "Telemetry": "/machineId",
+    "KnowledgeBase": "/machineType",
+    "PartsInventory": "/category",
+    "Technicians": "/department",
+    "WorkOrders": "/status",
+    "MaintenanceHistory": "/machineId",
+    "MaintenanceWindows": "/isAvailable",
+    "Suppliers": "/id",
+    "MaintenanceSchedules": "/id",
+    "PartsOrders": "/id",
+    "ChatHistories": "/entityId",
+}
+
+
+# =============================================================================
+# Latency and fault injection
+# =============================================================================
+
+
+@dataclass
+class LatencyProfile:
+    """Log-normal latency (given by median and p95) plus error and 429 injection"""
+
+    median_ms: float = 0.0
+    p95_ms: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after_ms: float = 100.0
+    seed: Optional[int] = None
+    _rng: random.Random = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def parse(cls, spec: str, seed: Optional[int] = None) -> "LatencyProfile":
+        """Parse ``median=20,p95=80,errors=0.01,throttle=0.02,retry_after=100``."""
+
+        names = {"median": "median_ms", "p95": "p95_ms", "errors": "error_rate",
+                 "throttle": "throttle_rate", "retry_after": "retry_after_ms"}
+        values: Dict[str, float] = {}
+        for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+            key, _, value = part.partition("=")
+            if key not in names:
+                raise ValueError(f"Unknown latency setting '{key}' (expected {', '.join(names)})")
+            values[names[key]] = float(value)
+        return cls(seed=seed, **values)
+
+    def sample_ms(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        p95 = max(self.p95_ms, self.median_ms)
+        sigma = math.log(p95 / self.median_ms) / 1.645
+        return self._rng.lognormvariate(math.log(self.median_ms), sigma)
+
+    def roll_error(self) -> bool:
+        return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def roll_throttle(self) -> bool:
+        return self.throttle_rate > 0 and self._rng.random() < self.throttle_rate
+
+
+@dataclass
+class StoreStats:
+    """Counters shared by all containers of one database"""
+
+    requests: int = 0
+    throttled: int = 0
+    errors: int = 0
+    request_charge: float = 0.0
+
+
+# =============================================================================
+# Query evaluation
+# =============================================================================
+
+_QUERY = re.compile(
+    r"^\s*SELECT\s+(?P<select>VALUE\s+COUNT\(1\)|\*|TOP\s+(?P<top>\d+)\s+\*)\s+FROM\s+c"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+c\.(?P<order>[\w.]+)(?:\s+(?P<dir>ASC|DESC))?)?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_TOKEN = re.compile(
+    r"\s*(?:(?P<str>'[^']*'|\"[^\"]*\")|(?P<num>-?\d+(?:\.\d+)?)|(?P<param>@\w+)"
+    r"|(?P<ref>c(?:\.\w+)+)|(?P<op>>=|<=|!=|<>|=|<|>)|(?P<word>[A-Za-z_]+)|(?P<lp>\()|(?P<rp>\))|(?P<comma>,))"
+)
+_MISSING = object()
+
+
+def _field(doc: dict, path: str) -> Any:
+    value: Any = doc
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+class _Where:
+    """Recursive-descent evaluator for the WHERE clauses the repo issues:
+    comparisons, AND/OR/NOT, parentheses and ARRAY_CONTAINS / IS_DEFINED."""
+
+    def __init__(self, text: str, params: Dict[str, Any]):
+        self.tokens = []
+        pos = 0
+        while pos < len(text):
+            m = _TOKEN.match(text, pos)
+            if not m or m.end() == pos:
+                if text[pos:].strip():
+                    raise exceptions.CosmosHttpResponseError(
+                        status_code=400, message=f"Unsupported query syntax near '{text[pos:]}'")
+                break
+            kind = m.lastgroup
+            self.tokens.append((kind, m.group(kind)))
+            pos = m.end()
+        self.params = params
+        self.pos = 0
+        self.tree = self._or()
+
+    def _peek(self, kind=None, word=None):
+        if self.pos >= len(self.tokens):
+            return None
+        tok = self.tokens[self.pos]
+        if kind and tok[0] != kind:
+            return None
+        if word and tok[1].upper() != word:
+            return None
+        return tok
+
+    def _take(self):
+        tok = self.tokens[self.pos]
+        self.pos += 1
+        return tok
+
+    def _or(self):
+        left = self._and()
+        while self._peek("word", "OR"):
+            self._take()
+            right = self._and()
+            left = (lambda a, b: lambda d: a(d) or b(d))(left, right)
+        return left
+
+    def _and(self):
+        left = self._not()
+        while self._peek("word", "AND"):
+            self._take()
+            right = self._not()
+            left = (lambda a, b: lambda d: a(d) and b(d))(left, right)
+        return left
+
+    def _not(self):
+        if self._peek("word", "NOT"):
+            self._take()
+            inner = self._not()
+            return lambda d: not inner(d)
+        return self._comparison()
+
+    def _comparison(self):
+        if self._peek("lp"):
+            self._take()
+            inner = self._or()
+            self._take()  # ')'
+            return inner
+
+        word = self._peek("word")
+        if word and word[1].upper() in ("ARRAY_CONTAINS", "IS_DEFINED"):
+            name = self._take()[1].upper()
+            self._take()  # '('
+            args = [self._operand()]
+            while self._peek("comma"):
+                self._take()
+                args.append(self._operand())
+            self._take()  # ')'
+            if name == "IS_DEFINED":
+                return lambda d: args[0](d) is not _MISSING
+            return lambda d: isinstance(args[0](d), list) and args[1](d) in args[0](d)
+
+        left = self._operand()
+        if not self._peek("op"):
+            return lambda d: left(d) is True
+        op = self._take()[1]
+        right = self._operand()
+
+        def compare(d):
+            a, b = left(d), right(d)
+            if a is _MISSING or b is _MISSING:
+                return False
+            try:
+                if op == "=":
+                    return a == b
+                if op in ("!=", "<>"):
+                    return a != b
+                if op == "<":
+                    return a < b
+                if op == "<=":
+                    return a <= b
+                if op == ">":
+                    return a > b
+                return a >= b
+            except TypeError:
+                return False
+
+        return compare
+
+    def _operand(self) -> Callable[[dict], Any]:
+        kind, value = self._take()
+        if kind == "ref":
+            path = value[2:]
+            return lambda d: _field(d, path)
+        if kind == "param":
+            if value not in self.params:
+                raise exceptions.CosmosHttpResponseError(
+                    status_code=400, message=f"Missing query parameter {value}")
+            param = self.params[value]
+            return lambda d: param
+        if kind == "str":
+            literal = value[1:-1]
+            return lambda d: literal
+        if kind == "num":
+            number = float(value) if "." in value else int(value)
+            return lambda d: number
+        literal = {"TRUE": True, "FALSE": False, "NULL": None}.get(value.upper(), _MISSING)
+        return lambda d: literal
+
+    def __call__(self, doc: dict) -> bool:
+        return bool(self.tree(doc))
+
+
+# =============================================================================
+# Containers
+# =============================================================================
+
+
+class _ClientConnection:
+    """Where the SDK exposes the last response headers (request charge)"""
+
+    def __init__(self):
+        self.last_response_headers: Dict[str, str] = {}
+
+
+def _size_kb(doc: dict) -> float:
+    return len(json.dumps(doc, separators=(",", ":"))) / 1024
+
+
+class LocalContainer:
+    """Dict-backed container keyed by (partition key value, id)"""
+
+    def __init__(self, database: "LocalCosmosDatabase", container_id: str):
+        self.database = database
+        self.id = container_id
+        self.client_connection = _ClientConnection()
+
+    # -- helpers ---------------------------------------------------------------
+
+    @property
+    def _items(self) -> Dict[tuple, dict]:
+        items = self.database._containers.get(self.id)
+        if items is None:
+            raise exceptions.CosmosResourceNotFoundError(
+                status_code=404, message=f"Container {self.id} does not exist")
+        return items
+
+    def _pk_value(self, doc: dict) -> Any:
+        value = _field(doc, self.database._partition_keys[self.id].lstrip("/").replace("/", "."))
+        return None if value is _MISSING else value
+
+    def _call(self, operation: Callable[[], Any], charge: Callable[[Any], float]) -> Any:
+        return self.database._call(self, operation, charge)
+
+    def _check_condition(self, key: tuple, kwargs: Dict[str, Any]) -> None:
+        """412 when ``etag``/``match_condition`` do not hold for the stored item"""
+
+        condition = kwargs.get("match_condition")
+        if condition is None:
+            return
+        current = self._items.get(key)
+        matches = current is not None and current.get("_etag") == kwargs.get("etag")
+        if (condition == MatchConditions.IfNotModified and not matches) or (
+                condition == MatchConditions.IfModified and matches):
+            raise exceptions.CosmosAccessConditionFailedError(
+                status_code=412, message=f"Precondition failed for {key[1]} in {self.id}")
+
+    # -- container API ---------------------------------------------------------
+
+    def read(self) -> dict:
+        def op():
+            self._items  # raises NotFound for a missing container
+            return {"id": self.id, "partitionKey": {"paths": [self.database._partition_keys[self.id]]}}
+
+        return self._call(op, lambda _: 1.0)
+
+    def read_item(self, item: str, partition_key: Any, **kwargs) -> dict:
+        def op():
+            doc = self._items.get((partition_key, item))
+            if doc is None:
+                raise exceptions.CosmosResourceNotFoundError(
+                    status_code=404, message=f"Item {item} not found in {self.id}")
+            return dict(doc)
+
+        return self._call(op, lambda doc: max(1.0, _size_kb(doc)))
+
+    def create_item(self, body: dict, **kwargs) -> dict:
+        def op():
+            key = (self._pk_value(body), body["id"])
+            if key in self._items:
+                raise exceptions.CosmosResourceExistsError(
+                    status_code=409, message=f"Conflict: {body['id']} already exists in {self.id}")
+            return self._store(key, body)
+
+        return self._call(op, lambda doc: 5.0 + 5.0 * _size_kb(doc))
+
+    def upsert_item(self, body: dict, **kwargs) -> dict:
+        def op():
+            key = (self._pk_value(body), body["id"])
+            self._check_condition(key, kwargs)
+            return self._store(key, body)
+
+        return self._call(op, lambda doc: 5.0 + 5.0 * _size_kb(doc))
+
+    def replace_item(self, item: Any, body: dict, **kwargs) -> dict:
+        def op():
+            key = (self._pk_value(body), body["id"])
+            if key not in self._items:
+                raise exceptions.CosmosResourceNotFoundError(
+                    status_code=404, message=f"Item {body['id']} not found in {self.id}")
+            self._check_condition(key, kwargs)
+            return self._store(key, body)
+
+        return self._call(op, lambda doc: 5.0 + 5.0 * _size_kb(doc))
+
+    def delete_item(self, item: Any, partition_key: Any, **kwargs) -> None:
+        item_id = item["id"] if isinstance(item, dict) else item
+
+        def op():
+            key = (partition_key, item_id)
+            if key not in self._items:
+                raise exceptions.CosmosResourceNotFoundError(
+                    status_code=404, message=f"Item {item_id} not found in {self.id}")
+            self._check_condition(key, kwargs)
+            del self._items[key]
+
+        return self._call(op, lambda _: 5.0)
+
+    def query_items(
+        self,
+        query: str,
+        parameters: Optional[List[Dict[str, Any]]] = None,
+        partition_key: Any = None,
+        enable_cross_partition_query: bool = False,
+        **kwargs,
+    ) -> Iterable[Any]:
+        scanned = [0]
+
+        def op():
+            m = _QUERY.match(query)
+            if not m:
+                raise exceptions.CosmosHttpResponseError(
+                    status_code=400, message=f"Unsupported query: {query}")
+            params = {p["name"]: p["value"] for p in parameters or []}
+            where = _Where(m.group("where"), params) if m.group("where") else None
+
+            if partition_key is not None:
+                candidates = [d for (pk, _), d in self._items.items() if pk == partition_key]
+            else:
+                candidates = list(self._items.values())
+            scanned[0] = len(candidates)
+            results = [dict(d) for d in candidates if where is None or where(d)]
+
+            if m.group("order"):
+                order = m.group("order")
+                results.sort(key=lambda d: (_field(d, order) is _MISSING, str(_field(d, order))),
+                             reverse=(m.group("dir") or "").upper() == "DESC")
+            if m.group("top"):
+                results = results[: int(m.group("top"))]
+            if m.group("select").upper().startswith("VALUE"):
+                return [len(results)]
+            return results
+
+        return self._call(op, lambda rows: 2.5 + 0.02 * scanned[0] + sum(
+            _size_kb(r) for r in rows if isinstance(r, dict)))
+
+    def _store(self, key: tuple, body: dict) -> dict:
+        doc = dict(body)
+        doc["_etag"] = f'"{uuid.uuid4()}"'
+        doc["_ts"] = int(time.time())
+        # An item keeps its id but may move partition (e.g. WorkOrders on /status)
+        self._items[key] = doc
+        return dict(doc)
+
+
+class LocalCosmosDatabase:
+    """Stand-in for a DatabaseProxy; containers share one latency profile and stats"""
+
+    def __init__(
+        self,
+        latency: Optional[LatencyProfile] = None,
+        partition_keys: Optional[Dict[str, str]] = None,
+        max_throttle_retries: int = 9,
+    ):
+        self.latency = latency or LatencyProfile()
+        # Like the SDK, 429s are retried transparently before surfacing
+        self.max_throttle_retries = max_throttle_retries
+        self.stats = StoreStats()
+        self._partition_keys = dict(DEFAULT_PARTITION_KEYS, **(partition_keys or {}))
+        self._containers: Dict[str, Dict[tuple, dict]] = {}
+        # Operations run one at a time, so conditional writes are atomic across threads
+        self._lock = threading.Lock()
+
+    def create_container_if_not_exists(self, id: str, partition_key: Any = None, **kwargs) -> LocalContainer:
+        if partition_key is not None:
+            path = getattr(partition_key, "path", None) or partition_key["paths"][0]
+            self._partition_keys[id] = path
+        self._partition_keys.setdefault(id, "/id")
+        self._containers.setdefault(id, {})
+        return LocalContainer(self, id)
+
+    def get_container_client(self, container: str) -> LocalContainer:
+        return LocalContainer(self, container)
+
+    def load(self, container_id: str, docs: Iterable[dict]) -> int:
+        """Bulk-load documents without latency, faults or charges"""
+
+        container = self.create_container_if_not_exists(container_id)
+        count = 0
+        for doc in docs:
+            container._store((container._pk_value(doc), doc["id"]), doc)
+            count += 1
+        return count
+
+    def _call(self, container: LocalContainer, operation: Callable[[], Any],
+              charge: Callable[[Any], float]) -> Any:
+        attempts = 0
+        while True:
+            self.stats.requests += 1
+            delay_ms = self.latency.sample_ms()
+            if self.latency.roll_throttle():
+                self.stats.throttled += 1
+                record_cosmos_request(container.id, 429, 0.0)
+                time.sleep((delay_ms + self.latency.retry_after_ms) / 1000)
+                if attempts < self.max_throttle_retries:
+                    attempts += 1
+                    continue
+                container.client_connection.last_response_headers = {
+                    "x-ms-retry-after-ms": str(int(self.latency.retry_after_ms))}
+                raise exceptions.CosmosHttpResponseError(
+                    status_code=429, message="Request rate is large (injected)")
+
+            time.sleep(delay_ms / 1000)
+            if self.latency.roll_error():
+                self.stats.errors += 1
+                record_cosmos_request(container.id, 503, 0.0)
+                raise exceptions.CosmosHttpResponseError(
+                    status_code=503, message="Service unavailable (injected)")
+
+            try:
+                with self._lock:
+                    result = operation()
+            except exceptions.CosmosHttpResponseError as e:
+                record_cosmos_request(container.id, e.status_code, 1.0)
+                raise
+            ru = round(charge(result), 2)
+            self.stats.request_charge += ru
+            record_cosmos_request(container.id, 200, ru)
+            container.client_connection.last_response_headers = {"x-ms-request-charge": str(ru)}
+            return result
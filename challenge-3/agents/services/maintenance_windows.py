@@ -0,0 +1,197 @@
+"""In-memory interval index over available maintenance windows.
+
+``CosmosDbService`` loads the available windows once (a single-partition query
+on ``isAvailable = true``) and keeps them in a ``MaintenanceWindowIndex``.
+Windows are ordered by start time over a segment tree that holds, for every
+impact ceiling, the longest window in each range, so
+
+    first window lasting >= duration, starting at or after T, impact <= X
+
+is answered in O(log n) without touching Cosmos, and so is taking a window out
+when it is reserved.
+
+The index only knows what this process has seen. Reservations made elsewhere
+surface when booking the window conflicts (see
+``CosmosDbService.reserve_maintenance_window``); the window is then dropped
+from the index and the next candidate is tried, without re-querying.
+Released windows are put back with ``restore``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .cosmos_db_service import MaintenanceWindow
+
+IMPACT_RANK = {"low": 0, "medium": 1, "high": 2}
+# Unknown impacts rank after every known one
+_UNKNOWN_RANK = len(IMPACT_RANK)
+_TAKEN = -1.0
+
+# How long a loaded index is trusted before the service reloads it
+DEFAULT_REFRESH_SECONDS = 300.0
+
+
+def impact_rank(impact: Optional[str]) -> int:
+    """Sort rank of a production impact (Low < Medium < High < anything else)"""
+    return IMPACT_RANK.get((impact or "").strip().lower(), _UNKNOWN_RANK)
+
+
+def as_utc(value: datetime) -> datetime:
+    """Aware UTC datetime; naive values are taken to be UTC already"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class MaintenanceWindowIndex:
+    """Available maintenance windows with first-fit queries and reservation
+
+    Each window is kept with the Cosmos document it came from (``None`` for
+    generated windows), which the reservation needs for its ETag.
+    """
+
+    def __init__(self, windows: Iterable[Tuple[MaintenanceWindow, Optional[dict]]]):
+        entries = sorted(
+            ((w, doc) for w, doc in windows if w.start_time and w.end_time and w.end_time > w.start_time),
+            key=lambda entry: as_utc(entry[0].start_time),
+        )
+        self._windows = [w for w, _ in entries]
+        self._documents = [doc for _, doc in entries]
+        self._starts = [as_utc(w.start_time).timestamp() for w in self._windows]
+        self._lengths = [(w.end_time - w.start_time).total_seconds() for w in self._windows]
+        self._ranks = [impact_rank(w.production_impact) for w in self._windows]
+        self._positions = {w.id: i for i, w in enumerate(self._windows)}
+        self._available = len(self._windows)
+        self._lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+
+        # Leaf i, column r: length of window i if its impact rank is <= r, else _TAKEN
+        self._size = 1
+        while self._size < max(len(self._windows), 1):
+            self._size *= 2
+        self._tree = [[_TAKEN] * (_UNKNOWN_RANK + 1) for _ in range(2 * self._size)]
+        for i in range(len(self._windows)):
+            self._tree[self._size + i] = self._leaf(i)
+        for node in range(self._size - 1, 0, -1):
+            self._pull(node)
+
+    def __len__(self) -> int:
+        return self._available
+
+    def age(self) -> float:
+        """Seconds since the index was built"""
+        return time.monotonic() - self.loaded_at
+
+    # -------------------------------------------------------------------------
+    # Queries
+    # -------------------------------------------------------------------------
+
+    def first_fit(
+        self,
+        duration: timedelta = timedelta(0),
+        after: Optional[datetime] = None,
+        max_impact: Optional[str] = None,
+    ) -> Optional[MaintenanceWindow]:
+        """Earliest available window starting at or after ``after`` that lasts
+        at least ``duration`` and whose impact is at most ``max_impact``
+        (any impact when omitted)"""
+
+        lo = 0 if after is None else bisect.bisect_left(self._starts, as_utc(after).timestamp())
+        column = _UNKNOWN_RANK if max_impact is None else impact_rank(max_impact)
+        with self._lock:
+            i = self._first(1, 0, self._size, lo, column, duration.total_seconds())
+        return self._windows[i] if i >= 0 else None
+
+    def available(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[MaintenanceWindow]:
+        """Available windows starting within [start, end], by start time"""
+
+        lo = 0 if start is None else bisect.bisect_left(self._starts, as_utc(start).timestamp())
+        hi = len(self._starts) if end is None else bisect.bisect_right(self._starts, as_utc(end).timestamp())
+        with self._lock:
+            return [self._windows[i] for i in range(lo, hi) if self._tree[self._size + i][_UNKNOWN_RANK] != _TAKEN]
+
+    def is_available(self, window_id: str) -> bool:
+        i = self._positions.get(window_id)
+        return i is not None and self._tree[self._size + i][_UNKNOWN_RANK] != _TAKEN
+
+    def get(self, window_id: str) -> Optional[MaintenanceWindow]:
+        i = self._positions.get(window_id)
+        return self._windows[i] if i is not None else None
+
+    def document(self, window_id: str) -> Optional[dict]:
+        """Cosmos document of a window (with its ``_etag``), or None"""
+        i = self._positions.get(window_id)
+        return self._documents[i] if i is not None else None
+
+    # -------------------------------------------------------------------------
+    # Updates
+    # -------------------------------------------------------------------------
+
+    def take(self, window_id: str) -> bool:
+        """Remove a window from the available set; False if it already was"""
+
+        i = self._positions.get(window_id)
+        if i is None:
+            return False
+        with self._lock:
+            node = self._size + i
+            if self._tree[node][_UNKNOWN_RANK] == _TAKEN:
+                return False
+            self._tree[node] = [_TAKEN] * len(self._tree[node])
+            node //= 2
+            while node:
+                self._pull(node)
+                node //= 2
+            self._available -= 1
+        return True
+
+    def restore(self, window_id: str, document: Optional[dict] = None) -> bool:
+        """Put a released window back (with its new document); False if it was not taken"""
+
+        i = self._positions.get(window_id)
+        if i is None:
+            return False
+        with self._lock:
+            node = self._size + i
+            if self._tree[node][_UNKNOWN_RANK] != _TAKEN:
+                return False
+            if document is not None:
+                self._documents[i] = document
+            self._tree[node] = self._leaf(i)
+            node //= 2
+            while node:
+                self._pull(node)
+                node //= 2
+            self._available += 1
+        return True
+
+    # -------------------------------------------------------------------------
+    # Segment tree
+    # -------------------------------------------------------------------------
+
+    def _leaf(self, i: int) -> List[float]:
+        length, rank = self._lengths[i], self._ranks[i]
+        return [length if rank <= r else _TAKEN for r in range(_UNKNOWN_RANK + 1)]
+
+    def _pull(self, node: int) -> None:
+        left, right = self._tree[2 * node], self._tree[2 * node + 1]
+        self._tree[node] = [max(a, b) for a, b in zip(left, right)]
+
+    def _first(self, node: int, node_lo: int, node_hi: int, lo: int, column: int, need: float) -> int:
+        """Leftmost leaf >= lo in [node_lo, node_hi) whose column value is >= need, or -1"""
+
+        if node_hi <= lo or self._tree[node][column] < max(need, 0.0):
+            return -1
+        if node_hi - node_lo == 1:
+            return node_lo
+        mid = (node_lo + node_hi) // 2
+        found = self._first(2 * node, node_lo, mid, lo, column, need)
+        if found < 0:
+            found = self._first(2 * node + 1, mid, node_hi, lo, column, need)
+        return found
@@ -1,42 +1,266 @@
-"""Minimal observability helpers shared by Challenge 3 agents."""
+"""Minimal observability helpers shared by Challenge 3 agents.
+
+``enable_tracing`` sets up the OpenTelemetry providers itself (rather than via
+``configure_otel_providers``) so sampling and the batch processors can be tuned,
+then switches on the Agent Framework instrumentation. Everything is read from
+the environment by ``TracingConfig.from_env``:
+
+    TRACE_EXPORTER            azure (default with a connection string) | otlp | file | none
+    TRACE_SAMPLING            head (default) | tail
+    TRACE_SAMPLE_RATIO        fraction of traces kept (default 1.0)
+    TRACE_SLOW_MS             tail sampling: always keep runs at least this slow (default 5000)
+    TRACE_CAPTURE_CONTENT     record prompts and completions (default true)
+    TRACE_MAX_QUEUE_SIZE      batch processor queue (default 2048)
+    TRACE_MAX_EXPORT_BATCH    spans per export call (default 512)
+    TRACE_SCHEDULE_DELAY_MS   batch flush interval (default 5000)
+    TRACE_EXPORT_TIMEOUT_MS   export call timeout (default 30000)
+    TRACE_METRIC_INTERVAL_MS  metric export interval (default 60000)
+    TRACE_FILE                JSON lines output for TRACE_EXPORTER=file (default traces.jsonl)
+    OTEL_EXPORTER_OTLP_ENDPOINT  collector for TRACE_EXPORTER=otlp (default http://localhost:4317)
+
+Head sampling drops unsampled traces before any span is recorded and is the
+cheapest option, but it cannot know how a run ends. Tail sampling records every
+span, buffers each trace until its root span ends and then keeps it if any span
+failed, the root took at least ``slow_ms``, or the trace id falls in the sampled
+ratio.
+"""
 
 from __future__ import annotations
 
-from typing import Optional
+import atexit
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+EXPORTERS = ("azure", "otlp", "file", "none")
+SAMPLING_MODES = ("head", "tail")
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4317"
 
 
-def enable_tracing(app_insights_connection: Optional[str]) -> None:
-    """Enable Agent Framework tracing (Azure Monitor exporter) if available."""
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
 
+
+def _env_number(name: str, default, cast=int):
     try:
-        from agent_framework.observability import configure_otel_providers
-        from azure.monitor.opentelemetry.exporter import (
-            AzureMonitorLogExporter,
-            AzureMonitorMetricExporter,
-            AzureMonitorTraceExporter,
+        return cast(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+@dataclass
+class TracingConfig:
+    """Exporter, sampling and batching settings for ``enable_tracing``"""
+
+    exporter: str = "azure"
+    sampling: str = "head"
+    sample_ratio: float = 1.0
+    slow_ms: float = 5000.0
+    capture_content: bool = True
+    max_queue_size: int = 2048
+    max_export_batch_size: int = 512
+    schedule_delay_ms: int = 5000
+    export_timeout_ms: int = 30000
+    metric_interval_ms: int = 60000
+    file_path: str = "traces.jsonl"
+    otlp_endpoint: str = DEFAULT_OTLP_ENDPOINT
+
+    @classmethod
+    def from_env(cls, app_insights_connection: Optional[str] = None) -> "TracingConfig":
+        default_exporter = "azure" if app_insights_connection else "none"
+        return cls(
+            exporter=os.getenv("TRACE_EXPORTER", default_exporter).lower(),
+            sampling=os.getenv("TRACE_SAMPLING", "head").lower(),
+            sample_ratio=_env_number("TRACE_SAMPLE_RATIO", 1.0, float),
+            slow_ms=_env_number("TRACE_SLOW_MS", 5000.0, float),
+            capture_content=_env_bool("TRACE_CAPTURE_CONTENT", True),
+            max_queue_size=_env_number("TRACE_MAX_QUEUE_SIZE", 2048),
+            max_export_batch_size=_env_number("TRACE_MAX_EXPORT_BATCH", 512),
+            schedule_delay_ms=_env_number("TRACE_SCHEDULE_DELAY_MS", 5000),
+            export_timeout_ms=_env_number("TRACE_EXPORT_TIMEOUT_MS", 30000),
+            metric_interval_ms=_env_number("TRACE_METRIC_INTERVAL_MS", 60000),
+            file_path=os.getenv("TRACE_FILE", "traces.jsonl"),
+            otlp_endpoint=os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", DEFAULT_OTLP_ENDPOINT),
         )
-    except ImportError:
-        print("⚠️  Agent Framework observability not available.")
+
+    def validate(self) -> None:
+        if self.exporter not in EXPORTERS:
+            raise ValueError(f"TRACE_EXPORTER must be one of {', '.join(EXPORTERS)}")
+        if self.sampling not in SAMPLING_MODES:
+            raise ValueError(f"TRACE_SAMPLING must be one of {', '.join(SAMPLING_MODES)}")
+        if not 0.0 <= self.sample_ratio <= 1.0:
+            raise ValueError("TRACE_SAMPLE_RATIO must be between 0 and 1")
+        if self.max_export_batch_size > self.max_queue_size:
+            raise ValueError("TRACE_MAX_EXPORT_BATCH cannot exceed TRACE_MAX_QUEUE_SIZE")
+
+    def describe(self) -> str:
+        if self.sampling == "tail":
+            sampling = f"tail {self.sample_ratio:.0%} + errors + runs >= {self.slow_ms:.0f} ms"
+        else:
+            sampling = f"head {self.sample_ratio:.0%}"
+        content = "on" if self.capture_content else "off"
+        return (f"sampling {sampling}; prompt/completion capture {content}; "
+                f"batch {self.max_export_batch_size}/{self.max_queue_size} every {self.schedule_delay_ms} ms")
+
+
+def enable_tracing(
+    app_insights_connection: Optional[str],
+    config: Optional[TracingConfig] = None,
+) -> None:
+    """Enable Agent Framework tracing with the configured exporter, if available."""
+
+    config = config or TracingConfig.from_env(app_insights_connection)
+    try:
+        config.validate()
+    except ValueError as e:
+        print(f"⚠️  Tracing disabled: {e}\n")
         return
 
-    if not app_insights_connection:
-        print("⚠️  Tracing available but APPLICATIONINSIGHTS_CONNECTION_STRING not set\n")
+    if config.exporter == "none" and app_insights_connection:
+        print("⚠️  Tracing disabled: TRACE_EXPORTER=none\n")
+        return
+    if config.exporter in ("azure", "none") and not app_insights_connection:
+        # Checked before importing the exporters, which are slow to import
+        print("⚠️  Tracing disabled: APPLICATIONINSIGHTS_CONNECTION_STRING not set\n")
         return
 
     try:
-        trace_exporter = AzureMonitorTraceExporter.from_connection_string(
-            app_insights_connection)
-        metric_exporter = AzureMonitorMetricExporter.from_connection_string(
-            app_insights_connection)
-        log_exporter = AzureMonitorLogExporter.from_connection_string(
-            app_insights_connection)
-
-        configure_otel_providers(
-            enable_sensitive_data=True,  # Capture prompts and completions
-            exporters=[trace_exporter, metric_exporter, log_exporter],
-        )
-        print("📊 Agent Framework tracing enabled (Azure Monitor)")
-        print(f"   Traces sent to: {app_insights_connection.split(';')[0]}")
-        print("   View in Azure AI Foundry portal: https://ai.azure.com -> Your Project -> Tracing\n")
+        from agent_framework.observability import create_resource, enable_instrumentation
+
+        exporters = _create_exporters(config, app_insights_connection)
+        if exporters.get("file") is not None:
+            # Registered before the providers exist: their own exit hooks run
+            # first (atexit is LIFO) and flush into the file before it closes
+            atexit.register(exporters["file"].close)
+        configure_providers(config, exporters, resource=create_resource())
+        enable_instrumentation(enable_sensitive_data=config.capture_content)
+    except ImportError as e:
+        print(f"⚠️  Agent Framework observability not available ({e.name}).")
+        return
     except Exception as e:
         print(f"⚠️  Tracing setup failed: {e}\n")
+        return
+
+    if config.exporter == "azure":
+        print("📊 Agent Framework tracing enabled (Azure Monitor)")
+        print(f"   Traces sent to: {app_insights_connection.split(';')[0]}")
+        print("   View in Azure AI Foundry portal: https://ai.azure.com -> Your Project -> Tracing")
+    elif config.exporter == "otlp":
+        print(f"📊 Agent Framework tracing enabled (OTLP -> {config.otlp_endpoint})")
+    else:
+        print(f"📊 Agent Framework tracing enabled (file -> {config.file_path})")
+    print(f"   {config.describe()}\n")
+
+
+def _create_exporters(config: TracingConfig, app_insights_connection: Optional[str]) -> Dict[str, Any]:
+    """Return the span, metric and log exporters for ``config.exporter``
+
+    The file exporter also returns the open ``file`` the three exporters share,
+    which the caller closes once the providers have shut down.
+    """
+
+    if config.exporter == "azure":
+        from azure.monitor.opentelemetry.exporter import (
+            AzureMonitorLogExporter,
+            AzureMonitorMetricExporter,
+            AzureMonitorTraceExporter,
+        )
+
+        return {
+            "spans": AzureMonitorTraceExporter.from_connection_string(app_insights_connection),
+            "metrics": AzureMonitorMetricExporter.from_connection_string(app_insights_connection),
+            "logs": AzureMonitorLogExporter.from_connection_string(app_insights_connection),
+        }
+
+    if config.exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc._log_exporter import OTLPLogExporter
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+        timeout = config.export_timeout_ms / 1000
+        return {
+            "spans": OTLPSpanExporter(endpoint=config.otlp_endpoint, timeout=timeout),
+            "metrics": OTLPMetricExporter(endpoint=config.otlp_endpoint, timeout=timeout),
+            "logs": OTLPLogExporter(endpoint=config.otlp_endpoint, timeout=timeout),
+        }
+
+    # file: one JSON document per line, for offline runs and later inspection
+    from opentelemetry.sdk._logs.export import ConsoleLogRecordExporter
+    from opentelemetry.sdk.metrics.export import ConsoleMetricExporter
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    out = open(config.file_path, "a", encoding="utf-8")
+    return {
+        "spans": ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n"),
+        "metrics": ConsoleMetricExporter(out=out, formatter=lambda data: data.to_json(indent=None) + "\n"),
+        "logs": ConsoleLogRecordExporter(out=out, formatter=lambda record: record.to_json(indent=None) + "\n"),
+        "file": out,
+    }
+
+
+def configure_providers(config: TracingConfig, exporters: Dict[str, Any], resource: Any = None) -> Any:
+    """Install the global tracer/meter/logger providers; returns the tracer provider"""
+
+    import logging
+
+    from opentelemetry import metrics, trace
+    from opentelemetry._logs import set_logger_provider
+    from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
+    from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource
+
+    resource = resource or Resource.create()
+    tracer_provider = build_tracer_provider(config, exporters["spans"], resource)
+    trace.set_tracer_provider(tracer_provider)
+
+    if exporters.get("metrics") is not None:
+        reader = PeriodicExportingMetricReader(
+            exporters["metrics"], export_interval_millis=config.metric_interval_ms)
+        metrics.set_meter_provider(MeterProvider(metric_readers=[reader], resource=resource))
+
+    if exporters.get("logs") is not None:
+        logger_provider = LoggerProvider(resource=resource)
+        logger_provider.add_log_record_processor(BatchLogRecordProcessor(
+            exporters["logs"],
+            max_queue_size=config.max_queue_size,
+            schedule_delay_millis=config.schedule_delay_ms,
+            max_export_batch_size=config.max_export_batch_size,
+            export_timeout_millis=config.export_timeout_ms,
+        ))
+        logging.getLogger().addHandler(LoggingHandler(logger_provider=logger_provider))
+        set_logger_provider(logger_provider)
+
+    return tracer_provider
+
+
+def build_tracer_provider(config: TracingConfig, span_exporter: Any, resource: Any = None) -> Any:
+    """TracerProvider with the configured sampler and batch span processor"""
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ALWAYS_ON, ParentBased, TraceIdRatioBased
+
+    from .tail_sampling import TailSamplingProcessor
+
+    batch = BatchSpanProcessor(
+        span_exporter,
+        max_queue_size=config.max_queue_size,
+        schedule_delay_millis=config.schedule_delay_ms,
+        max_export_batch_size=config.max_export_batch_size,
+        export_timeout_millis=config.export_timeout_ms,
+    )
+
+    resource = resource or Resource.create()
+    if config.sampling == "tail":
+        provider = TracerProvider(sampler=ALWAYS_ON, resource=resource)
+        provider.add_span_processor(TailSamplingProcessor(batch, config.sample_ratio, config.slow_ms))
+    else:
+        provider = TracerProvider(sampler=ParentBased(TraceIdRatioBased(config.sample_ratio)), resource=resource)
+        provider.add_span_processor(batch)
+    return provider
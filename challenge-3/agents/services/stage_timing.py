@@ -0,0 +1,241 @@
+"""Per-stage timing for the Challenge 3 agent pipelines.
+
+``pipeline("maintenance_scheduler", work_order_id)`` opens the root span for one
+run and ``stage("retrieve_work_order")`` wraps each numbered step inside it.
+Both become OpenTelemetry spans when the API is installed (they are exported by
+whatever provider ``enable_tracing`` configured, and are no-ops otherwise), and
+every finished stage is also kept as a ``StageRecord`` with its duration, item
+counts and token usage. Stage latency, model latency and tokens, and the
+outcome of each run also feed the in-process metrics in ``services.metrics``.
+
+Token usage is attached to the innermost open stage by ``record_usage``, which
+``run_structured`` calls with the ``usage_details`` of each model response.
+
+When ``AGENT_STAGE_TIMINGS_FILE`` is set, records are appended to that file as
+JSON lines; ``run-batch.py`` uses this to aggregate stage latencies across the
+agent processes it starts.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .metrics import LLM_SECONDS, LLM_TOKENS, STAGE_SECONDS, WORK_ORDERS
+
+STAGE_TIMINGS_ENV = "AGENT_STAGE_TIMINGS_FILE"
+TRACER_NAME = "factory_ops.agents"
+LLM_STAGE = "llm"
+
+
+@dataclass
+class StageRecord:
+    """One finished stage of one pipeline run"""
+
+    agent: str
+    stage: str
+    seconds: float
+    ok: bool = True
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class Stage:
+    """Handle for an open stage; attributes end up on the span and the record"""
+
+    def __init__(self, agent: str, name: str, span: Any = None):
+        self.agent = agent
+        self.name = name
+        self.span = span
+        self.attributes: Dict[str, Any] = {}
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+        if self.span is not None:
+            for key, value in attributes.items():
+                self.span.set_attribute(f"stage.{key}", value)
+
+    def add_tokens(self, input_tokens: int, output_tokens: int) -> None:
+        for key, value in (("input_tokens", input_tokens), ("output_tokens", output_tokens)):
+            self.attributes[key] = self.attributes.get(key, 0) + value
+            if self.span is not None:
+                self.span.set_attribute(f"gen_ai.usage.{key}", self.attributes[key])
+
+
+class _Run:
+    """Outcome of the pipeline run a stage belongs to"""
+
+    failed = False
+
+
+_agent: ContextVar[str] = ContextVar("stage_agent", default="agent")
+_run: ContextVar[Optional[_Run]] = ContextVar("stage_run", default=None)
+_current: ContextVar[Optional[Stage]] = ContextVar("current_stage", default=None)
+_tracer: Any = None
+
+
+def _get_tracer():
+    global _tracer
+    if _tracer is None:
+        try:
+            # Deferred so the agents' cold start does not pay for it
+            from opentelemetry import trace
+
+            _tracer = trace.get_tracer(TRACER_NAME)
+        except ImportError:
+            _tracer = False
+    return _tracer or None
+
+
+@contextmanager
+def _span(name: str, attributes: Dict[str, Any]) -> Iterator[Any]:
+    tracer = _get_tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, attributes=attributes) as span:
+        yield span
+
+
+@contextmanager
+def pipeline(agent: str, work_order_id: str) -> Iterator[None]:
+    """Root span for one pipeline run; stages opened inside are tagged with ``agent``
+
+    The run counts as failed if any stage raised, even when the caller handled it.
+    """
+
+    run = _Run()
+    agent_token = _agent.set(agent)
+    run_token = _run.set(run)
+    try:
+        with _span(f"{agent}.process_work_order", {"work_order.id": work_order_id}) as span:
+            try:
+                yield
+            except BaseException:
+                run.failed = True
+                raise
+            finally:
+                if span is not None and run.failed:
+                    from opentelemetry.trace import Status, StatusCode
+
+                    span.set_status(Status(StatusCode.ERROR))
+    finally:
+        _run.reset(run_token)
+        _agent.reset(agent_token)
+        WORK_ORDERS.inc(agent=agent, outcome="failed" if run.failed else "completed")
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[Stage]:
+    """Time one stage as a child span of the current pipeline"""
+
+    agent = _agent.get()
+    started = time.perf_counter()
+    with _span(f"{agent}.{name}", {f"stage.{k}": v for k, v in attributes.items()}) as span:
+        current = Stage(agent, name, span)
+        current.attributes.update(attributes)
+        token = _current.set(current)
+        ok = True
+        try:
+            yield current
+        except BaseException:
+            ok = False
+            run = _run.get()
+            if run is not None:
+                run.failed = True
+            raise
+        finally:
+            _current.reset(token)
+            seconds = time.perf_counter() - started
+            if span is not None:
+                span.set_attribute("stage.duration_ms", round(seconds * 1000, 3))
+            STAGE_SECONDS.observe(seconds, agent=agent, stage=name)
+            if name == LLM_STAGE:
+                LLM_SECONDS.observe(seconds, agent=agent)
+            _emit(StageRecord(agent, name, seconds, ok, current.attributes))
+
+
+def record_usage(usage: Any) -> None:
+    """Add a response's ``usage_details`` token counts to the current stage"""
+
+    if usage is None:
+        return
+    input_tokens = getattr(usage, "input_token_count", None) or 0
+    output_tokens = getattr(usage, "output_token_count", None) or 0
+    agent = _agent.get()
+    LLM_TOKENS.inc(input_tokens, agent=agent, direction="input")
+    LLM_TOKENS.inc(output_tokens, agent=agent, direction="output")
+
+    current = _current.get()
+    if current is not None:
+        current.add_tokens(input_tokens, output_tokens)
+
+
+def _emit(record: StageRecord) -> None:
+    path = os.environ.get(STAGE_TIMINGS_ENV)
+    if not path:
+        return
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(asdict(record), default=str) + "\n")
+    except OSError as e:
+        print(f"⚠️  Could not write stage timings to {path}: {e}")
+
+
+# =============================================================================
+# Aggregation
+# =============================================================================
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile (``q`` in 0..100)"""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def load_records(path: str) -> List[StageRecord]:
+    """Read the JSON lines written under ``AGENT_STAGE_TIMINGS_FILE``"""
+
+    records: List[StageRecord] = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(StageRecord(**json.loads(line)))
+    return records
+
+
+def format_stage_table(records: Iterable[StageRecord]) -> str:
+    """Mean/p95/max latency per (agent, stage), in first-seen order"""
+
+    groups: Dict[tuple, List[StageRecord]] = {}
+    for record in records:
+        groups.setdefault((record.agent, record.stage), []).append(record)
+    if not groups:
+        return "   (no stage timings recorded)"
+
+    lines = [
+        f"   {'agent':<22} {'stage':<22} {'n':>4} {'mean ms':>9} {'p95 ms':>9} "
+        f"{'max ms':>9} {'tokens in/out':>14} {'errors':>6}"
+    ]
+    for (agent, name), group in groups.items():
+        ms = [r.seconds * 1000 for r in group]
+        tokens_in = sum(r.attributes.get("input_tokens", 0) for r in group)
+        tokens_out = sum(r.attributes.get("output_tokens", 0) for r in group)
+        tokens = f"{tokens_in}/{tokens_out}" if tokens_in or tokens_out else "-"
+        lines.append(
+            f"   {agent:<22} {name:<22} {len(group):>4} {sum(ms) / len(ms):>9.1f} "
+            f"{percentile(ms, 95):>9.1f} {max(ms):>9.1f} {tokens:>14} "
+            f"{sum(1 for r in group if not r.ok):>6}"
+        )
+    return "\n".join(lines)
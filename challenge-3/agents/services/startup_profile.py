@@ -0,0 +1,129 @@
+"""Cold-start profiling for the Challenge 3 agent entry points.
+
+``--profile-startup`` re-runs the agent script in a child process with
+``AGENT_STARTUP_PROBE=1``. The child exits the moment it is about to issue its
+first network request (see ``mark_first_request``), so profiling works offline
+and measures exactly "process start -> first request". A second child run with
+``-X importtime`` provides the per-package import breakdown.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+PROBE_ENV = "AGENT_STARTUP_PROBE"
+PROBE_MARKER = "__first_request__"
+
+# Placeholders so the probe gets past the env var validation without real secrets
+PLACEHOLDER_ENV = {
+    "COSMOS_ENDPOINT": "https://localhost:8081/",
+    "COSMOS_KEY": "probe",
+    "COSMOS_DATABASE_NAME": "FactoryOpsDB",
+    "AI_FOUNDRY_PROJECT_ENDPOINT": "https://localhost/api/projects/probe",
+}
+
+
+def mark_first_request() -> None:
+    """Called right before the first outbound request; exits when probing."""
+
+    if os.environ.get(PROBE_ENV) == "1":
+        sys.stderr.write(PROBE_MARKER + "\n")
+        sys.stderr.flush()
+        os._exit(0)
+
+
+@dataclass
+class StartupProfile:
+    """Result of one probed cold start"""
+
+    seconds: float
+    reached_first_request: bool
+    imports_us: Dict[str, int] = field(default_factory=dict)
+    output: str = ""
+
+    @property
+    def total_import_us(self) -> int:
+        return sum(self.imports_us.values())
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Aggregate ``-X importtime`` output into cumulative microseconds per top-level package."""
+
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        # Nested imports are indented; their time is already in the parent's cumulative
+        if name.startswith("  "):
+            continue
+        root = name.strip().split(".")[0]
+        totals[root] = totals.get(root, 0) + int(cumulative.strip())
+    return totals
+
+
+def run_probe(
+    script: str,
+    args: Sequence[str] = (),
+    importtime: bool = False,
+    fill_env: bool = True,
+    timeout: float = 120.0,
+) -> StartupProfile:
+    """Start ``script`` in a fresh interpreter and time it up to its first request."""
+
+    env = dict(os.environ)
+    env[PROBE_ENV] = "1"
+    if fill_env:
+        for name, value in PLACEHOLDER_ENV.items():
+            env.setdefault(name, value)
+    else:
+        for name in PLACEHOLDER_ENV:
+            env.pop(name, None)
+
+    cmd = [sys.executable, *(["-X", "importtime"] if importtime else []), script, *args]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env, timeout=timeout)
+    elapsed = time.perf_counter() - start
+
+    return StartupProfile(
+        seconds=elapsed,
+        reached_first_request=PROBE_MARKER in proc.stderr,
+        imports_us=parse_importtime(proc.stderr) if importtime else {},
+        output=proc.stdout,
+    )
+
+
+def profile_startup(script: str, args: Optional[List[str]] = None, runs: int = 3, top: int = 15) -> None:
+    """Print time-to-first-request and an import-time breakdown for ``script``."""
+
+    args = [a for a in (args or []) if a != "--profile-startup"]
+    print(f"=== Startup profile: {os.path.basename(script)} ===\n")
+
+    timings = sorted(run_probe(script, args).seconds for _ in range(runs))
+    reached = run_probe(script, args, importtime=True)
+    fail_fast = run_probe(script, args, fill_env=False)
+
+    print(f"Time to first request (median of {runs}): {timings[len(timings) // 2] * 1000:.0f} ms")
+    print(f"   min {timings[0] * 1000:.0f} ms / max {timings[-1] * 1000:.0f} ms")
+    if fail_fast.reached_first_request:
+        print("Missing-env fail-fast path: n/a (.env provides the required variables)")
+    else:
+        print(f"Missing-env fail-fast path: {fail_fast.seconds * 1000:.0f} ms")
+    if not reached.reached_first_request:
+        print("⚠️  Probe exited before reaching the first request; output:")
+        print(reached.output)
+
+    print(f"\nImport time by package (top {top}, cumulative, -X importtime):")
+    total_ms = reached.total_import_us / 1000
+    for name, us in sorted(reached.imports_us.items(), key=lambda kv: -kv[1])[:top]:
+        share = (us / reached.total_import_us * 100) if reached.total_import_us else 0
+        print(f"   {us / 1000:8.1f} ms  {share:5.1f}%  {name}")
+    print(f"   {total_ms:8.1f} ms  total\n")
@@ -0,0 +1,352 @@
+"""Structured (schema-validated) model output for Challenge 3 agents.
+
+The schemas below are passed to the Agent Framework as ``response_format`` so the
+model is asked for JSON matching a declared shape, and the same schemas are used
+to validate whatever comes back. When validation fails we send one short repair
+message on the same thread instead of re-running the whole analysis.
+
+``stream_structured`` does the same over the streaming run API, parsing the JSON
+as tokens arrive so callers can act on the structured fields before the
+free-text ``reasoning`` has finished streaming.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from pydantic.alias_generators import to_camel
+
+from .stage_timing import record_usage
+
+MAX_REPAIR_ATTEMPTS = 1
+
+T = TypeVar("T", bound=BaseModel)
+
+
+class _CamelModel(BaseModel):
+    """Base model that reads/writes the camelCase keys used in Cosmos DB."""
+
+    model_config = ConfigDict(alias_generator=to_camel, populate_by_name=True)
+
+
+# =============================================================================
+# Maintenance schedule
+# =============================================================================
+
+
+class MaintenanceWindowOutput(_CamelModel):
+    id: str
+    start_time: datetime
+    end_time: datetime
+    production_impact: str
+    is_available: bool = True
+
+
+class MaintenanceScheduleOutput(_CamelModel):
+    scheduled_date: datetime
+    maintenance_window: MaintenanceWindowOutput
+    risk_score: float = Field(ge=0, le=100)
+    predicted_failure_probability: float = Field(ge=0.0, le=1.0)
+    recommended_action: Literal["IMMEDIATE", "URGENT", "SCHEDULED", "MONITOR"]
+    reasoning: str
+
+
+# =============================================================================
+# Parts orders
+# =============================================================================
+
+
+class OrderItemOutput(_CamelModel):
+    part_number: str
+    part_name: str
+    quantity: int = Field(ge=0)
+    unit_cost: float = Field(ge=0)
+    total_cost: float = Field(ge=0)
+
+
+class PartsOrderOutput(_CamelModel):
+    supplier_id: str
+    supplier_name: str
+    order_items: List[OrderItemOutput]
+    total_cost: float = Field(ge=0)
+    expected_delivery_date: datetime
+    reasoning: str = ""
+
+
+class PricedItemOutput(_CamelModel):
+    part_number: str
+    unit_cost: float = Field(ge=0)
+
+
+class ConsolidatedOrderOutput(_CamelModel):
+    order_items: List[PricedItemOutput]
+    expected_delivery_date: datetime
+    reasoning: str = ""
+
+
+# =============================================================================
+# Parsing and repair
+# =============================================================================
+
+
+class StructuredOutputError(Exception):
+    """Raised when a model response does not match the requested schema."""
+
+    def __init__(self, message: str, errors: Optional[List[str]] = None):
+        super().__init__(message)
+        self.errors = errors or [message]
+
+
+def extract_json(response: str) -> str:
+    """Return the JSON payload of a response, tolerating code fences."""
+
+    text = response.strip()
+    if text.startswith("{"):
+        return text
+
+    if "```json" in text:
+        start = text.index("```json") + 7
+        end = text.find("```", start)
+        return text[start:end if end >= 0 else None].strip()
+
+    start = text.find("{")
+    if start >= 0:
+        end = text.rfind("}")
+        return text[start: end + 1]
+
+    raise StructuredOutputError("Response did not contain a JSON object")
+
+
+def parse_structured(response: str, output_type: Type[T]) -> T:
+    """Parse and validate a model response against ``output_type``."""
+
+    payload = extract_json(response)
+    try:
+        return output_type.model_validate(json.loads(payload))
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Invalid JSON: {e.msg} at position {e.pos}")
+    except ValidationError as e:
+        errors = [
+            f"{'.'.join(str(p) for p in err['loc']) or '<root>'}: {err['msg']}"
+            for err in e.errors()
+        ]
+        raise StructuredOutputError(
+            f"{len(errors)} schema validation error(s)", errors)
+
+
+def build_repair_prompt(error: StructuredOutputError) -> str:
+    """Build a short follow-up asking the model to fix only the broken fields."""
+
+    problems = "\n".join(f"- {msg}" for msg in error.errors[:20])
+    return (
+        "Your previous response did not match the required JSON schema:\n"
+        f"{problems}\n\n"
+        "Reply with the corrected JSON object only, no prose or code fences."
+    )
+
+
+async def run_structured(agent, prompt: str, thread, output_type: Type[T],
+                         check: Optional[Callable[[T], List[str]]] = None) -> Tuple[T, str]:
+    """Run the agent with a declared response schema, repairing once if needed.
+
+    ``check`` may return problems the schema cannot express (e.g. a missing
+    line); they are repaired the same way as schema errors.
+    Returns the validated model and the raw text of the accepted response.
+    """
+
+    result = await agent.run(prompt, thread=thread, response_format=output_type)
+    record_usage(getattr(result, "usage_details", None))
+    return await _validate_or_repair(agent, thread, output_type, result.text, check)
+
+
+async def stream_structured(
+    agent,
+    prompt: str,
+    thread,
+    output_type: Type[T],
+    on_ready: Optional[Callable[[T], Awaitable[None]]] = None,
+    on_stream_text: Optional[Callable[[str], None]] = None,
+    streamed_field: str = "reasoning",
+    check: Optional[Callable[[T], List[str]]] = None,
+) -> Tuple[T, str]:
+    """Streaming variant of ``run_structured``.
+
+    ``on_ready`` is awaited once, as soon as every field except
+    ``streamed_field`` has been received and validates (the streamed field is
+    passed as an empty string). ``on_stream_text`` receives the streamed field
+    incrementally. The complete response is validated (and repaired) at the end.
+    """
+
+    parser = IncrementalJsonParser()
+    ready_fired = False
+    checked = 0
+    streamed_len = 0
+
+    async for update in agent.run_stream(prompt, thread=thread, response_format=output_type):
+        for content in getattr(update, "contents", None) or ():
+            if getattr(content, "type", None) == "usage":
+                record_usage(content.details)
+        chunk = update.text
+        if not chunk:
+            continue
+        parser.feed(chunk)
+
+        if on_ready and not ready_fired and len(parser.completed) != checked:
+            checked = len(parser.completed)
+            early = parser.try_validate(output_type, {streamed_field: ""})
+            if early is not None:
+                ready_fired = True
+                await on_ready(early)
+
+        if on_stream_text:
+            current = parser.completed.get(streamed_field)
+            if current is None:
+                current = parser.partial_string(streamed_field)
+            if isinstance(current, str) and len(current) > streamed_len:
+                on_stream_text(current[streamed_len:])
+                streamed_len = len(current)
+
+    return await _validate_or_repair(agent, thread, output_type, parser.text, check)
+
+
+async def _validate_or_repair(agent, thread, output_type: Type[T], text: str,
+                              check: Optional[Callable[[T], List[str]]] = None) -> Tuple[T, str]:
+    repairs = 0
+
+    while True:
+        try:
+            data = parse_structured(text, output_type)
+            problems = check(data) if check else []
+            if problems:
+                raise StructuredOutputError(f"{len(problems)} content error(s)", problems)
+            return data, text
+        except StructuredOutputError as e:
+            if repairs >= MAX_REPAIR_ATTEMPTS:
+                raise
+            repairs += 1
+            print(f"   Warning: {e}; requesting repair")
+            result = await agent.run(
+                build_repair_prompt(e), thread=thread, response_format=output_type)
+            record_usage(getattr(result, "usage_details", None))
+            text = result.text
+
+
+# =============================================================================
+# Incremental parsing
+# =============================================================================
+
+
+class IncrementalJsonParser:
+    """Incrementally scan a streamed JSON object and collect finished top-level values.
+
+    Only the outer object is tracked: a top-level value is decoded once its
+    closing quote/bracket (or the following comma for scalars) has arrived.
+    Anything before the first ``{`` (such as a code fence) is ignored.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.completed: Dict[str, Any] = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._mode = "start"  # start -> key -> colon -> value -> after_value
+        self._key: Optional[str] = None
+        self._key_start = -1
+        self._value_start = -1
+
+    def feed(self, chunk: str) -> None:
+        self.text += chunk
+        text = self.text
+
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            ch = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._mode == "key":
+                        self._key = json.loads(text[self._key_start: i + 1])
+                        self._mode = "colon"
+                    elif self._depth == 1 and self._mode == "value":
+                        self._complete(text[self._value_start: i + 1])
+                continue
+
+            if self._mode == "start":
+                if ch == "{":
+                    self._depth = 1
+                    self._mode = "key"
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._mode == "key":
+                    self._key_start = i
+                elif self._depth == 1 and self._mode == "value" and self._value_start < 0:
+                    self._value_start = i
+            elif ch in "{[":
+                if self._depth == 1 and self._mode == "value" and self._value_start < 0:
+                    self._value_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._mode == "value":
+                    self._complete(text[self._value_start: i + 1])
+                elif self._depth == 0:
+                    if self._mode == "value" and self._value_start >= 0:
+                        self._complete(text[self._value_start: i])
+                    self.done = True
+            elif self._depth == 1:
+                if ch == ":" and self._mode == "colon":
+                    self._mode = "value"
+                    self._value_start = -1
+                elif ch == ",":
+                    if self._mode == "value" and self._value_start >= 0:
+                        self._complete(text[self._value_start: i])
+                    self._mode = "key"
+                elif self._mode == "value" and self._value_start < 0 and not ch.isspace():
+                    self._value_start = i
+
+        self._pos = len(text)
+
+    def partial_string(self, key: str) -> Optional[str]:
+        """Return the decoded prefix of a top-level string value still streaming."""
+
+        if not (self._in_string and self._mode == "value" and self._key == key and self._depth == 1):
+            return None
+        raw = self.text[self._value_start + 1:]
+        # Drop a dangling escape sequence so the prefix always decodes
+        cut = raw.rfind("\\")
+        if cut >= 0 and cut >= len(raw) - 6:
+            raw = raw[:cut]
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return None
+
+    def try_validate(self, output_type: Type[T], placeholders: Dict[str, Any]) -> Optional[T]:
+        """Validate the finished fields, filling the still-streaming ones with placeholders."""
+
+        try:
+            return output_type.model_validate({**placeholders, **self.completed})
+        except ValidationError:
+            return None
+
+    def _complete(self, raw: str) -> None:
+        try:
+            self.completed[self._key] = json.loads(raw.strip())
+        except json.JSONDecodeError:
+            pass
+        self._mode = "after_value"
+        self._value_start = -1
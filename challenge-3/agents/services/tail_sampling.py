@@ -0,0 +1,80 @@
+"""Tail sampling span processor used by ``observability.enable_tracing``.
+
+Kept out of observability.py so the OpenTelemetry SDK is only imported when
+tracing is actually enabled.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.trace import StatusCode
+
+MAX_PENDING_TRACES = 4096
+
+_TRACE_ID_MASK = (1 << 64) - 1
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """Buffer spans per trace and forward whole traces worth keeping to ``delegate``
+
+    A trace is decided when its local root span ends (no parent, or a remote
+    parent): it is kept if any span has an error status, the root took at least
+    ``slow_ms``, or the trace id falls under ``sample_ratio`` (the same rule as
+    ``TraceIdRatioBased``). At most ``max_pending`` undecided traces are
+    buffered; beyond that the oldest is decided early with the spans it has.
+    """
+
+    def __init__(self, delegate: SpanProcessor, sample_ratio: float, slow_ms: float,
+                 max_pending: int = MAX_PENDING_TRACES):
+        self.delegate = delegate
+        self.threshold = round(sample_ratio * (_TRACE_ID_MASK + 1))
+        self.slow_ns = int(slow_ms * 1_000_000)
+        self.max_pending = max_pending
+        self.kept = 0
+        self.dropped = 0
+        self._pending: "OrderedDict[int, List[ReadableSpan]]" = OrderedDict()
+        self._errored: set = set()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None) -> None:
+        self.delegate.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id
+        is_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            self._pending.setdefault(trace_id, []).append(span)
+            if span.status.status_code is StatusCode.ERROR:
+                self._errored.add(trace_id)
+
+            decided = []
+            if is_root:
+                slow = (span.end_time - span.start_time) >= self.slow_ns
+                decided.append((trace_id, self._pending.pop(trace_id), slow))
+            while len(self._pending) > self.max_pending:
+                oldest, spans = self._pending.popitem(last=False)
+                decided.append((oldest, spans, False))
+
+            keep: List[ReadableSpan] = []
+            for tid, spans, slow in decided:
+                errored = tid in self._errored
+                self._errored.discard(tid)
+                if errored or slow or (tid & _TRACE_ID_MASK) < self.threshold:
+                    self.kept += 1
+                    keep.extend(spans)
+                else:
+                    self.dropped += 1
+
+        for kept_span in keep:
+            self.delegate.on_end(kept_span)
+
+    def shutdown(self) -> None:
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
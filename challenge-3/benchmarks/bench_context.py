@@ -0,0 +1,70 @@
+"""Prompt context assembly and response parsing"""
+
+import json
+
+from conftest import (
+    history_docs,
+    inventory_docs,
+    supplier_docs,
+    window_docs,
+    work_order_docs,
+)
+
+
+def test_scheduler_build_context(benchmark, converter, size):
+    from maintenance_scheduler_agent import MaintenanceSchedulerAgent
+
+    agent = MaintenanceSchedulerAgent("", "", None)
+    work_order = converter._to_work_order(work_order_docs(size)[0])
+    history = [converter._to_maintenance_history(d) for d in history_docs(size)]
+    windows = [converter._to_maintenance_window(d) for d in window_docs(size)]
+
+    result = benchmark(agent._build_context, work_order, history, windows)
+    assert result.tokens_after <= max(result.budget, result.tokens_before)
+
+
+def test_parts_build_context(benchmark, converter, size):
+    from parts_ordering_agent import PartsOrderingAgent
+
+    agent = PartsOrderingAgent("", "", None)
+    work_order = converter._to_work_order(work_order_docs(size)[0])
+    inventory = [converter._to_inventory_item(d) for d in inventory_docs(size)]
+    suppliers = [converter._to_supplier(d) for d in supplier_docs(size)]
+
+    result = benchmark(agent._build_context, work_order, inventory, suppliers)
+    assert result.tokens_after <= max(result.budget, result.tokens_before)
+
+
+def _order_response(size: int) -> str:
+    items = [
+        {"partNumber": d["partNumber"], "partName": d["partName"],
+         "quantity": 1 + i % 5, "unitCost": 12.5, "totalCost": 12.5 * (1 + i % 5)}
+        for i, d in enumerate(inventory_docs(size))
+    ]
+    payload = {
+        "supplierId": "supplier-0000001",
+        "supplierName": "Supplier 1",
+        "orderItems": items,
+        "totalCost": sum(item["totalCost"] for item in items),
+        "expectedDeliveryDate": "2026-01-10T00:00:00Z",
+        "reasoning": "Highest reliability supplier carrying every part.",
+    }
+    return "Here is the order:\n```json\n" + json.dumps(payload, indent=2) + "\n```\n"
+
+
+def test_extract_json(benchmark, size):
+    from services.structured_output import extract_json
+
+    response = _order_response(size)
+
+    result = benchmark(extract_json, response)
+    assert result.startswith("{")
+
+
+def test_parse_structured(benchmark, size):
+    from services.structured_output import PartsOrderOutput, parse_structured
+
+    response = _order_response(size)
+
+    result = benchmark(parse_structured, response, PartsOrderOutput)
+    assert len(result.order_items) == size
@@ -0,0 +1,77 @@
+"""Document conversion, datetime parsing and supplier/inventory filtering"""
+
+from conftest import (
+    history_docs,
+    inventory_docs,
+    supplier_docs,
+    window_docs,
+    work_order_docs,
+)
+
+
+def test_parse_datetime(benchmark, converter, size):
+    values = [doc["occurrenceDate"] for doc in history_docs(size)]
+    parse = converter._parse_datetime
+
+    result = benchmark(lambda: [parse(v) for v in values])
+    assert result[0] is not None
+
+
+def test_to_work_order(benchmark, converter, size):
+    docs = work_order_docs(size)
+
+    result = benchmark(lambda: [converter._to_work_order(d) for d in docs])
+    assert len(result) == size
+
+
+def test_to_maintenance_history(benchmark, converter, size):
+    docs = history_docs(size)
+
+    result = benchmark(lambda: [converter._to_maintenance_history(d) for d in docs])
+    assert len(result) == size
+
+
+def test_to_maintenance_window(benchmark, converter, size):
+    docs = window_docs(size)
+
+    result = benchmark(lambda: [converter._to_maintenance_window(d) for d in docs])
+    assert len(result) == size
+
+
+def test_to_inventory_item(benchmark, converter, size):
+    docs = inventory_docs(size)
+
+    result = benchmark(lambda: [converter._to_inventory_item(d) for d in docs])
+    assert len(result) == size
+
+
+def test_filter_suppliers(benchmark, converter, size):
+    docs = supplier_docs(size)
+    wanted = [p["partNumber"] for p in work_order_docs(size)[0]["requiredParts"]]
+
+    result = benchmark(converter._filter_suppliers, docs, wanted)
+    assert result
+
+
+def test_consolidate_demand(benchmark, converter, size):
+    from parts_ordering_agent import PartsOrderingAgent
+
+    agent = PartsOrderingAgent("", "", None)
+    work_orders = [converter._to_work_order(d) for d in work_order_docs(size)]
+    inventory = [converter._to_inventory_item(d) for d in inventory_docs(size)]
+
+    result = benchmark(agent.consolidate_demand, work_orders, inventory)
+    assert result
+
+
+def test_group_demand_by_supplier(benchmark, converter, size):
+    from parts_ordering_agent import PartsOrderingAgent
+
+    agent = PartsOrderingAgent("", "", None)
+    work_orders = [converter._to_work_order(d) for d in work_order_docs(size)[:1000]]
+    demand = agent.consolidate_demand(work_orders, [])
+    wanted = [line.part_number for line in demand]
+    suppliers = converter._filter_suppliers(supplier_docs(size), wanted)
+
+    result = benchmark(agent.group_demand_by_supplier, demand, suppliers)
+    assert result
@@ -0,0 +1,82 @@
+"""Tracing overhead per pipeline run under the enable_tracing configurations
+
+Each round runs RUNS simulated work orders (a root span with one child per
+stage, as services.stage_timing emits them) and then flushes the batch
+processor, so the exporter's serialization cost is included. ``off`` is the
+OpenTelemetry API without an SDK provider, the cost when tracing is disabled.
+"""
+
+import pytest
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry.sdk.trace.export import ConsoleSpanExporter  # noqa: E402
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter  # noqa: E402
+from opentelemetry.trace import NoOpTracerProvider  # noqa: E402
+
+from services.observability import TracingConfig, build_tracer_provider  # noqa: E402
+
+RUNS = 100
+STAGES = ("retrieve_work_order", "analyze_history", "check_windows", "build_context",
+          "load_chat_history", "llm", "save_chat_history", "ai_analysis", "save_schedule",
+          "update_status")
+# Roughly what prompt/completion capture attaches to the model call span
+PROMPT = "## Maintenance history\n" + "- 2025-01-01: bearing_wear (120min, $450.0)\n" * 150
+COMPLETION = '{"riskScore": 62, "reasoning": "' + "lowest impact window " * 60 + '"}'
+
+CONFIGS = {
+    "off": None,
+    "memory_all": TracingConfig(),
+    "memory_head_10pct": TracingConfig(sample_ratio=0.1),
+    "memory_tail_10pct": TracingConfig(sampling="tail", sample_ratio=0.1),
+    "file_all_content": TracingConfig(exporter="file", capture_content=True),
+    "file_all_no_content": TracingConfig(exporter="file", capture_content=False),
+    "file_tail_10pct": TracingConfig(exporter="file", sampling="tail", sample_ratio=0.1),
+}
+
+
+def _run_batch(tracer, capture_content: bool) -> None:
+    for n in range(RUNS):
+        with tracer.start_as_current_span("maintenance_scheduler.process_work_order") as root:
+            root.set_attribute("work_order.id", f"wo-{n:05d}")
+            for name in STAGES:
+                with tracer.start_as_current_span(f"maintenance_scheduler.{name}") as span:
+                    span.set_attribute("stage.items", 12)
+                    span.set_attribute("stage.duration_ms", 1.5)
+                    if name == "llm":
+                        span.set_attribute("gen_ai.usage.input_tokens", 4196)
+                        span.set_attribute("gen_ai.usage.output_tokens", 1056)
+                        if capture_content:
+                            span.add_event("gen_ai.user.message", {"content": PROMPT})
+                            span.add_event("gen_ai.choice", {"content": COMPLETION})
+
+
+@pytest.mark.parametrize("name", list(CONFIGS))
+def test_tracing_overhead(benchmark, tmp_path, name):
+    config = CONFIGS[name]
+    if config is None:
+        tracer = NoOpTracerProvider().get_tracer("bench")
+        benchmark(_run_batch, tracer, False)
+        return
+
+    out = None
+    if config.exporter == "file":
+        out = open(tmp_path / "traces.jsonl", "w", encoding="utf-8")
+        exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    else:
+        exporter = InMemorySpanExporter()
+    provider = build_tracer_provider(config, exporter)
+    tracer = provider.get_tracer("bench")
+
+    def batch():
+        _run_batch(tracer, config.capture_content)
+        provider.force_flush()
+        if isinstance(exporter, InMemorySpanExporter):
+            exporter.clear()
+
+    try:
+        benchmark(batch)
+    finally:
+        provider.shutdown()
+        if out is not None:
+            out.close()
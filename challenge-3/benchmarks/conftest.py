@@ -0,0 +1,142 @@
+"""Shared fixtures for the Challenge 3 microbenchmarks.
+
+Inputs are the challenge-0 seed documents, mapped to the shapes the Challenge 3
+containers hold and replicated (with unique ids) up to the requested size.
+Sizes come from ``--bench-sizes`` or the BENCHMARK_SIZES environment variable.
+"""
+
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List
+
+import pytest
+
+CHALLENGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(CHALLENGE_DIR), "challenge-0", "data")
+sys.path.insert(0, os.path.join(CHALLENGE_DIR, "agents"))
+
+DEFAULT_SIZES = "10000,100000"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench-sizes",
+        default=os.getenv("BENCHMARK_SIZES", DEFAULT_SIZES),
+        help="Comma-separated record counts to benchmark (e.g. 10000,100000,1000000)",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        sizes = [int(s) for s in metafunc.config.getoption("--bench-sizes").split(",") if s]
+        metafunc.parametrize("size", sizes, ids=[f"{s:,}".replace(",", "_") for s in sizes])
+
+
+@lru_cache(maxsize=None)
+def _load(name: str) -> tuple:
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8") as f:
+        return tuple(json.load(f))
+
+
+def _replicate(docs: tuple, size: int) -> List[dict]:
+    out = []
+    for i in range(size):
+        doc = dict(docs[i % len(docs)])
+        doc["id"] = f"{doc['id']}-{i}"
+        out.append(doc)
+    return out
+
+
+@lru_cache(maxsize=None)
+def history_docs(size: int) -> List[dict]:
+    """MaintenanceHistory documents, dates spread back over ten years"""
+
+    docs = _replicate(_load("maintenance-history.json"), size)
+    base = datetime(2025, 12, 1)
+    for i, doc in enumerate(docs):
+        occurred = base - timedelta(hours=i * 87600 // max(size, 1))
+        doc["occurrenceDate"] = occurred.isoformat() + "Z"
+        doc["resolutionDate"] = (occurred + timedelta(minutes=doc.get("downtime", 0))).isoformat() + "Z"
+    return docs
+
+
+@lru_cache(maxsize=None)
+def window_docs(size: int) -> List[dict]:
+    return _replicate(_load("maintenance-windows.json"), size)
+
+
+@lru_cache(maxsize=None)
+def inventory_docs(size: int) -> List[dict]:
+    """PartsInventory documents in the field names CosmosDbService reads"""
+
+    docs = []
+    for doc in _replicate(_load("parts-inventory.json"), size):
+        docs.append({
+            "id": doc["id"],
+            "partNumber": f"{doc['partNumber']}-{doc['id'].rsplit('-', 1)[1]}",
+            "partName": doc["name"],
+            "currentStock": doc["quantityInStock"],
+            "minStock": doc["reorderLevel"],
+            "reorderPoint": doc["reorderLevel"],
+            "location": doc["location"],
+            "category": doc["category"],
+        })
+    return docs
+
+
+@lru_cache(maxsize=None)
+def supplier_docs(size: int) -> List[dict]:
+    """Supplier documents: there is no supplier fixture, so each carries a
+    slice of the scaled parts catalogue"""
+
+    parts = [doc["partNumber"] for doc in inventory_docs(size)]
+    reliabilities = ("High", "Medium", "Low")
+    return [
+        {
+            "id": f"supplier-{i:07d}",
+            "name": f"Supplier {i}",
+            "parts": parts[(i * 7) % len(parts):(i * 7) % len(parts) + 8],
+            "leadTimeDays": 1 + i % 21,
+            "reliability": reliabilities[i % 3],
+            "contactEmail": f"orders{i}@example.com",
+        }
+        for i in range(size)
+    ]
+
+
+@lru_cache(maxsize=None)
+def work_order_docs(size: int) -> List[dict]:
+    """WorkOrders documents with requiredParts drawn from the scaled inventory"""
+
+    parts = inventory_docs(size)
+    docs = []
+    for i, doc in enumerate(_replicate(_load("work-orders.json"), size)):
+        required = [parts[(i * 3 + k) % len(parts)] for k in range(3)]
+        docs.append({
+            "id": doc["id"],
+            "machineId": doc["machineId"],
+            "faultType": doc["title"],
+            "priority": doc["priority"],
+            "assignedTechnician": doc.get("assignedTo", ""),
+            "requiredParts": [
+                {"partNumber": p["partNumber"], "partName": p["partName"],
+                 "quantity": 1 + (i + k) % 4, "isAvailable": p["currentStock"] > 0}
+                for k, p in enumerate(required)
+            ],
+            "estimatedDuration": doc.get("estimatedDuration", 0),
+            "createdAt": doc["createdDate"],
+            "status": doc["status"],
+        })
+    return docs
+
+
+@pytest.fixture(scope="session")
+def converter():
+    """CosmosDbService without a client; document conversion needs none"""
+
+    from services.cosmos_db_service import CosmosDbService
+
+    return CosmosDbService.__new__(CosmosDbService)
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""End-to-end load test for the Challenge 3 agent pipeline.
+
+Runs ``process_work_order`` for the Maintenance Scheduler and/or Parts Ordering
+agents against in-process stand-ins: ``services.local_chat.LocalChatAgent`` for
+the model and ``services.local_cosmos.LocalCosmosDatabase`` for Cosmos DB. Both
+take latency distributions, error rates and 429 injection, so the numbers show
+how the pipeline itself behaves under load without any Azure resources.
+
+For every concurrency level the store is re-seeded and a fixed number of work
+orders is pushed through by that many workers. The report lists throughput,
+latency percentiles and failures per level and the level after which adding
+workers stops improving throughput (the saturation point).
+
+Usage:
+    python benchmarks/load_test.py [--agent pipeline|scheduler|parts] [--concurrency 1,2,4,8,16,32]
+        [--requests N] [--llm SPEC] [--cosmos SPEC] [--data-dir DIR] [--metrics-port PORT]
+
+A latency SPEC is ``median=MS,p95=MS,errors=RATE,throttle=RATE,retry_after=MS``.
+
+Example:
+    python benchmarks/load_test.py --llm median=1200,p95=4000,throttle=0.02 --cosmos median=6,p95=25
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+CHALLENGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(CHALLENGE_DIR), "challenge-0", "data")
+sys.path.insert(0, os.path.join(CHALLENGE_DIR, "agents"))
+
+import maintenance_scheduler_agent as scheduler  # noqa: E402
+import parts_ordering_agent as parts  # noqa: E402
+from services.agent_pool import AgentPool  # noqa: E402
+from services.cosmos_db_service import CosmosDbService  # noqa: E402
+from services.local_chat import LocalChatAgent  # noqa: E402
+from services.local_cosmos import LatencyProfile, LocalCosmosDatabase  # noqa: E402
+from services.metrics import QUEUE_DEPTH, start_metrics_server  # noqa: E402
+from services.stage_timing import percentile  # noqa: E402
+
+# File name (without extension) -> container
+CONTAINERS = {
+    "machines": "Machines",
+    "thresholds": "Thresholds",
+    "maintenance-history": "MaintenanceHistory",
+    "maintenance-windows": "MaintenanceWindows",
+    "parts-inventory": "PartsInventory",
+    "technicians": "Technicians",
+    "work-orders": "WorkOrders",
+    "suppliers": "Suppliers",
+}
+
+
+# =============================================================================
+# Data
+# =============================================================================
+
+
+def load_documents(data_dir: str) -> Dict[str, List[dict]]:
+    """Read .json (array) or .jsonl files for each container (telemetry is not needed)"""
+
+    docs: Dict[str, List[dict]] = {}
+    for stem, container in CONTAINERS.items():
+        for ext in (".jsonl", ".json"):
+            path = os.path.join(data_dir, stem + ext)
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                docs[container] = [json.loads(line) for line in f if line.strip()] \
+                    if ext == ".jsonl" else json.load(f)
+            break
+    return docs
+
+
+def prepare(docs: Dict[str, List[dict]], requests: int) -> Dict[str, List[dict]]:
+    """Fill the fields the agents read and create ``requests`` fresh work orders"""
+
+    inventory = []
+    for doc in docs.get("PartsInventory", []):
+        inventory.append({
+            **doc,
+            "partName": doc.get("partName", doc.get("name", "")),
+            "currentStock": doc.get("currentStock", doc.get("quantityInStock", 0)),
+            "minStock": doc.get("minStock", doc.get("reorderLevel", 0)),
+            "reorderPoint": doc.get("reorderPoint", doc.get("reorderLevel", 0)),
+        })
+    by_part_id = {doc["id"]: doc for doc in inventory}
+
+    # Windows are re-based to start tomorrow so they fall in the 14-day lookahead
+    windows = docs.get("MaintenanceWindows", [])
+    if windows:
+        first = min(datetime.fromisoformat(w["startTime"].replace("Z", "+00:00")) for w in windows)
+        tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        shift = timedelta(days=(tomorrow - first.replace(hour=0, minute=0, second=0)).days)
+
+        def moved(value: str) -> str:
+            return (datetime.fromisoformat(value.replace("Z", "+00:00")) + shift).isoformat()
+
+        windows = [{**w, "startTime": moved(w["startTime"]), "endTime": moved(w["endTime"])} for w in windows]
+
+        # Each run books its own window, so repeat the fixture in later weeks until every run can get one
+        starts = [datetime.fromisoformat(w["startTime"]) for w in windows]
+        ends = [datetime.fromisoformat(w["endTime"]) for w in windows]
+        span = timedelta(weeks=(max(ends) - min(starts)).days // 7 + 1)
+        base, week = list(windows), 1
+        while len(windows) < requests:
+            later = span * week
+            windows += [{**w, "id": f"{w['id']}-w{week}",
+                         "startTime": (datetime.fromisoformat(w["startTime"]) + later).isoformat(),
+                         "endTime": (datetime.fromisoformat(w["endTime"]) + later).isoformat()} for w in base]
+            week += 1
+
+    def required_parts(template: dict) -> List[dict]:
+        return template.get("requiredParts") or [
+            {"partNumber": by_part_id.get(p["partId"], {}).get("partNumber", p["partId"]),
+             "partName": by_part_id.get(p["partId"], {}).get("partName", p["partId"]),
+             "quantity": p.get("quantity", 1)}
+            for p in template.get("partsUsed", [])
+        ]
+
+    # Work orders without parts end the parts agent early with no order; leave them out
+    templates = [t for t in docs.get("WorkOrders", []) if required_parts(t)]
+    work_orders = []
+    for n in range(requests if templates else 0):
+        template = templates[n % len(templates)]
+        required = required_parts(template)
+        work_orders.append({
+            **template,
+            "id": f"{template['id']}-lt{n:05d}",
+            "faultType": template.get("faultType", template.get("title", "")),
+            "assignedTechnician": template.get("assignedTo", ""),
+            "createdAt": template.get("createdDate"),
+            # Every run must reach the model: nothing is in stock yet
+            "requiredParts": [{**p, "isAvailable": False} for p in required],
+            "status": "Created",
+        })
+
+    # No suppliers fixture: an empty container makes the service fall back to its defaults
+    return {**docs, "PartsInventory": inventory, "MaintenanceWindows": windows,
+            "WorkOrders": work_orders, "Suppliers": docs.get("Suppliers", [])}
+
+
+# =============================================================================
+# Load generation
+# =============================================================================
+
+
+@dataclass
+class LevelResult:
+    concurrency: int
+    latencies: List[float] = field(default_factory=list)
+    failures: int = 0
+    elapsed: float = 0.0
+    llm_calls: int = 0
+    llm_throttled: int = 0
+    llm_errors: int = 0
+    cosmos_requests: int = 0
+    cosmos_throttled: int = 0
+    cosmos_ru: float = 0.0
+
+    @property
+    def completed(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def per_minute(self) -> float:
+        return self.completed / self.elapsed * 60 if self.elapsed else 0.0
+
+
+async def run_level(args, seed_docs: Dict[str, List[dict]], concurrency: int) -> LevelResult:
+    database = LocalCosmosDatabase(LatencyProfile.parse(args.cosmos, seed=args.seed))
+    for container, docs in seed_docs.items():
+        database.load(container, docs)
+    cosmos_service = CosmosDbService.from_database(database)
+
+    agents: List[LocalChatAgent] = []
+    llm_latency = LatencyProfile.parse(args.llm, seed=args.seed + 1)
+
+    def factory(agent_name: str, instructions: str):
+        agent = LocalChatAgent(agent_name, latency=llm_latency, tokens_per_second=args.tokens_per_second)
+        agents.append(agent)
+        return agent
+
+    pool = AgentPool()
+    scheduler_agent = scheduler.MaintenanceSchedulerAgent(
+        "local", "local", cosmos_service, agent_pool=pool, agent_factory=factory)
+    parts_agent = parts.PartsOrderingAgent(
+        "local", "local", cosmos_service, agent_pool=pool, agent_factory=factory)
+
+    queue = [doc["id"] for doc in seed_docs["WorkOrders"]]
+    queue.reverse()
+    result = LevelResult(concurrency=concurrency)
+
+    async def one(work_order_id: str) -> bool:
+        if args.agent in ("pipeline", "scheduler"):
+            if await scheduler.process_work_order(cosmos_service, scheduler_agent, work_order_id,
+                                                  stream=args.stream) is None:
+                return False
+        if args.agent in ("pipeline", "parts"):
+            if await parts.process_work_order(cosmos_service, parts_agent, work_order_id,
+                                              stream=args.stream) is None:
+                return False
+        return True
+
+    async def worker():
+        while queue:
+            work_order_id = queue.pop()
+            QUEUE_DEPTH.set(len(queue), queue="load_test")
+            start = time.perf_counter()
+            try:
+                ok = await one(work_order_id)
+            except Exception:
+                ok = False
+            if ok:
+                result.latencies.append(time.perf_counter() - start)
+            else:
+                result.failures += 1
+
+    start = time.perf_counter()
+    # The agents print every step; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - start
+    await pool.aclose()
+
+    result.llm_calls = sum(a.calls for a in agents)
+    result.llm_throttled = sum(a.throttled for a in agents)
+    result.llm_errors = sum(a.errors for a in agents)
+    result.cosmos_requests = database.stats.requests
+    result.cosmos_throttled = database.stats.throttled
+    result.cosmos_ru = database.stats.request_charge
+    return result
+
+
+def report(results: List[LevelResult]) -> None:
+    print(f"\n{'conc':>5} {'done':>6} {'fail':>5} {'wo/min':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+          f" {'llm 429':>8} {'llm err':>8} {'db 429':>7} {'RU/s':>8}")
+    for r in results:
+        ms = [v * 1000 for v in r.latencies]
+        ru_per_s = r.cosmos_ru / r.elapsed if r.elapsed else 0.0
+        print(f"{r.concurrency:>5} {r.completed:>6} {r.failures:>5} {r.per_minute:>9.1f}"
+              f" {percentile(ms, 50):>9.0f} {percentile(ms, 95):>9.0f} {percentile(ms, 99):>9.0f}"
+              f" {r.llm_throttled:>8} {r.llm_errors:>8} {r.cosmos_throttled:>7} {ru_per_s:>8.1f}")
+
+    # Saturation: the last level whose successor adds less than 10% throughput
+    knee = None
+    for prev, cur in zip(results, results[1:]):
+        if cur.per_minute < prev.per_minute * 1.10:
+            knee = prev
+            break
+    print()
+    if knee:
+        print(f"Saturation point: ~{knee.concurrency} concurrent work orders "
+              f"({knee.per_minute:.1f} work orders/min); more workers only add latency")
+    elif results:
+        print(f"No saturation up to {results[-1].concurrency} concurrent work orders "
+              f"({results[-1].per_minute:.1f} work orders/min)")
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the agent pipeline against local stand-ins")
+    parser.add_argument("--agent", choices=["pipeline", "scheduler", "parts"], default="pipeline")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32",
+                        help="Comma-separated concurrency levels to sweep")
+    parser.add_argument("--requests", type=int, default=64, help="Work orders per concurrency level")
+    parser.add_argument("--llm", default="median=800,p95=2500",
+                        help="Model latency / fault spec (time to first token)")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0,
+                        help="Model generation speed after the first token")
+    parser.add_argument("--cosmos", default="median=5,p95=20", help="Cosmos latency / fault spec")
+    parser.add_argument("--data-dir", default=DATA_DIR,
+                        help="challenge-0 style data (.json or generated .jsonl)")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming run path")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics while running")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    seed_docs = prepare(load_documents(args.data_dir), args.requests)
+    if not seed_docs.get("WorkOrders"):
+        print(f"✗ No work orders found in {args.data_dir}")
+        return 1
+
+    print("=== Agent Pipeline Load Test ===\n")
+    print(f"Agent: {args.agent} | {args.requests} work orders per level | stream={args.stream}")
+    print(f"LLM: {args.llm}, {args.tokens_per_second:g} tok/s | Cosmos: {args.cosmos}\n")
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+        print(f"Metrics on http://127.0.0.1:{args.metrics_port}/metrics\n")
+
+    results = []
+    for concurrency in levels:
+        result = await run_level(args, seed_docs, concurrency)
+        print(f"   ✓ concurrency {concurrency}: {result.completed} ok, {result.failures} failed "
+              f"in {result.elapsed:.1f}s")
+        results.append(result)
+
+    report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark for the Challenge 3 agents.
+
+Starts each agent in probe mode (see agents/services/startup_profile.py) several
+times and reports the median time from process start to the first outbound
+request. Results are compared against a stored baseline so start-up cost does
+not silently creep back in.
+
+Usage:
+    python benchmarks/startup_benchmark.py                # compare to baseline
+    python benchmarks/startup_benchmark.py --save         # record a new baseline
+    python benchmarks/startup_benchmark.py --tolerance 0.3 --runs 7
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+
+CHALLENGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AGENTS_DIR = os.path.join(CHALLENGE_DIR, "agents")
+sys.path.insert(0, AGENTS_DIR)
+
+from services.startup_profile import run_probe  # noqa: E402
+
+AGENT_SCRIPTS = {
+    "maintenance_scheduler": os.path.join(AGENTS_DIR, "maintenance_scheduler_agent.py"),
+    "parts_ordering": os.path.join(AGENTS_DIR, "parts_ordering_agent.py"),
+}
+DEFAULT_BASELINE = os.path.join(CHALLENGE_DIR, "benchmarks", "baselines", "startup.json")
+
+
+def measure(runs: int) -> dict:
+    results = {}
+    for name, script in AGENT_SCRIPTS.items():
+        profiles = [run_probe(script, ["wo-2024-468"]) for _ in range(runs)]
+        if not all(p.reached_first_request for p in profiles):
+            print(f"✗ {name}: probe did not reach the first request")
+            print(profiles[-1].output)
+            sys.exit(2)
+        fail_fast = [run_probe(script, ["wo-2024-468"], fill_env=False) for _ in range(runs)]
+        results[name] = {
+            "first_request_ms": round(statistics.median(p.seconds for p in profiles) * 1000, 1),
+            "fail_fast_ms": round(statistics.median(p.seconds for p in fail_fast) * 1000, 1),
+        }
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Agent cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative slowdown before failing (default 25%%)")
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressions = 0
+    print(f"{'agent':<24}{'metric':<20}{'current':>10}{'baseline':>10}")
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            flag = ""
+            if base and value > base * (1 + args.tolerance):
+                flag = "  ✗ regression"
+                regressions += 1
+            base_text = f"{base:.0f}" if base else "-"
+            print(f"{name:<24}{metric:<20}{value:>10.0f}{base_text:>10}{flag}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Baseline saved to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n✗ {regressions} start-up regression(s) over {args.tolerance:.0%} tolerance")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,15 +4,27 @@ Batch execution script for both agents to populate traces in Azure AI Foundry.
 
 This script runs multiple work orders through both the Maintenance Scheduler
 and Parts Ordering agents to generate comprehensive trace data for monitoring.
+At the end it prints mean/p95/max latency per pipeline stage, collected from the
+agent runs through AGENT_STAGE_TIMINGS_FILE (see agents/services/stage_timing.py).
 
 Usage:
     python run-batch.py
 """
 
 import asyncio
+import os
 import sys
+import tempfile
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents"))
+
+from services.stage_timing import (  # noqa: E402
+    STAGE_TIMINGS_ENV,
+    format_stage_table,
+    load_records,
+)
+
 # Work orders to process (matching actual Cosmos DB data)
 WORK_ORDERS = ["wo-2024-445", "wo-2024-456",
                "wo-2024-432", "wo-2024-468", "wo-2024-419"]
@@ -113,6 +125,11 @@ async def main():
     print("   This will generate traces visible in Azure AI Foundry portal")
     print()
 
+    # The agent subprocesses inherit this and append one JSON line per stage
+    fd, timings_path = tempfile.mkstemp(prefix="stage-timings-", suffix=".jsonl")
+    os.close(fd)
+    os.environ[STAGE_TIMINGS_ENV] = timings_path
+
     # Run both agents
     scheduler_results = await run_maintenance_scheduler_batch()
     ordering_results = await run_parts_ordering_batch()
@@ -139,6 +156,10 @@ async def main():
     print(f"   - Total: {total_success}/{total_runs} successful")
     print(f"   - Duration: {duration:.1f} seconds")
     print()
+    print("⏱️  Stage latency:")
+    print(format_stage_table(load_records(timings_path)))
+    os.remove(timings_path)
+    print()
     print("View traces in Azure AI Foundry:")
     print("1. Navigate to: https://ai.azure.com")
     print("2. Select your project")